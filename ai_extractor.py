@@ -6,6 +6,15 @@ import re
 import textwrap
 from datetime import datetime
 import time  # timeモジュールを追加
+from llm_client import CircuitOpenError, print_latency_report
+from model_router import (
+    ROUTE_FAST, ROUTE_STRONG, choose_chunk_route, record_escalation,
+    routed_chat_completion, print_routing_report
+)
+from validator import (
+    SESSION_CODE_PATTERN, index_chunk, validate_chunk_records, has_issues, CompletenessReport,
+    SessionContextTracker
+)
 
 def validate_session_name(session_name, session_code, chunk):
     """セッション名の妥当性を検証"""
@@ -161,7 +170,7 @@ def chunk_text(text, max_chunk_size=6000):
             print(f"Progress: チャンク {len(chunks)} 作成完了 ({chunk_end}/{len(text)} 文字処理済み)")
         
         return chunks
-        except Exception as e:
+    except Exception as e:
         print(f"Error: テキスト分割中にエラー発生: {e}")
         return [text]  # エラー時は元のテキストを1つのチャンクとして返す
 
@@ -212,6 +221,8 @@ def clean_json_response(content):
         print(f"Error: JSONクリーンアップ中にエラー: {str(e)}")
         return '[{"Session_Name":"Unknown","Session_Code":"Unknown","Paper_No":"Unknown"}]'
 
+EXTRACTION_SYSTEM_PROMPT = "You are a precise data extraction assistant. Extract session and paper information from the text. Return ONLY valid JSON arrays with the exact structure specified."
+
 def get_extraction_prompt(text):
     """Generate the extraction prompt"""
     return f"""
@@ -297,13 +308,265 @@ Important Requirements:
 
 Please process the text and return ONLY the JSON output without any additional explanation or formatting."""
 
-def extract_structured_data(text, debug_mode=False, debug_chunk_count=5):
+def extract_records_locally(chunk):
+    """APIを使わずに正規表現でチャンクから最低限のレコードを抽出する
+
+    サーキットブレーカーが開いている間のフォールバック用。
+    セッション名・セッションコード・論文番号・タイトルのみを抽出し、
+    著者情報などのフィールドは空文字列とする。
+    """
+    lines = chunk.split('\n')
+    session_name = lines[0].strip() if lines else ""
+    code_match = SESSION_CODE_PATTERN.search(chunk)
+    session_code = code_match.group(1) if code_match else ""
+
+    return [
+        {
+            "session_name": session_name,
+            "session_code": session_code,
+            "overview": "",
+            "paper_no": paper["paper_no"],
+            "title": paper["title"],
+            "main_author_group": "",
+            "main_author_affiliation": "",
+            "co_author_group": "",
+            "co_author_affiliation": "",
+            "organizers": "",
+            "chairperson": ""
+        }
+        for paper in index_chunk(chunk)
+    ]
+
+def get_field_reextraction_prompt(text, targets):
+    """不足している論文・フィールドだけを再抽出するためのプロンプトを生成"""
+    target_lines = "\n".join(
+        f"- {paper_no}" + (f" (title starts with: {title[:60]})" if paper_no == "ORAL ONLY" and title else "")
+        for paper_no, title in targets
+    )
+    return f"""
+The following text is an excerpt of a technical session schedule.
+Extract ONLY the papers listed below. Do not return any other paper.
+
+Papers to extract:
+{target_lines}
+
+Text to process:
+{text}
+
+Required Output Format:
+[
+    {{
+        "paper_no": "",
+        "title": "",
+        "main_author_group": "",
+        "main_author_affiliation": "",
+        "co_author_group": "",
+        "co_author_affiliation": ""
+    }}
+]
+
+Rules:
+1. Main authors are the names BEFORE the first institution; the first institution is the main author affiliation
+2. Co-authors are the names AFTER the first institution; their institutions are the co-author affiliation
+3. Extract text exactly as it appears, keeping all punctuation
+
+Please return ONLY the JSON output without any additional explanation or formatting."""
+
+def _source_position(record, paper_index):
+    """レコードが原文の何番目の論文に対応するかを返す（対応が無い場合はNone）"""
+    paper_no = str(record.get("paper_no") or "").strip().upper()
+    title = re.sub(r'\s+', ' ', str(record.get("title") or "")).strip().lower()
+    for position, paper in enumerate(paper_index):
+        if paper["paper_no"] != paper_no:
+            continue
+        if paper_no != "ORAL ONLY":
+            return position
+        prefix = re.sub(r'\s+', ' ', paper["title"]).strip().lower()[:30]
+        if prefix and title and (title.startswith(prefix) or prefix.startswith(title)):
+            return position
+    return None
+
+def reextract_missing_fields(chunk, records, result, paper_index):
+    """検証で見つかった不足分だけを小さなプロンプトで再抽出し、レコードに反映する
+
+    原文に存在する論文だけを受け入れ、既存レコードの空フィールドを埋めるか、
+    欠落していた論文を原文の順序どおりに追加する。
+    """
+    by_paper_no = {p["paper_no"]: p for p in paper_index if p["paper_no"] != "ORAL ONLY"}
+    targets = {}
+    for paper in result["missing_papers"]:
+        targets[(paper["paper_no"], paper["title"])] = paper
+    for paper_no in result["empty_titles"] + result["missing_authors"]:
+        if paper_no in by_paper_no:
+            targets[(paper_no, "")] = by_paper_no[paper_no]
+    if not targets:
+        return records
+
+    # セッションのヘッダー部分と対象論文の記載範囲だけを送る
+    header_end = paper_index[0]["start"] if paper_index else len(chunk)
+    sections = sorted({(p["start"], p["end"]) for p in targets.values()})
+    excerpt = chunk[:header_end].strip() + "\n" + "\n".join(chunk[start:end].strip() for start, end in sections)
+
+    print(f"Info: {len(targets)}件の論文について不足フィールドを再抽出します")
+    response = routed_chat_completion(
+        ROUTE_STRONG,
+        messages=[
+            {"role": "system", "content": "You are a precise data extraction assistant. Return ONLY valid JSON arrays with the exact structure specified."},
+            {"role": "user", "content": get_field_reextraction_prompt(excerpt, list(targets))}
+        ],
+        temperature=0,
+        max_tokens=min(2000, 250 * len(targets))
+    )
+    if not response.choices:
+        return records
+    content = response.choices[0].message.content.replace('```json', '').replace('```', '').strip()
+    if not content.startswith('['):
+        content = f"[{content}]"
+    repaired = json.loads(content)
+
+    # セッション情報は既存レコードから引き継ぐ
+    if records:
+        template = records[0]
+    else:
+        code_match = SESSION_CODE_PATTERN.search(chunk)
+        template = {
+            "session_name": chunk.split('\n', 1)[0].strip(),
+            "session_code": code_match.group(1) if code_match else ""
+        }
+    session_fields = ["session_name", "session_code", "overview", "organizers", "chairperson"]
+
+    records = list(records)
+    for item in repaired:
+        if not isinstance(item, dict):
+            continue
+        position = _source_position(item, paper_index)
+        if position is None:
+            # 原文に無い論文は受け入れない
+            continue
+        existing = next((r for r in records if _source_position(r, paper_index) == position), None)
+        if existing is not None:
+            for field, value in item.items():
+                if value and not str(existing.get(field) or "").strip():
+                    existing[field] = value
+        else:
+            new_record = {field: template.get(field, "") for field in session_fields}
+            new_record.update({
+                "paper_no": item.get("paper_no", ""),
+                "title": item.get("title", ""),
+                "main_author_group": item.get("main_author_group", ""),
+                "main_author_affiliation": item.get("main_author_affiliation", ""),
+                "co_author_group": item.get("co_author_group", ""),
+                "co_author_affiliation": item.get("co_author_affiliation", "")
+            })
+            records.append(new_record)
+
+    # 原文の順序に並べ直す（対応が取れないレコードは直前のレコードの位置に続ける）
+    keyed = []
+    last_position = -1
+    for order, record in enumerate(records):
+        position = _source_position(record, paper_index)
+        if position is not None:
+            last_position = position
+        keyed.append((last_position, order, record))
+    return [record for _, _, record in sorted(keyed, key=lambda x: (x[0], x[1]))]
+
+def repair_chunk_records(chunk, records, result, paper_index):
+    """検証で不足が見つかった場合に不足分だけを再抽出し、再検証する
+
+    Returns:
+        tuple: (レコードのリスト, 検証結果)
+    """
+    if has_issues(result):
+        print(f"Warning: 検証で不足を検出しました（欠落論文 {len(result['missing_papers'])}件, "
+              f"タイトル空 {len(result['empty_titles'])}件, 著者空 {len(result['missing_authors'])}件）")
+        try:
+            records = reextract_missing_fields(chunk, records, result, paper_index)
+            result = validate_chunk_records(chunk, records, paper_index)
+        except CircuitOpenError:
+            pass
+        except Exception as repair_error:
+            print(f"Warning: 不足フィールドの再抽出に失敗しました: {str(repair_error)}")
+    if result["unknown_papers"]:
+        print(f"Warning: 原文に無い論文番号が抽出されました: {', '.join(result['unknown_papers'])}")
+    return records, result
+
+def extract_chunk_records(chunk, route=ROUTE_STRONG):
+    """1チャンク分のテキストをAPIで構造化データに変換する
+
+    Args:
+        chunk (str): 処理するチャンク
+        route (str): 使用するモデルのルート（ROUTE_FAST / ROUTE_STRONG）
+
+    Returns:
+        list: 抽出したレコードのリスト（レスポンスが空の場合は空リスト）
+
+    Raises:
+        CircuitOpenError: サーキットブレーカーが開いている場合
+        json.JSONDecodeError: レスポンスのJSON解析に失敗した場合
+        Exception: API呼び出しに失敗した場合
+    """
+    # プロンプトの生成
+    prompt = get_extraction_prompt(chunk)
+
+    # API呼び出し（バージョン0.28の書き方、サーキットブレーカー経由）
+    response = routed_chat_completion(
+        route,
+        messages=[
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0,
+        max_tokens=2000
+    )
+
+    if not response.choices:
+        return []
+
+    content = response.choices[0].message.content.strip()
+    print(f"APIレスポンス: {content[:200]}...")  # レスポンスの最初の200文字を表示
+
+    # JSONの整形
+    content = content.replace('```json', '').replace('```', '').strip()
+
+    # 配列形式の確認
+    if not content.startswith('['):
+        print("Warning: レスポンスが配列形式ではありません。配列に変換します。")
+        content = f"[{content}]"
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        print(f"Error: JSON解析エラー: {str(e)}")
+        print(f"Position: 行 {e.lineno}, 列 {e.colno}")
+        print(f"問題のある部分: {content[max(0, e.pos-50):min(len(content), e.pos+50)]}")
+        raise
+
+    if not isinstance(data, list):
+        print("Warning: レスポンスが配列ではありません。単一オブジェクトとして処理します。")
+        return [data]
+
+    print(f"Success: {len(data)}件のレコードを抽出")
+    # 各レコードの著者情報を表示
+    for record in data:
+        print("\n--- 抽出された著者情報 ---")
+        print(f"Paper No: {record.get('paper_no', 'N/A')}")
+        print(f"Title: {record.get('title', 'N/A')[:100]}...")  # タイトルは最初の100文字まで
+        print(f"Main Authors: {record.get('main_author_group', 'N/A')}")
+        print(f"Main Affiliation: {record.get('main_author_affiliation', 'N/A')}")
+        print(f"Co-Authors: {record.get('co_author_group', 'N/A')}")
+        print(f"Co-Author Affiliations: {record.get('co_author_affiliation', 'N/A')}")
+        print("------------------------")
+    return data
+
+def extract_structured_data(text, debug_mode=False, debug_chunk_count=5, failed_chunks=None):
     """テキストから構造化データを抽出する
     
     Args:
         text (str): 処理するテキスト
         debug_mode (bool): デバッグモードの場合True
         debug_chunk_count (int): デバッグモード時に処理するチャンク数
+        failed_chunks (list): 指定した場合、処理に失敗したチャンクの情報
+            （chunk_index, session_code, prev_session_code, chunk_text, error）を追加する
     """
     try:
         setup_azure_openai()
@@ -324,76 +587,80 @@ def extract_structured_data(text, debug_mode=False, debug_chunk_count=5):
             print(f"\nデバッグモード: 最初の{debug_chunk_count}個のチャンクのみを処理します")
         
         all_results = []
-        seen_sessions = set()
+        prev_session_code = None
+        year = extract_year_from_text(text)
+        completeness = CompletenessReport()
+        session_context = SessionContextTracker()
         
         for i, chunk in enumerate(chunks, 1):
+            print(f"\nチャンク {i}/{len(chunks)} を処理中")
+            print(f"チャンクサイズ: {len(chunk)} 文字")
+            
+            # セッションコードを抽出して表示
+            session_codes = SESSION_CODE_PATTERN.findall(chunk)
+            if session_codes:
+                print(f"このチャンクに含まれるセッションコード: {', '.join(session_codes)}")
+            session_code = session_codes[0] if session_codes else None
+            
+            error = None
             try:
-                print(f"\nチャンク {i}/{len(chunks)} を処理中")
-                print(f"チャンクサイズ: {len(chunk)} 文字")
-                
-                # セッションコードを抽出して表示
-                session_codes = re.findall(r'Session Code\s+([A-Z0-9]+)', chunk)
-                if session_codes:
-                    print(f"このチャンクに含まれるセッションコード: {', '.join(session_codes)}")
-                
-                # プロンプトの生成
-                prompt = get_extraction_prompt(chunk)
+                # 難易度に応じてモデルを選択
+                paper_index = index_chunk(chunk)
+                route = choose_chunk_route(chunk, paper_index, label=f" チャンク{i}")
+                try:
+                    records = extract_chunk_records(chunk, route)
+                except json.JSONDecodeError:
+                    if route != ROUTE_FAST:
+                        raise
+                    record_escalation("JSON解析失敗")
+                    route = ROUTE_STRONG
+                    records = extract_chunk_records(chunk, route)
                 
-                # API呼び出し（バージョン0.28の書き方）
-                response = openai.ChatCompletion.create(
-                    deployment_id=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-                    messages=[
-                        {"role": "system", "content": "You are a precise data extraction assistant. Extract session and paper information from the text. Return ONLY valid JSON arrays with the exact structure specified."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0,
-                    max_tokens=2000
-                )
-
-                if response.choices:
-                    content = response.choices[0].message.content.strip()
-                    print(f"APIレスポンス: {content[:200]}...")  # レスポンスの最初の200文字を表示
-                    
-                    try:
-                        # JSONの整形
-                        content = content.replace('```json', '').replace('```', '').strip()
-                        
-                        # 配列形式の確認
-                        if not content.startswith('['):
-                            print("Warning: レスポンスが配列形式ではありません。配列に変換します。")
-                            content = f"[{content}]"
-                        
-                        data = json.loads(content)
-                        
-                        if isinstance(data, list):
-                            print(f"Success: {len(data)}件のレコードを抽出")
-                            # 各レコードの著者情報を表示
-                            for record in data:
-                                print("\n--- 抽出された著者情報 ---")
-                                print(f"Paper No: {record.get('paper_no', 'N/A')}")
-                                print(f"Title: {record.get('title', 'N/A')[:100]}...")  # タイトルは最初の100文字まで
-                                print(f"Main Authors: {record.get('main_author_group', 'N/A')}")
-                                print(f"Main Affiliation: {record.get('main_author_affiliation', 'N/A')}")
-                                print(f"Co-Authors: {record.get('co_author_group', 'N/A')}")
-                                print(f"Co-Author Affiliations: {record.get('co_author_affiliation', 'N/A')}")
-                                print("------------------------")
-                            all_results.extend(data)
-                        else:
-                            print("Warning: レスポンスが配列ではありません。単一オブジェクトとして処理します。")
-                            all_results.append(data)
-                            
-                    except json.JSONDecodeError as e:
-                        print(f"Error: JSON解析エラー: {str(e)}")
-                        print(f"Position: 行 {e.lineno}, 列 {e.colno}")
-                        print(f"問題のある部分: {content[max(0, e.pos-50):min(len(content), e.pos+50)]}")
-                        continue
+                # 原文と突き合わせて検証する
+                result = validate_chunk_records(chunk, records, paper_index)
+                if has_issues(result) and route == ROUTE_FAST:
+                    record_escalation("検証失敗")
+                    route = ROUTE_STRONG
+                    records = extract_chunk_records(chunk, route)
+                    result = validate_chunk_records(chunk, records, paper_index)
                 
+                # 不足分だけを再抽出
+                records, result = repair_chunk_records(chunk, records, result, paper_index)
+                completeness.add(year, result)
+                # 継続チャンクで失われたセッション情報を直前のセッションから引き継ぐ
+                session_context.apply(chunk, records, paper_index)
+                all_results.extend(records)
+            except CircuitOpenError:
+                # ブレーカーが開いている間はAPIを呼ばずにローカル抽出へフォールバック
+                data = extract_records_locally(chunk)
+                print(f"Info: ローカル抽出にフォールバックしました（{len(data)}件）")
+                session_context.apply(chunk, data)
+                all_results.extend(data)
+                error = "circuit open: ローカル抽出で代替"
             except Exception as chunk_error:
                 print(f"Error: チャンク {i} の処理中にエラーが発生: {str(chunk_error)}")
-            continue
+                error = f"{type(chunk_error).__name__}: {chunk_error}"
+            
+            # 失敗したチャンクを後から再処理できるように記録
+            if error and failed_chunks is not None:
+                failed_chunks.append({
+                    "chunk_index": i,
+                    "session_code": session_code,
+                    "prev_session_code": prev_session_code,
+                    "chunk_text": chunk,
+                    "error": error
+                })
+            if session_code:
+                prev_session_code = session_code
         
         print(f"\n処理完了: 合計 {len(all_results)} 件のレコードを抽出")
-        print(f"抽出されたユニークなセッション数: {len({r['session_code'] for r in all_results})}")
+        print(f"抽出されたユニークなセッション数: {len({r.get('session_code') for r in all_results})}")
+        if failed_chunks:
+            print(f"Warning: {len(failed_chunks)}個のチャンクの処理に失敗しました")
+        completeness.print_report()
+        session_context.print_report()
+        print_latency_report("抽出API")
+        print_routing_report()
         return all_results
             
     except Exception as e:
@@ -492,8 +759,8 @@ def main():
     try:
         # テキストファイルから入力を読み込む
         input_file = "input.txt"
-            with open(input_file, 'r', encoding='utf-8') as f:
-                input_text = f.read()
+        with open(input_file, 'r', encoding='utf-8') as f:
+            input_text = f.read()
         
         # 年を抽出して表示
         year = extract_year_from_text(input_text)
@@ -0,0 +1,307 @@
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+from db_handler import DatabaseHandler, SESSION_INSERT_SQL, session_row
+from fix_missing_data import fix_missing_session_data, forward_fill_query
+from output_stage import OUTPUT_ROWS_QUERY
+from incremental_export import WATERMARK_QUERY
+from export_to_excel import export_to_excel, extract_oem, EXPORT_COLUMNS
+
+# 年で絞り込む代表的なクエリ（ラベル -> (SQL, パラメータ)）
+# 定数として定義されているものは各モジュールから参照し、関数内のクエリは同じ文を記載する
+# tests/test_query_plans.py で、いずれもsessionsの全行を読まないことを確認する
+PLAN_CHECK_QUERIES = {
+    "年の絞り込み (load_raw_data)": (
+        "SELECT title FROM sessions WHERE year = ? ORDER BY year DESC, category, subcategory, no", (2025,)
+    ),
+    "最新2年 (get_latest_data)": (
+        "SELECT DISTINCT year FROM sessions ORDER BY year DESC LIMIT 2", ()
+    ),
+    "前方補完 (fix_missing_session_data)": forward_fill_query(2025),
+    "既存行の照合 (store_data upsert)": (
+        "SELECT id, record_key, content_hash FROM sessions WHERE year = ? ORDER BY no, id", (2025,)
+    ),
+    "年内の並び順 (_insert_in_year_order)": (
+        "SELECT id, no FROM sessions WHERE year = ? ORDER BY no, id", (2025,)
+    ),
+    "置き換え対象 (merge_chunk_records)": (
+        "SELECT id FROM sessions WHERE year = ? AND record_key IN (?, ?)",
+        (2025, "BM000100|2025-01-1000", "BM000100|2025-01-1001")
+    ),
+    "出力対象の年 (run_output_stage)": (OUTPUT_ROWS_QUERY, (2025,)),
+    "年ごとの変更日時 (export_changed_partitions)": (WATERMARK_QUERY, ())
+}
+
+def full_table_scans(plan):
+    """EXPLAIN QUERY PLANの各行のうち、sessionsの全行を読むもの
+
+    カバリングインデックスのみの走査は対象外とする。条件に関係の無いインデックスの順に全件を読む
+    "SCAN sessions USING INDEX ..." はテーブルの全件走査と同じ扱いにする。
+    """
+    return [step for step in plan if step.startswith("SCAN sessions") and "COVERING INDEX" not in step]
+
+def make_records(count):
+    """ベンチマーク用の合成レコードを作成する"""
+    categories = ["Electrification", "ADAS/AVS", "Powertrain", "Materials", "NVH"]
+    return [
+        {
+            "session_name": f"Benchmark Session {i // 10} Part 1 of 2",
+            "session_code": f"BM{i // 10:06d}",
+            "overview": "This session covers benchmark topics. " * 8,
+            "category": categories[i % len(categories)],
+            "subcategory": "",
+            "paper_no": f"2025-01-{i % 10000:04d}",
+            "title": f"Benchmark Paper Title {i}",
+            "main_author_group": "Taro Yamada, Hanako Suzuki",
+            "main_author_affiliation": "Toyota Motor Corporation",
+            "co_author_group": "John Smith",
+            "co_author_affiliation": "University of Michigan",
+            "organizers": "Organizer A, Ford Motor Company; Organizer B, GM",
+            "chairperson": ""
+        }
+        for i in range(count)
+    ]
+
+def legacy_store(db_path, data, year):
+    """従来のstore_data相当（1件ずつexecute、既定のPRAGMA）"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(no) FROM sessions")
+    max_no = cursor.fetchone()[0] or 0
+    for i, item in enumerate(data, 1):
+        cursor.execute(SESSION_INSERT_SQL, session_row(max_no + i, year, item))
+    conn.commit()
+    conn.close()
+
+def run_store_benchmark(sizes, year=2025):
+    """従来の挿入とバルク挿入（プロファイル別）の所要時間を比較する"""
+    variants = [
+        ("従来/safe", "legacy", "safe"),
+        ("バルク/safe", "bulk", "safe"),
+        ("バルク/fast", "bulk", "fast")
+    ]
+    print("\n=== store_data ベンチマーク（秒） ===")
+    print(f"{'件数':>10} | " + " | ".join(f"{label:>12}" for label, _, _ in variants))
+    results = []
+    for size in sizes:
+        data = make_records(size)
+        timings = {}
+        for label, mode, profile in variants:
+            with tempfile.TemporaryDirectory() as work_dir:
+                cwd = os.getcwd()
+                os.chdir(work_dir)
+                try:
+                    db = DatabaseHandler(profile=profile)
+                    start = time.perf_counter()
+                    if mode == "legacy":
+                        legacy_store(db.db_path, data, year)
+                    else:
+                        db.store_data(data, year)
+                    timings[label] = time.perf_counter() - start
+                    db.close()
+                finally:
+                    os.chdir(cwd)
+        print(f"{size:>10,} | " + " | ".join(f"{timings[label]:>12.3f}" for label, _, _ in variants))
+        results.append({"size": size, **timings})
+    return results
+
+def run_query_plan_check(size=100000, repeat=5):
+    """インデックス有無でのEXPLAIN QUERY PLANと所要時間を比較する
+
+    インデックスありの実行計画がフルスキャン（SCAN sessions）になっていないことを確認する。
+    """
+    print(f"\n=== クエリプラン確認（{size:,}件、3年分） ===")
+    data = make_records(size // 3)
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            db = DatabaseHandler()
+            # 年で絞り込む効果を確認するため、複数の年に分けて保存する
+            for year in (2023, 2024, 2025):
+                db.store_data(data, year)
+            # マイグレーションで作成したものを含む、sessionsのすべてのインデックス（自動作成のものを除く）
+            index_names = [name for (name,) in db.fetch_all("""
+                SELECT name FROM sqlite_master
+                WHERE type = 'index' AND tbl_name = 'sessions' AND sql IS NOT NULL
+            """)]
+            db.close()
+            conn = sqlite3.connect(db.db_path)
+
+            def measure():
+                results = {}
+                for label, (query, params) in PLAN_CHECK_QUERIES.items():
+                    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        conn.execute(query, params).fetchall()
+                    results[label] = ((time.perf_counter() - start) / repeat, plan)
+                return results
+
+            with_index = measure()
+            for name in index_names:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            without_index = measure()
+            conn.close()
+        finally:
+            os.chdir(cwd)
+
+    failures = []
+    for label in PLAN_CHECK_QUERIES:
+        indexed_time, plan = with_index[label]
+        scan_time, _ = without_index[label]
+        full_scan = bool(full_table_scans(plan))
+        if full_scan:
+            failures.append(label)
+        print(f"\n{label}: {scan_time * 1000:.2f}ms → {indexed_time * 1000:.2f}ms"
+              f"{'  [NG: フルスキャン]' if full_scan else ''}")
+        for step in plan:
+            print(f"    {step}")
+    print(f"\nクエリプラン確認: {'OK' if not failures else 'NG ' + ', '.join(failures)}")
+    return not failures
+
+def make_records_with_gaps(count, gap_every=10):
+    """セッション情報が欠損した行を一定間隔で含む合成レコードを作成する
+
+    各セッション（10件）の最後の行のセッションコードと概要を空にする。
+    """
+    data = make_records(count)
+    for item in data[gap_every - 1::gap_every]:
+        item["session_code"] = ""
+        item["overview"] = ""
+    return data
+
+def legacy_fix(db_path):
+    """従来の fix_missing_session_data 相当（1件ずつSELECT・UPDATE・commit）"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    filled = 0
+    while True:
+        cursor.execute("""
+            SELECT id, no FROM sessions
+            WHERE (session_code IS NULL OR session_code = '') AND (overview IS NULL OR overview = '')
+            ORDER BY no LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if not row:
+            break
+        id_, no = row
+        cursor.execute("""
+            SELECT session_name, session_code, overview FROM sessions
+            WHERE no < ? AND session_code IS NOT NULL AND session_code != ''
+            AND overview IS NOT NULL AND overview != ''
+            ORDER BY no DESC LIMIT 1
+        """, (no,))
+        prev_row = cursor.fetchone()
+        if not prev_row:
+            # 従来の実装はここで無限ループになるため、ベンチマークでは打ち切る
+            break
+        cursor.execute("UPDATE sessions SET session_name = ?, session_code = ?, overview = ? WHERE id = ?",
+                       prev_row + (id_,))
+        conn.commit()
+        filled += 1
+    conn.close()
+    return filled
+
+def run_fix_benchmark(sizes=(10000, 100000), legacy_limit=10000):
+    """欠損データ補完の所要時間を従来の実装と比較する（従来の実装はlegacy_limit件以下のみ）"""
+    print("\n=== 欠損データ補完ベンチマーク（秒） ===")
+    print(f"{'件数':>10} | {'欠損行':>8} | {'従来':>10} | {'一括更新':>10} | 結果一致")
+    for size in sizes:
+        data = make_records_with_gaps(size)
+        timings = {}
+        results = {}
+        for variant in ("legacy", "set"):
+            if variant == "legacy" and size > legacy_limit:
+                continue
+            with tempfile.TemporaryDirectory() as work_dir:
+                cwd = os.getcwd()
+                os.chdir(work_dir)
+                try:
+                    db = DatabaseHandler()
+                    db.store_data(data, 2025)
+                    gaps = db.fetch_one("SELECT COUNT(*) FROM sessions WHERE session_code = ''")[0]
+                    start = time.perf_counter()
+                    if variant == "legacy":
+                        db.close()
+                        legacy_fix(db.db_path)
+                    else:
+                        fix_missing_session_data(db, 2025)
+                    timings[variant] = time.perf_counter() - start
+                    results[variant] = db.fetch_all("SELECT session_code, overview FROM sessions ORDER BY no")
+                    db.close()
+                finally:
+                    os.chdir(cwd)
+        legacy = f"{timings['legacy']:>10.3f}" if "legacy" in timings else f"{'-':>10}"
+        same = "-" if "legacy" not in results else ("OK" if results["legacy"] == results["set"] else "NG")
+        print(f"{size:>10,} | {gaps:>8,} | {legacy} | {timings['set']:>10.3f} | {same}")
+
+def legacy_excel_export(db, output_file):
+    """従来のexport_to_excel相当（DataFrameに全件読み込み、通常モードで書き込み、全セルを走査して列幅を調整）"""
+    import pandas as pd
+    df = db.query_df("SELECT * FROM sessions ORDER BY year DESC, category, subcategory, no")
+    df['oem'] = df.apply(extract_oem, axis=1)
+    df['authors'] = df.apply(lambda x:
+        f"{x['main_author_group']} ({x['main_author_affiliation']})" if x['main_author_group'] else "" +
+        (f", {x['co_author_group']} ({x['co_author_affiliation']})" if x['co_author_group'] else ""),
+        axis=1
+    )
+    df = df[['no', 'year', 'category', 'subcategory', 'session_name', 'session_code', 'paper_no', 'title',
+             'authors', 'main_author_group', 'main_author_affiliation', 'co_author_group',
+             'co_author_affiliation', 'oem', 'overview', 'organizers', 'chairperson']]
+    df.columns = [header for header, _ in EXPORT_COLUMNS]
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='WCX Sessions', index=False)
+        worksheet = writer.sheets['WCX Sessions']
+        for column in worksheet.columns:
+            column = list(column)
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 100)
+
+def run_excel_benchmark(sizes=(10000, 100000)):
+    """Excel出力の所要時間とPythonのピークメモリを従来の実装と比較する"""
+    import tracemalloc
+    print("\n=== Excel出力ベンチマーク（秒 / ピークメモリMB） ===")
+    print(f"{'件数':>10} | {'従来':>18} | {'ストリーミング':>18}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            cwd = os.getcwd()
+            os.chdir(work_dir)
+            try:
+                db = DatabaseHandler()
+                db.store_data(make_records(size), 2025)
+                results = {}
+                for variant in ("legacy", "stream"):
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    if variant == "legacy":
+                        legacy_excel_export(db, f"{variant}.xlsx")
+                    else:
+                        export_to_excel(f"{variant}.xlsx")
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+                    tracemalloc.stop()
+                    results[variant] = f"{elapsed:>8.2f} / {peak:>7.1f}"
+                db.close()
+            finally:
+                os.chdir(cwd)
+        print(f"{size:>10,} | {results['legacy']:>18} | {results['stream']:>18}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DB処理のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000],
+                        help="計測するレコード件数")
+    parser.add_argument("--plans", action="store_true", help="インデックスのクエリプラン確認のみ実行")
+    parser.add_argument("--fix", action="store_true", help="欠損データ補完のベンチマークのみ実行")
+    parser.add_argument("--excel", action="store_true", help="Excel出力のベンチマークのみ実行")
+    args = parser.parse_args()
+    if args.plans:
+        run_query_plan_check()
+    elif args.fix:
+        run_fix_benchmark()
+    elif args.excel:
+        run_excel_benchmark()
+    else:
+        run_store_benchmark(args.sizes)
@@ -2,6 +2,11 @@ import openai
 import os
 import json
 from dotenv import load_dotenv
+from llm_client import CircuitOpenError, print_latency_report
+from model_router import (
+    ROUTE_FAST, ROUTE_STRONG, routing_enabled, is_low_confidence,
+    record_escalation, routed_chat_completion, print_routing_report
+)
 
 def setup_azure_openai():
     """Azure OpenAI APIの設定"""
@@ -12,6 +17,8 @@ def setup_azure_openai():
     openai.api_key = os.getenv("AZURE_OPENAI_API_KEY")
     openai.deployment_id = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
+CATEGORIZATION_SYSTEM_PROMPT = "あなたは自動車技術の専門家です。セッションの内容を分析し、適切なカテゴリとサブカテゴリを決定してください。"
+
 def get_categorization_prompt(overview, title):
     """カテゴリ分類用のプロンプトを生成"""
     return f"""
@@ -63,6 +70,47 @@ def get_categorization_prompt(overview, title):
 }}
 """
 
+def categorize_by_keywords(overview, title):
+    """キーワードベースでカテゴリを決定する（API利用不可時のフォールバック）"""
+    text = f"{title} {overview}".lower()
+
+    # カテゴリのキーワードマッピング
+    category_keywords = {
+        "Internal Combustion Engine": ["engine", "combustion", "cylinder", "piston", "内燃機関"],
+        "ADAS/AVS": ["adas", "autonomous", "self-driving", "driver assistance", "自動運転"],
+        "Electrification": ["electric", "battery", "motor", "電動", "モーター"],
+        "Emissions Control": ["emission", "exhaust", "catalyst", "排気", "触媒"],
+        "Vehicle Development": ["vehicle", "development", "design", "車両", "開発"],
+        "Powertrain": ["powertrain", "transmission", "driveline", "駆動", "トランスミッション"],
+        "Materials": ["material", "composite", "metallurgy", "材料", "複合材料"],
+        "Crash Safety": ["crash", "safety", "impact", "衝突", "安全"],
+        "Vehicle Dynamics": ["dynamics", "handling", "stability", "ダイナミクス", "操縦性"],
+        "NVH": ["noise", "vibration", "harshness", "騒音", "振動"],
+        "Reliability/Durability": ["reliability", "durability", "testing", "信頼性", "耐久性"],
+        "Manufacturing": ["manufacturing", "production", "assembly", "製造", "生産"],
+        "Body Engineering": ["body", "structure", "aerodynamics", "車体", "空力"],
+        "Electronics": ["electronics", "sensor", "ecu", "電装", "センサー"],
+        "Human Factors": ["hmi", "ergonomics", "interface", "人間工学", "インターフェース"],
+        "Racing Technology": ["racing", "motorsports", "レース", "モータースポーツ"]
+    }
+
+    # キーワードに基づいてカテゴリを決定
+    for category, keywords in category_keywords.items():
+        if any(keyword in text for keyword in keywords):
+            return category, ""
+
+    return "Others", ""
+
+def request_categorization(route, messages):
+    """指定したルートのモデルで分類を実行し、解析済みの結果を返す"""
+    response = routed_chat_completion(
+        route,
+        messages=messages,
+        temperature=0.3,
+        max_tokens=500
+    )
+    return json.loads(response.choices[0].message.content)
+
 def categorize_session(overview, title):
     """セッションのカテゴリとサブカテゴリを決定する"""
     try:
@@ -81,19 +129,22 @@ def categorize_session(overview, title):
             # プロンプトの生成
             prompt = get_categorization_prompt(overview, title)
 
-            # Azure OpenAI APIの呼び出し
-            response = openai.ChatCompletion.create(
-                deployment_id=openai.deployment_id,
-                messages=[
-                    {"role": "system", "content": "あなたは自動車技術の専門家です。セッションの内容を分析し、適切なカテゴリとサブカテゴリを決定してください。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-
-            # レスポンスの解析
-            result = json.loads(response.choices[0].message.content)
+            messages = [
+                {"role": "system", "content": CATEGORIZATION_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+
+            # まず高速モデルで分類し、確信度が低い場合のみ強いモデルで再分類
+            route = ROUTE_FAST if routing_enabled() else ROUTE_STRONG
+            try:
+                result = request_categorization(route, messages)
+            except json.JSONDecodeError:
+                if route != ROUTE_FAST:
+                    raise
+                result = None
+            if route == ROUTE_FAST and (result is None or is_low_confidence(result.get('confidence'))):
+                record_escalation("分類の確信度が低い")
+                result = request_categorization(ROUTE_STRONG, messages)
             
             print(f"分類結果: {result['category']} - {result['subcategory']}")
             print(f"確信度: {result['confidence']}")
@@ -101,39 +152,14 @@ def categorize_session(overview, title):
 
             return result['category'], result['subcategory']
 
+        except CircuitOpenError:
+            # ブレーカーが開いている間はAPIを呼ばずに即座にフォールバック
+            return categorize_by_keywords(overview, title)
+
         except Exception as api_error:
             print(f"警告: API呼び出し中にエラーが発生しました: {str(api_error)}")
             print("キーワードベースの分類にフォールバックします")
-            
-            # キーワードベースの分類にフォールバック
-            text = f"{title} {overview}".lower()
-            
-            # カテゴリのキーワードマッピング
-            category_keywords = {
-                "Internal Combustion Engine": ["engine", "combustion", "cylinder", "piston", "内燃機関"],
-                "ADAS/AVS": ["adas", "autonomous", "self-driving", "driver assistance", "自動運転"],
-                "Electrification": ["electric", "battery", "motor", "電動", "モーター"],
-                "Emissions Control": ["emission", "exhaust", "catalyst", "排気", "触媒"],
-                "Vehicle Development": ["vehicle", "development", "design", "車両", "開発"],
-                "Powertrain": ["powertrain", "transmission", "driveline", "駆動", "トランスミッション"],
-                "Materials": ["material", "composite", "metallurgy", "材料", "複合材料"],
-                "Crash Safety": ["crash", "safety", "impact", "衝突", "安全"],
-                "Vehicle Dynamics": ["dynamics", "handling", "stability", "ダイナミクス", "操縦性"],
-                "NVH": ["noise", "vibration", "harshness", "騒音", "振動"],
-                "Reliability/Durability": ["reliability", "durability", "testing", "信頼性", "耐久性"],
-                "Manufacturing": ["manufacturing", "production", "assembly", "製造", "生産"],
-                "Body Engineering": ["body", "structure", "aerodynamics", "車体", "空力"],
-                "Electronics": ["electronics", "sensor", "ecu", "電装", "センサー"],
-                "Human Factors": ["hmi", "ergonomics", "interface", "人間工学", "インターフェース"],
-                "Racing Technology": ["racing", "motorsports", "レース", "モータースポーツ"]
-            }
-            
-            # キーワードに基づいてカテゴリを決定
-            for category, keywords in category_keywords.items():
-                if any(keyword in text for keyword in keywords):
-                    return category, ""
-            
-            return "Others", ""
+            return categorize_by_keywords(overview, title)
 
     except Exception as e:
         print(f"警告: カテゴリ分類中にエラーが発生しました: {str(e)}")
@@ -148,6 +174,8 @@ def add_categories_to_data(data):
         )
         item['category'] = category
         item['subcategory'] = subcategory
+    print_latency_report("分類API")
+    print_routing_report()
     return data
 
 def write_to_excel(data, year, output_dir="output"):
@@ -11,6 +11,44 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
 AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 
+# LLM呼び出しのサーキットブレーカー設定
+# 連続失敗回数がしきい値に達すると、復旧待ち時間（秒）の間APIを呼ばずにフォールバックする
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("LLM_CIRCUIT_RECOVERY_TIMEOUT", "60"))
+
+# LLM呼び出しのタイムアウト（秒）とヘッジリクエスト設定
+# ヘッジ有効時は、呼び出しが直近のp95レイテンシを超えた時点で同じリクエストをもう1件発行する
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# モデルルーティング設定
+# 高速・低コストのデプロイメントを指定すると、易しいチャンクと分類はそちらに送り、
+# 難易度スコアがしきい値以上のチャンク・検証失敗・低確信度の分類だけを強いモデルで処理する
+AZURE_OPENAI_FAST_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME")
+ROUTER_DIFFICULTY_THRESHOLD = float(os.getenv("ROUTER_DIFFICULTY_THRESHOLD", "0.5"))
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.7"))
+
+# デプロイメントのレート制限と応答速度（ドライランでの所要時間見積もりに使用）
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "60"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "60000"))
+LLM_BASE_LATENCY = float(os.getenv("LLM_BASE_LATENCY", "1.0"))
+LLM_OUTPUT_TOKENS_PER_SECOND = float(os.getenv("LLM_OUTPUT_TOKENS_PER_SECOND", "50"))
+
+# ローカルLLMゲートウェイ設定（python llm_gateway.py で起動）
+# LLM_GATEWAY_URLを設定すると、すべてのLLM呼び出しがゲートウェイ経由になり、
+# 複数プロセス間でレート制限・同一リクエストの集約・レスポンスキャッシュを共有する
+LLM_GATEWAY_URL = os.getenv("LLM_GATEWAY_URL")
+LLM_GATEWAY_HOST = os.getenv("LLM_GATEWAY_HOST", "127.0.0.1")
+LLM_GATEWAY_PORT = int(os.getenv("LLM_GATEWAY_PORT", "8765"))
+LLM_GATEWAY_CACHE_PATH = os.getenv("LLM_GATEWAY_CACHE_PATH", os.path.join("output", "db", "llm_cache.db"))
+
+# 差分エクスポートの状態の保存先（sessionsのDBとは別のファイル）
+EXPORT_STATE_PATH = os.getenv("EXPORT_STATE_PATH", os.path.join("output", "db", "export_state.db"))
+
+# SQLiteのパフォーマンスプロファイル（db_handler.PERFORMANCE_PROFILES のキー）
+DB_PERFORMANCE_PROFILE = os.getenv("DB_PERFORMANCE_PROFILE", "fast")
+
 # フォルダパス
 INPUT_FOLDER = "data/input"
 OUTPUT_FOLDER = "output"
@@ -32,4 +70,7 @@ COLUMNS = [
     "Affiliations",
     "Organizers",
     "Chairperson"
-]
\ No newline at end of file
+]
+# 取り込み後の出力先（output_stage.SINKS のキーをカンマ区切りで指定）と並列数
+OUTPUT_SINKS = [name.strip() for name in os.getenv("OUTPUT_SINKS", "excel,json,parquet,snapshot").split(",") if name.strip()]
+OUTPUT_WORKERS = int(os.getenv("OUTPUT_WORKERS", "4"))
@@ -0,0 +1,325 @@
+import os
+import json
+import html
+import argparse
+from datetime import datetime
+from db_handler import DatabaseHandler
+
+# 空値率を集計するカラム
+AUDIT_COLUMNS = [
+    "session_name", "session_code", "overview", "category", "subcategory",
+    "paper_no", "title", "main_author_group", "main_author_affiliation",
+    "co_author_group", "co_author_affiliation", "organizers", "chairperson"
+]
+
+# 概要の長さの外れ値とみなす標準偏差の倍数
+OVERVIEW_OUTLIER_SIGMA = 3.0
+# 件数だけでなく例として表示する件数
+SAMPLE_LIMIT = 5
+
+AUDIT_OUTPUT_DIR = os.path.join("output", "audit")
+
+def _empty(column):
+    return f"({column} IS NULL OR TRIM({column}) = '')"
+
+def _year_filter(year):
+    return "(? IS NULL OR year = ?)", (year, year)
+
+# ドリルダウンの対象（チェック名 -> 該当行の条件）
+DRILL_DOWN_CONDITIONS = {
+    **{f"empty:{column}": _empty(column) for column in AUDIT_COLUMNS},
+    "duplicate_no": "(year, no) IN (SELECT year, no FROM sessions GROUP BY year, no HAVING COUNT(*) > 1)",
+    "duplicate_record_key": """
+        (year, record_key) IN (
+            SELECT year, record_key FROM sessions
+            GROUP BY year, record_key HAVING COUNT(*) > 1
+        )
+    """,
+    "orphan_papers": f"TRIM(COALESCE(title, '')) != '' AND ({_empty('session_code')} OR {_empty('session_name')})",
+    "overview_outliers": """
+        (year, session_code, overview) IN (
+            SELECT year, session_code, overview FROM overview_outliers
+        )
+    """
+}
+
+# 概要の長さの年ごとの平均・標準偏差から外れ値のセッションを求める
+# （同じセッションの論文は概要が重複するため、セッション単位で1件として数える）
+OVERVIEW_OUTLIERS_CTE = """
+    WITH session_overviews AS (
+        SELECT DISTINCT year, session_code, overview, LENGTH(overview) AS length
+        FROM sessions
+        WHERE overview IS NOT NULL AND TRIM(overview) != '' AND (? IS NULL OR year = ?)
+    ),
+    overview_stats AS (
+        SELECT year, AVG(length) AS mean,
+               SQRT(MAX(AVG(length * length) - AVG(length) * AVG(length), 0)) AS std
+        FROM session_overviews
+        GROUP BY year
+    ),
+    overview_outliers AS (
+        SELECT o.year, o.session_code, o.overview, o.length, s.mean, s.std
+        FROM session_overviews AS o
+        JOIN overview_stats AS s ON s.year = o.year
+        WHERE s.std > 0 AND ABS(o.length - s.mean) > ? * s.std
+    )
+"""
+
+def empty_rates(db, year=None):
+    """カラムごと・年ごとの空値（NULLまたは空文字）の件数と割合（1回の集計クエリ）"""
+    condition, params = _year_filter(year)
+    sums = ",\n".join(f"SUM(CASE WHEN {_empty(column)} THEN 1 ELSE 0 END) AS {column}"
+                      for column in AUDIT_COLUMNS)
+    rows = db.fetch_dicts(f"""
+        SELECT year, COUNT(*) AS total, {sums}
+        FROM sessions
+        WHERE {condition}
+        GROUP BY year
+        ORDER BY year DESC
+    """, params)
+    return {
+        str(row["year"]): {
+            "total": row["total"],
+            "columns": {
+                column: {"empty": row[column], "rate": round(row[column] / row["total"], 4) if row["total"] else 0.0}
+                for column in AUDIT_COLUMNS
+            }
+        }
+        for row in rows
+    }
+
+def duplicate_keys(db, year=None):
+    """重複したキー（年内のno、年内のrecord_key）の件数と例"""
+    condition, params = _year_filter(year)
+    results = {}
+    for name, key, where in [
+        ("no", "year, no", condition),
+        ("record_key", "year, record_key", f"{condition} AND record_key IS NOT NULL")
+    ]:
+        rows = db.fetch_dicts(f"""
+            SELECT {key}, COUNT(*) AS count, COUNT(*) OVER () AS groups
+            FROM sessions
+            WHERE {where}
+            GROUP BY {key}
+            HAVING COUNT(*) > 1
+            ORDER BY count DESC, {key}
+            LIMIT ?
+        """, params + (SAMPLE_LIMIT,))
+        results[name] = {
+            "groups": rows[0]["groups"] if rows else 0,
+            "samples": [{k: v for k, v in row.items() if k != "groups"} for row in rows]
+        }
+    return results
+
+def no_gaps(db, year=None):
+    """年内のnoの欠番（連番の途切れ）の件数と例（ウィンドウ関数による1回の走査）"""
+    condition, params = _year_filter(year)
+    rows = db.fetch_dicts(f"""
+        WITH numbered AS (
+            SELECT year, no, LAG(no) OVER (PARTITION BY year ORDER BY no) AS prev_no
+            FROM sessions
+            WHERE {condition}
+        ),
+        gaps AS (
+            SELECT year, prev_no + 1 AS gap_start, no - 1 AS gap_end, no - prev_no - 1 AS missing
+            FROM numbered
+            WHERE no - prev_no > 1
+        )
+        SELECT *, COUNT(*) OVER () AS gap_count, SUM(missing) OVER () AS missing_total
+        FROM gaps
+        ORDER BY missing DESC, gap_start
+        LIMIT ?
+    """, params + (SAMPLE_LIMIT,))
+    return {
+        "gaps": rows[0]["gap_count"] if rows else 0,
+        "missing_numbers": rows[0]["missing_total"] if rows else 0,
+        "samples": [{k: row[k] for k in ("year", "gap_start", "gap_end", "missing")} for row in rows]
+    }
+
+def orphan_papers(db, year=None):
+    """セッションに紐付かない論文（タイトルがあるがセッションコードまたはセッション名が空）"""
+    condition, params = _year_filter(year)
+    rows = db.fetch_dicts(f"""
+        SELECT year, no, COUNT(*) OVER () AS orphan_count
+        FROM sessions
+        WHERE {condition} AND {DRILL_DOWN_CONDITIONS['orphan_papers']}
+        ORDER BY year, no
+        LIMIT ?
+    """, params + (SAMPLE_LIMIT,))
+    return {
+        "count": rows[0]["orphan_count"] if rows else 0,
+        "samples": [{"year": row["year"], "no": row["no"]} for row in rows]
+    }
+
+def overview_outliers(db, year=None, sigma=OVERVIEW_OUTLIER_SIGMA):
+    """概要の長さが年の平均から大きく外れたセッション"""
+    rows = db.fetch_dicts(OVERVIEW_OUTLIERS_CTE + """
+        SELECT year, session_code, length, ROUND(mean, 1) AS mean, ROUND(std, 1) AS std,
+               COUNT(*) OVER () AS outlier_count
+        FROM overview_outliers
+        ORDER BY ABS(length - mean) DESC
+        LIMIT ?
+    """, (year, year, sigma, SAMPLE_LIMIT))
+    return {
+        "sigma": sigma,
+        "count": rows[0]["outlier_count"] if rows else 0,
+        "samples": [{k: v for k, v in row.items() if k != "outlier_count"} for row in rows]
+    }
+
+def run_audit(db=None, year=None):
+    """データ品質の監査結果を集計する
+
+    全行を取得せず、チェックごとの集計クエリの結果（件数と数件の例）のみを返す。
+    該当する行は fetch_page で必要な分だけ取得する。
+    """
+    db = db or DatabaseHandler()
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "database": db.db_path,
+        "year": year,
+        "empty_rates": empty_rates(db, year),
+        "duplicate_keys": duplicate_keys(db, year),
+        "no_gaps": no_gaps(db, year),
+        "orphan_papers": orphan_papers(db, year),
+        "overview_outliers": overview_outliers(db, year)
+    }
+
+def fetch_page(db, check, year=None, after=None, page_size=20):
+    """監査で検出された行をページ単位で取得する（年・no・idによるキーセットページング）
+
+    noが重複した行（duplicate_no）もページの境界で飛ばさないよう、idを最後の並び順に加える。
+
+    Args:
+        check (str): DRILL_DOWN_CONDITIONS のキー（例: "empty:overview", "orphan_papers"）
+        after (tuple): 前のページの最後の行の (year, no, id)（省略時は先頭から）
+
+    Returns:
+        tuple: (行の辞書のリスト, 次のページのafter。最後のページの場合はNone)
+    """
+    if check not in DRILL_DOWN_CONDITIONS:
+        raise ValueError(f"不明なチェック名です: {check}")
+    query = f"""
+        SELECT id, no, year, session_code, session_name, paper_no, title, LENGTH(overview) AS overview_length
+        FROM sessions
+        WHERE {DRILL_DOWN_CONDITIONS[check]}
+        AND (? IS NULL OR year = ?)
+        AND (? IS NULL OR (year, no, id) > (?, ?, ?))
+        ORDER BY year, no, id
+        LIMIT ?
+    """
+    after_year, after_no, after_id = after or (None, None, None)
+    params = (year, year, after_year, after_year, after_no, after_id, page_size + 1)
+    if check == "overview_outliers":
+        query = OVERVIEW_OUTLIERS_CTE + query
+        params = (year, year, OVERVIEW_OUTLIER_SIGMA) + params
+    rows = db.fetch_dicts(query, params)
+    last = rows[page_size - 1] if len(rows) > page_size else None
+    next_after = (last["year"], last["no"], last["id"]) if last else None
+    return rows[:page_size], next_after
+
+def print_report(report):
+    """監査結果の要約を表示する"""
+    print(f"\n=== データ品質の監査（{report['year'] or '全年'}） ===")
+    for year, stats in report["empty_rates"].items():
+        empty = [f"{column} {value['rate'] * 100:.1f}%"
+                 for column, value in stats["columns"].items() if value["empty"]]
+        print(f"{year}年: {stats['total']}件 / 空値: {', '.join(empty) if empty else 'なし'}")
+    duplicates = report["duplicate_keys"]
+    print(f"重複キー: no {duplicates['no']['groups']}件 / record_key {duplicates['record_key']['groups']}件")
+    gaps = report["no_gaps"]
+    print(f"noの欠番: {gaps['gaps']}箇所（{gaps['missing_numbers'] or 0}件）")
+    orphans = report["orphan_papers"]
+    samples = ", ".join(f"{sample['year']}年 No.{sample['no']}" for sample in orphans["samples"])
+    print(f"セッションに紐付かない論文: {orphans['count']}件" + (f"（{samples} ...）" if samples else ""))
+    outliers = report["overview_outliers"]
+    print(f"概要の長さの外れ値（±{outliers['sigma']}σ）: {outliers['count']}セッション")
+    for sample in outliers["samples"]:
+        print(f"    {sample['year']} {sample['session_code']}: {sample['length']}文字"
+              f"（平均 {sample['mean']} / 標準偏差 {sample['std']}）")
+
+def render_html(report):
+    """監査結果をHTMLに変換する"""
+    def table(headers, rows):
+        head = "".join(f"<th>{html.escape(str(h))}</th>" for h in headers)
+        body = "".join("<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>" for row in rows)
+        return f"<table><tr>{head}</tr>{body}</table>"
+
+    years = list(report["empty_rates"])
+    sections = [
+        "<h2>空値率（カラム × 年）</h2>",
+        table(["カラム"] + [f"{y}年" for y in years], [
+            [column] + [f"{report['empty_rates'][y]['columns'][column]['rate'] * 100:.1f}%" for y in years]
+            for column in AUDIT_COLUMNS
+        ])
+    ]
+    for key, samples in report["duplicate_keys"].items():
+        sections.append(f"<h2>重複キー: {key}（{samples['groups']}件）</h2>")
+        if samples["samples"]:
+            sections.append(table(list(samples["samples"][0]), [row.values() for row in samples["samples"]]))
+    gaps = report["no_gaps"]
+    sections.append(f"<h2>noの欠番（{gaps['gaps']}箇所）</h2>")
+    if gaps["samples"]:
+        sections.append(table(list(gaps["samples"][0]), [row.values() for row in gaps["samples"]]))
+    orphans = report["orphan_papers"]
+    sections.append(f"<h2>セッションに紐付かない論文（{orphans['count']}件）</h2>")
+    if orphans["samples"]:
+        sections.append(table(list(orphans["samples"][0]), [row.values() for row in orphans["samples"]]))
+    outliers = report["overview_outliers"]
+    sections.append(f"<h2>概要の長さの外れ値（{outliers['count']}セッション）</h2>")
+    if outliers["samples"]:
+        sections.append(table(list(outliers["samples"][0]), [row.values() for row in outliers["samples"]]))
+
+    return ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>データ品質の監査</title>"
+            "<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px}</style>"
+            f"</head><body><h1>データ品質の監査</h1><p>{html.escape(report['generated_at'])} / "
+            f"{html.escape(str(report['year'] or '全年'))}</p>{''.join(sections)}</body></html>")
+
+def save_report(report, output_dir=AUDIT_OUTPUT_DIR):
+    """監査結果をJSONとHTMLで保存する"""
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"audit_{report['year'] or 'all'}"
+    json_path = os.path.join(output_dir, f"{name}.json")
+    html_path = os.path.join(output_dir, f"{name}.html")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(render_html(report))
+    print(f"監査結果を出力しました: {json_path}, {html_path}")
+    return json_path, html_path
+
+def print_page(db, check, year=None, page=1, page_size=20):
+    """ドリルダウン: 指定したチェックの該当行を1ページ分表示する"""
+    after = None
+    for _ in range(page - 1):
+        _, after = fetch_page(db, check, year, after, page_size)
+        if after is None:
+            print(f"{page}ページ目はありません")
+            return
+    rows, next_after = fetch_page(db, check, year, after, page_size)
+    print(f"\n=== {check}（{page}ページ目、{page_size}件ずつ） ===")
+    print(f"{'No':>6} | {'年':^4} | {'セッションコード':^15} | {'論文番号':^12} | タイトル")
+    for row in rows:
+        title = row["title"] or ""
+        title = title[:60] + "..." if len(title) > 60 else title
+        print(f"{row['no']:>6} | {row['year']:^4} | {row['session_code'] or '':^15} | "
+              f"{row['paper_no'] or '':^12} | {title}")
+    if next_after is not None:
+        print(f"（続きは --page {page + 1}）")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="データ品質の監査")
+    parser.add_argument("--year", type=int, help="対象の年（省略時は全年）")
+    parser.add_argument("--save", action="store_true", help="JSON・HTMLのレポートを出力する")
+    parser.add_argument("--drill", choices=sorted(DRILL_DOWN_CONDITIONS), help="該当行を表示するチェック")
+    parser.add_argument("--page", type=int, default=1, help="ドリルダウンのページ番号")
+    parser.add_argument("--page-size", type=int, default=20, help="1ページの件数")
+    args = parser.parse_args()
+
+    db = DatabaseHandler()
+    if args.drill:
+        print_page(db, args.drill, args.year, args.page, args.page_size)
+    else:
+        report = run_audit(db, args.year)
+        print_report(report)
+        if args.save:
+            save_report(report)
@@ -1,91 +1,496 @@
 import sqlite3
 import pandas as pd
 import os
+import re
+import hashlib
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from config import DB_PERFORMANCE_PROFILE
+
+# スレッドごとの接続（データベースのパスとプロファイルごとに1つ）
+_thread_state = threading.local()
+
+# 接続時に適用するPRAGMAのプロファイル
+PERFORMANCE_PROFILES = {
+    # SQLiteの既定値のまま
+    "safe": {},
+    # WALで読み取りと書き込みを並行させ、fsyncをチェックポイント時のみに減らす
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,   # 256MB
+        "cache_size": -65536,     # 64MB（負の値はKB単位）
+        "temp_store": "MEMORY"
+    }
+}
+
+# 変更日時（ミリ秒まで。created_atの秒単位の値とも文字列の大小で比較できる）
+TIMESTAMP_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# sessionsテーブルへの挿入文（値の順序は session_row と対応）
+SESSION_INSERT_SQL = f'''
+    INSERT INTO sessions (
+        no, year, session_name, session_code, overview,
+        category, subcategory, paper_no, title,
+        main_author_group, main_author_affiliation,
+        co_author_group, co_author_affiliation,
+        organizers, chairperson,
+        record_key, content_hash, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {TIMESTAMP_NOW_SQL})
+'''
+
+# 内容の比較対象となる列（no・year・管理用の列を除く）
+CONTENT_FIELDS = [
+    "session_name", "session_code", "overview", "category", "subcategory",
+    "paper_no", "title", "main_author_group", "main_author_affiliation",
+    "co_author_group", "co_author_affiliation", "organizers", "chairperson"
+]
+
+# upsertで内容が変わった行の更新文
+SESSION_UPDATE_SQL = f'''
+    UPDATE sessions SET
+        {", ".join(f"{field} = ?" for field in CONTENT_FIELDS)},
+        content_hash = ?
+    WHERE id = ?
+'''
+
+ORAL_ONLY = "ORAL ONLY"
+
+def make_record_key(item):
+    """レコードの自然キー（年を除く部分）を作成する
+
+    セッションコード + 論文番号。論文番号の無い "ORAL ONLY" の発表はタイトルのハッシュで区別する。
+    """
+    session_code = str(item.get('session_code') or '').strip()
+    paper_no = str(item.get('paper_no') or '').strip()
+    if not paper_no or paper_no.upper() == ORAL_ONLY:
+        title = re.sub(r'\s+', ' ', str(item.get('title') or '')).strip().lower()
+        paper_no = f"{ORAL_ONLY}:{hashlib.sha1(title.encode('utf-8')).hexdigest()[:16]}"
+    return f"{session_code}|{paper_no}"
+
+def make_content_hash(item):
+    """レコードの内容のハッシュを作成する（upsertで変更の有無を判定する）"""
+    content = "\x1f".join(str(item.get(field) or '') for field in CONTENT_FIELDS)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def _add_record_keys(conn):
+    """record_key・content_hash列を追加し、既存の行を埋める
+
+    キーとハッシュは取り込み時の内容から計算する。欠損データの補完で行を更新しても変えないため、
+    同じPDFを再度取り込んだ場合は補完済みの行が「変更なし」として扱われる。
+    """
+    conn.execute("ALTER TABLE sessions ADD COLUMN record_key TEXT")
+    conn.execute("ALTER TABLE sessions ADD COLUMN content_hash TEXT")
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    rows = cursor.execute(f"SELECT id, {', '.join(CONTENT_FIELDS)} FROM sessions").fetchall()
+    conn.executemany(
+        "UPDATE sessions SET record_key = ?, content_hash = ? WHERE id = ?",
+        [(make_record_key(row), make_content_hash(row), row["id"]) for row in map(dict, rows)]
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_year_record_key ON sessions (year, record_key)")
+
+# 全文検索の対象列と、BM25での列ごとの重み（タイトル・著者・所属を重視）
+FTS_COLUMNS = [
+    "title", "overview", "session_name",
+    "main_author_group", "main_author_affiliation",
+    "co_author_group", "co_author_affiliation"
+]
+FTS_WEIGHTS = [10.0, 2.0, 3.0, 5.0, 4.0, 3.0, 2.0]
+
+def build_fts_query(text):
+    """入力された検索語をFTS5のクエリに変換する
+
+    各語をダブルクォートで囲み、"solid-state" のような記号を含む語も構文エラーにせずフレーズとして扱う。
+    語はすべて含む（AND）ものを検索する。
+    """
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"' for term in terms if term.strip('"'))
+
+# スキーマのマイグレーション（適用済みのバージョンは PRAGMA user_version で管理）
+# 各要素は (バージョン, 説明, SQL文のリスト または 接続を受け取る関数)
+MIGRATIONS = [
+    (1, "ダッシュボードの集計・絞り込み用インデックス", [
+        # GROUP BY year, category, subcategory をテーブルを読まずに処理する
+        "CREATE INDEX IF NOT EXISTS idx_sessions_year_category ON sessions (year, category, subcategory)"
+    ]),
+    (2, "欠損データ補完・再処理用インデックス", [
+        "CREATE INDEX IF NOT EXISTS idx_sessions_no ON sessions (no)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_year_session_code ON sessions (year, session_code, no)"
+    ]),
+    (3, "upsert用の自然キーと内容ハッシュ", _add_record_keys),
+    (4, "カテゴリー別集計テーブル（トリガーで差分更新）", [
+        '''
+        CREATE TABLE IF NOT EXISTS category_summary (
+            year INTEGER,
+            category TEXT,
+            subcategory TEXT,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_category_summary_key ON category_summary (year, category, subcategory)",
+        # NULLのサブカテゴリも1つのグループとして扱うため、一致判定は IS で行い、
+        # 既存のグループが無い場合（changes() = 0）のみ行を追加する
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_summary_insert
+        AFTER INSERT ON sessions WHEN NEW.category IS NOT NULL
+        BEGIN
+            UPDATE category_summary SET count = count + 1
+            WHERE year IS NEW.year AND category IS NEW.category AND subcategory IS NEW.subcategory;
+            INSERT INTO category_summary (year, category, subcategory, count)
+            SELECT NEW.year, NEW.category, NEW.subcategory, 1 WHERE changes() = 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_summary_delete
+        AFTER DELETE ON sessions WHEN OLD.category IS NOT NULL
+        BEGIN
+            UPDATE category_summary SET count = count - 1
+            WHERE year IS OLD.year AND category IS OLD.category AND subcategory IS OLD.subcategory;
+            DELETE FROM category_summary WHERE count <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_summary_update
+        AFTER UPDATE OF year, category, subcategory ON sessions
+        BEGIN
+            UPDATE category_summary SET count = count - 1
+            WHERE OLD.category IS NOT NULL
+              AND year IS OLD.year AND category IS OLD.category AND subcategory IS OLD.subcategory;
+            DELETE FROM category_summary WHERE count <= 0;
+            UPDATE category_summary SET count = count + 1
+            WHERE NEW.category IS NOT NULL
+              AND year IS NEW.year AND category IS NEW.category AND subcategory IS NEW.subcategory;
+            INSERT INTO category_summary (year, category, subcategory, count)
+            SELECT NEW.year, NEW.category, NEW.subcategory, 1
+            WHERE NEW.category IS NOT NULL AND changes() = 0;
+        END
+        ''',
+        # 既存データの集計
+        '''
+        INSERT INTO category_summary (year, category, subcategory, count)
+        SELECT year, category, subcategory, COUNT(*)
+        FROM sessions
+        WHERE category IS NOT NULL
+        GROUP BY year, category, subcategory
+        '''
+    ]),
+    (5, "全文検索用のFTS5インデックス", [
+        # sessionsを参照する外部コンテンツ形式（本文は重複して保存しない）
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+            {", ".join(FTS_COLUMNS)},
+            content = 'sessions',
+            content_rowid = 'id',
+            tokenize = 'porter unicode61'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_fts_insert AFTER INSERT ON sessions
+        BEGIN
+            INSERT INTO sessions_fts (rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (NEW.id, {", ".join("NEW." + column for column in FTS_COLUMNS)});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_fts_delete AFTER DELETE ON sessions
+        BEGIN
+            INSERT INTO sessions_fts (sessions_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', OLD.id, {", ".join("OLD." + column for column in FTS_COLUMNS)});
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_fts_update AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON sessions
+        BEGIN
+            INSERT INTO sessions_fts (sessions_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', OLD.id, {", ".join("OLD." + column for column in FTS_COLUMNS)});
+            INSERT INTO sessions_fts (rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (NEW.id, {", ".join("NEW." + column for column in FTS_COLUMNS)});
+        END
+        ''',
+        # 既存データの索引化
+        "INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')"
+    ]),
+    (6, "差分エクスポート用の変更日時とエクスポート状態", [
+        "ALTER TABLE sessions ADD COLUMN updated_at TIMESTAMP",
+        "UPDATE sessions SET updated_at = created_at",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_year_updated_at ON sessions(year, updated_at)",
+        # 挿入時はSESSION_INSERT_SQLで設定し、内容・順序・年の更新時はトリガーで更新する
+        # （updated_atのみの更新は対象外のため、トリガーが連鎖することはない）
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sessions_touch
+        AFTER UPDATE OF no, year, {", ".join(CONTENT_FIELDS)} ON sessions
+        BEGIN
+            UPDATE sessions SET updated_at = {TIMESTAMP_NOW_SQL} WHERE id = NEW.id;
+        END
+        ''',
+        # 出力先・年ごとの前回エクスポート時点の件数と最終変更日時
+        '''
+        CREATE TABLE IF NOT EXISTS export_state (
+            target TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            max_updated_at TIMESTAMP,
+            path TEXT NOT NULL,
+            exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (target, year)
+        )
+        '''
+    ]),
+    # エクスポートのたびにDBファイルの更新時刻が変わり、スナップショットが古いと判定されるため、
+    # エクスポート状態は incremental_export の別ファイル（EXPORT_STATE_PATH）に保存する
+    (7, "エクスポート状態をDBの外に移動", [
+        "DROP TABLE IF EXISTS export_state"
+    ]),
+    (8, "年内の並び順（no）用インデックス", [
+        # 年で絞り込んでnoの順に読む処理（前方補完・upsert・出力）で使う
+        "CREATE INDEX IF NOT EXISTS idx_sessions_year_no ON sessions (year, no)"
+    ])
+]
+
+def apply_migrations(conn):
+    """未適用のマイグレーションを順番に適用する
+
+    各マイグレーションは1トランザクションで適用し、同じトランザクション内でuser_versionを更新する。
+
+    Returns:
+        int: 適用後のスキーマバージョン
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"マイグレーションを適用します: v{version} {description}")
+        conn.execute("BEGIN")
+        try:
+            if callable(steps):
+                steps(conn)
+            else:
+                for statement in steps:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+def session_row(no, year, item):
+    """レコードの辞書をSESSION_INSERT_SQL用のタプルに変換する"""
+    return (
+        no,
+        year,
+        item.get('session_name', ''),
+        item.get('session_code', ''),
+        item.get('overview', ''),
+        item.get('category', ''),
+        item.get('subcategory', ''),
+        item.get('paper_no', ''),
+        item.get('title', ''),
+        item.get('main_author_group', ''),
+        item.get('main_author_affiliation', ''),
+        item.get('co_author_group', ''),
+        item.get('co_author_affiliation', ''),
+        item.get('organizers', ''),
+        item.get('chairperson', ''),
+        make_record_key(item),
+        make_content_hash(item)
+    )
 
 class DatabaseHandler:
-    def __init__(self, use_temp_db=False):
+    # カテゴリとサブカテゴリの翻訳マップ
+    CATEGORY_TRANSLATION = {
+        'Vehicle Dynamics': '車両ダイナミクス',
+        'Vehicle Design': '車両設計',
+        'Vehicle Safety': '車両安全',
+        'Vehicle Performance': '車両性能',
+        'Vehicle Testing': '車両試験',
+        'Vehicle Manufacturing': '車両製造',
+        'Vehicle Electronics': '車両電子制御',
+        'Vehicle Materials': '車両材料',
+        'Vehicle Powertrain': '車両パワートレイン',
+        'Vehicle Emissions': '車両排出ガス',
+        'Vehicle Noise': '車両騒音',
+        'Vehicle Vibration': '車両振動',
+        'Vehicle Aerodynamics': '車両空力',
+        'Vehicle Thermal Management': '車両熱管理',
+        'Vehicle Energy Management': '車両エネルギー管理',
+        'Vehicle Connectivity': '車両コネクティビティ',
+        'Vehicle Automation': '車両自動化',
+        'Vehicle Electrification': '車両電動化',
+        'Vehicle Sustainability': '車両持続可能性',
+        'Vehicle Cybersecurity': '車両サイバーセキュリティ',
+        'Vehicle Human Factors': '車両人間工学',
+        'Vehicle Regulations': '車両規制',
+        'Vehicle Standards': '車両標準',
+        'Vehicle Education': '車両教育',
+        'Vehicle History': '車両歴史',
+        'Vehicle Future': '車両未来',
+        'Vehicle Other': 'その他'
+    }
+
+    SUBCATEGORY_TRANSLATION = {
+        'Aerodynamics': '空力',
+        'Braking': 'ブレーキ',
+        'Chassis': 'シャシー',
+        'Control Systems': '制御システム',
+        'Crashworthiness': '衝突安全性',
+        'Dynamics': 'ダイナミクス',
+        'Electronics': '電子制御',
+        'Emissions': '排出ガス',
+        'Energy': 'エネルギー',
+        'Engine': 'エンジン',
+        'Fuel': '燃料',
+        'Human Factors': '人間工学',
+        'Materials': '材料',
+        'Noise': '騒音',
+        'Performance': '性能',
+        'Powertrain': 'パワートレイン',
+        'Safety': '安全',
+        'Simulation': 'シミュレーション',
+        'Testing': '試験',
+        'Thermal': '熱',
+        'Tires': 'タイヤ',
+        'Transmission': 'トランスミッション',
+        'Vehicle Design': '車両設計',
+        'Vibration': '振動',
+        'Other': 'その他'
+    }
+
+    # スキーマの作成・マイグレーションが済んだデータベース（プロセス内で1回だけ実行する）
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+
+    def __init__(self, use_temp_db=False, profile=DB_PERFORMANCE_PROFILE):
         """データベースハンドラの初期化
         
+        接続はスレッドごとに再利用し、テーブルの作成はデータベースごとに最初の1回のみ行うため、
+        呼び出し箇所ごとに生成しても負荷は小さい。
+        
         Args:
             use_temp_db (bool): 一時的なデータベースを使用するかどうか
+            profile (str): 接続時に適用するパフォーマンスプロファイル
         """
-        # 出力ディレクトリの作成
-        self.output_dir = os.path.join("output", "db")
-        os.makedirs(self.output_dir, exist_ok=True)
-        
+        self.profile = profile
+        self.pragmas = PERFORMANCE_PROFILES.get(profile, {})
+        self.last_ingest_report = None
+
         # データベースファイルのパス
+        self.output_dir = os.path.join("output", "db")
         if use_temp_db:
             self.db_path = os.path.join(self.output_dir, "wcx_sessions_temp.db")
-            print(f"一時的なデータベースファイルの保存先: {self.db_path}")
         else:
             self.db_path = os.path.join(self.output_dir, "wcx_sessions.db")
-            print(f"データベースファイルの保存先: {self.db_path}")
-            
-        self.create_tables()
         
-        # カテゴリとサブカテゴリの翻訳マップ
-        self.category_translation = {
-            'Vehicle Dynamics': '車両ダイナミクス',
-            'Vehicle Design': '車両設計',
-            'Vehicle Safety': '車両安全',
-            'Vehicle Performance': '車両性能',
-            'Vehicle Testing': '車両試験',
-            'Vehicle Manufacturing': '車両製造',
-            'Vehicle Electronics': '車両電子制御',
-            'Vehicle Materials': '車両材料',
-            'Vehicle Powertrain': '車両パワートレイン',
-            'Vehicle Emissions': '車両排出ガス',
-            'Vehicle Noise': '車両騒音',
-            'Vehicle Vibration': '車両振動',
-            'Vehicle Aerodynamics': '車両空力',
-            'Vehicle Thermal Management': '車両熱管理',
-            'Vehicle Energy Management': '車両エネルギー管理',
-            'Vehicle Connectivity': '車両コネクティビティ',
-            'Vehicle Automation': '車両自動化',
-            'Vehicle Electrification': '車両電動化',
-            'Vehicle Sustainability': '車両持続可能性',
-            'Vehicle Cybersecurity': '車両サイバーセキュリティ',
-            'Vehicle Human Factors': '車両人間工学',
-            'Vehicle Regulations': '車両規制',
-            'Vehicle Standards': '車両標準',
-            'Vehicle Education': '車両教育',
-            'Vehicle History': '車両歴史',
-            'Vehicle Future': '車両未来',
-            'Vehicle Other': 'その他'
-        }
-        
-        self.subcategory_translation = {
-            'Aerodynamics': '空力',
-            'Braking': 'ブレーキ',
-            'Chassis': 'シャシー',
-            'Control Systems': '制御システム',
-            'Crashworthiness': '衝突安全性',
-            'Dynamics': 'ダイナミクス',
-            'Electronics': '電子制御',
-            'Emissions': '排出ガス',
-            'Energy': 'エネルギー',
-            'Engine': 'エンジン',
-            'Fuel': '燃料',
-            'Human Factors': '人間工学',
-            'Materials': '材料',
-            'Noise': '騒音',
-            'Performance': '性能',
-            'Powertrain': 'パワートレイン',
-            'Safety': '安全',
-            'Simulation': 'シミュレーション',
-            'Testing': '試験',
-            'Thermal': '熱',
-            'Tires': 'タイヤ',
-            'Transmission': 'トランスミッション',
-            'Vehicle Design': '車両設計',
-            'Vibration': '振動',
-            'Other': 'その他'
-        }
+        key = os.path.abspath(self.db_path)
+        with self._init_lock:
+            if key not in self._initialized_paths or not os.path.exists(key):
+                os.makedirs(self.output_dir, exist_ok=True)
+                if use_temp_db:
+                    print(f"一時的なデータベースファイルの保存先: {self.db_path}")
+                else:
+                    print(f"データベースファイルの保存先: {self.db_path}")
+                self.create_tables()
+                self._initialized_paths.add(key)
+
+    def get_connection(self):
+        """現在のスレッドで再利用する接続を返す（初回のみ接続してPRAGMAを適用する）
+
+        同じ接続を使い回すため、sqlite3の文キャッシュによりパラメータ化したクエリは再コンパイルされない。
+        """
+        connections = _thread_state.__dict__.setdefault("connections", {})
+        key = (os.path.abspath(self.db_path), self.profile)
+        conn = connections.get(key)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            connections[key] = conn
+        return conn
+
+    @contextmanager
+    def connect(self):
+        """プロファイルのPRAGMAを適用した接続を返す
+
+        ブロックを正常に抜けるとコミットし、例外時はロールバックする。
+        入れ子で使った場合は最も外側のブロックでのみコミット・ロールバックする。
+        """
+        conn = self.get_connection()
+        depth = _thread_state.__dict__.setdefault("depth", {})
+        key = id(conn)
+        depth[key] = depth.get(key, 0) + 1
+        try:
+            yield conn
+            if depth[key] == 1:
+                conn.commit()
+        except Exception:
+            if depth[key] == 1:
+                conn.rollback()
+            raise
+        finally:
+            depth[key] -= 1
+
+    def close(self):
+        """現在のスレッドの接続を閉じる"""
+        connections = _thread_state.__dict__.get("connections", {})
+        conn = connections.pop((os.path.abspath(self.db_path), self.profile), None)
+        if conn is not None:
+            conn.close()
+
+    def query_df(self, query, params=()):
+        """パラメータ化したクエリの結果をDataFrameで返す"""
+        with self.connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def fetch_all(self, query, params=()):
+        """パラメータ化したクエリの結果をタプルのリストで返す"""
+        with self.connect() as conn:
+            return conn.execute(query, params).fetchall()
+
+    def fetch_one(self, query, params=()):
+        """パラメータ化したクエリの最初の1行を返す"""
+        with self.connect() as conn:
+            return conn.execute(query, params).fetchone()
+
+    def fetch_dicts(self, query, params=(), exclude=()):
+        """パラメータ化したクエリの結果を辞書のリストで返す
+
+        Args:
+            exclude (iterable): 結果から除外する列名
+        """
+        with self.connect() as conn:
+            cursor = conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            keep = [i for i, column in enumerate(columns) if column not in exclude]
+            return [{columns[i]: row[i] for i in keep} for row in cursor]
+
+    def iter_batches(self, query, params=(), batch_size=5000):
+        """パラメータ化したクエリの結果を一定件数ずつ返す（全件をメモリに載せない）
+
+        Yields:
+            tuple: (列名のリスト, 最大batch_size件の行タプルのリスト)
+        """
+        cursor = self.get_connection().execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            cursor.close()
+
+    def execute(self, query, params=()):
+        """パラメータ化した更新系クエリを実行し、変更行数を返す"""
+        with self.connect() as conn:
+            return conn.execute(query, params).rowcount
 
     def create_tables(self):
         """必要なテーブルを作成"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.cursor()
             
             # セッションテーブルの作成
@@ -111,69 +516,439 @@ class DatabaseHandler:
             )
             ''')
             
+            # 処理に失敗したチャンクの保存先（デッドレターキュー）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS failed_chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                year INTEGER,
+                chunk_index INTEGER,
+                session_code TEXT,
+                prev_session_code TEXT,
+                chunk_text TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 1,
+                status TEXT DEFAULT 'pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (year, chunk_index)
+            )
+            ''')
+            
             conn.commit()
+            
+            # バージョン管理されたスキーマ変更を適用
+            apply_migrations(conn)
+
+    def store_data(self, data, year, mode="append"):
+        """データをSQLiteデータベースに保存する
 
-    def store_data(self, data, year):
-        """データをSQLiteデータベースに保存する"""
+        Args:
+            data (list): 保存するレコードのリスト
+            year (int or str): 年
+            mode (str): "append" は常に末尾に追加する。
+                "upsert" は年 + 自然キー（make_record_key）で既存の行と照合し、
+                新規の行のみ追加、内容が変わった行は更新、同じ内容の行は何もしない。
+                新規の行は入力での位置に合わせてその年の範囲の中に挿入する（後ろの年のnoはずらす）
+        """
         try:
             # データの検証
             if not validate_db_input(data, year):
                 print("Error: データの検証に失敗しました")
                 return False
+            if mode not in ("append", "upsert"):
+                print(f"Error: 不明な保存モードです: {mode}")
+                return False
             
-            # データベース接続
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 現在の最大noを取得
-            cursor.execute("SELECT MAX(no) FROM sessions")
-            max_no = cursor.fetchone()[0] or 0
-            
-            # データの挿入
-            for i, item in enumerate(data, 1):
-                cursor.execute('''
-                    INSERT INTO sessions (
-                        no, year, session_name, session_code, overview,
-                        category, subcategory, paper_no, title,
-                        main_author_group, main_author_affiliation,
-                        co_author_group, co_author_affiliation,
-                        organizers, chairperson
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    max_no + i,  # 連番を設定
-                    year,
-                    item.get('session_name', ''),
-                    item.get('session_code', ''),
-                    item.get('overview', ''),
-                    item.get('category', ''),
-                    item.get('subcategory', ''),
-                    item.get('paper_no', ''),
-                    item.get('title', ''),
-                    item.get('main_author_group', ''),
-                    item.get('main_author_affiliation', ''),
-                    item.get('co_author_group', ''),
-                    item.get('co_author_affiliation', ''),
-                    item.get('organizers', ''),
-                    item.get('chairperson', '')
-                ))
+            # 行データを事前に作成し、1トランザクションでまとめて挿入
+            with self.connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                
+                inserts = data
+                updates = []
+                unchanged = 0
+                existing = {}
+                if mode == "upsert":
+                    # 同じキーが複数ある場合は出現順に対応付ける
+                    for row_id, key, stored_hash in conn.execute(
+                        "SELECT id, record_key, content_hash FROM sessions WHERE year = ? ORDER BY no, id",
+                        (int(year),)
+                    ):
+                        existing.setdefault(key, []).append((row_id, stored_hash))
+                    inserts = []
+                    # 新規の行は入力で直前にある既存の行の後ろに挿入する（既存の行より前にある場合は年の先頭）
+                    placements = {}
+                    anchor = None
+                    for item in data:
+                        matches = existing.get(make_record_key(item))
+                        if not matches:
+                            inserts.append(item)
+                            placements.setdefault(anchor, []).append(item)
+                            continue
+                        row_id, stored_hash = matches.pop(0)
+                        anchor = row_id
+                        new_hash = make_content_hash(item)
+                        if new_hash == stored_hash:
+                            unchanged += 1
+                        else:
+                            updates.append(tuple(item.get(field, '') for field in CONTENT_FIELDS)
+                                           + (new_hash, row_id))
+                
+                if mode == "upsert":
+                    # 新規の行は全体の末尾ではなく、その年の範囲の中の位置に挿入する
+                    if placements:
+                        self._insert_in_year_order(conn, int(year), placements)
+                else:
+                    # 現在の最大noを取得
+                    max_no = conn.execute("SELECT MAX(no) FROM sessions").fetchone()[0] or 0
+                    
+                    rows = [session_row(max_no + i, year, item) for i, item in enumerate(inserts, 1)]
+                    conn.executemany(SESSION_INSERT_SQL, rows)
+                conn.executemany(SESSION_UPDATE_SQL, updates)
             
-            conn.commit()
-            conn.close()
-            print(f"データベースへの保存が完了しました（{len(data)}件）")
+            self.last_ingest_report = {
+                "inserted": len(inserts),
+                "updated": len(updates),
+                "unchanged": unchanged,
+                "not_in_input": sum(len(matches) for matches in existing.values())
+            }
+            if mode == "upsert":
+                report = self.last_ingest_report
+                print(f"データベースへの保存が完了しました（追加 {report['inserted']}件 / "
+                      f"更新 {report['updated']}件 / 変更なし {report['unchanged']}件）")
+                if report["not_in_input"]:
+                    print(f"Info: 入力に含まれない既存の行が{report['not_in_input']}件あります（削除はしません）")
+            else:
+                print(f"データベースへの保存が完了しました（{len(data)}件）")
             return True
             
         except Exception as e:
             print(f"Error: データベースへの保存中にエラーが発生: {str(e)}")
             return False
 
+    def record_failed_chunks(self, failed_chunks, year):
+        """処理に失敗したチャンクをデッドレターキューに記録する
+
+        同じ年・チャンク番号が既に記録されている場合は試行回数を加算する。
+        """
+        if not failed_chunks:
+            return True
+        try:
+            with self.connect() as conn:
+                conn.executemany('''
+                    INSERT INTO failed_chunks (
+                        year, chunk_index, session_code, prev_session_code, chunk_text, error
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (year, chunk_index) DO UPDATE SET
+                        session_code = excluded.session_code,
+                        prev_session_code = excluded.prev_session_code,
+                        chunk_text = excluded.chunk_text,
+                        error = excluded.error,
+                        attempts = attempts + 1,
+                        status = 'pending',
+                        updated_at = CURRENT_TIMESTAMP
+                ''', [
+                    (int(year), chunk["chunk_index"], chunk.get("session_code"),
+                     chunk.get("prev_session_code"), chunk["chunk_text"], chunk["error"])
+                    for chunk in failed_chunks
+                ])
+            print(f"失敗したチャンクを記録しました（{len(failed_chunks)}件）")
+            return True
+        except Exception as e:
+            print(f"Error: 失敗チャンクの記録中にエラーが発生: {str(e)}")
+            return False
+
+    def get_failed_chunks(self, year=None, max_attempts=None):
+        """未解決の失敗チャンクを取得する"""
+        query = "SELECT * FROM failed_chunks WHERE status = 'pending'"
+        params = []
+        if year:
+            query += " AND year = ?"
+            params.append(int(year))
+        if max_attempts:
+            query += " AND attempts < ?"
+            params.append(max_attempts)
+        query += " ORDER BY year, chunk_index"
+        return self.fetch_dicts(query, params)
+
+    def update_failed_chunk(self, chunk_id, resolved, error=None):
+        """失敗チャンクの再処理結果を記録する"""
+        with self.connect() as conn:
+            if resolved:
+                conn.execute('''
+                    UPDATE failed_chunks
+                    SET status = 'resolved', updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (chunk_id,))
+            else:
+                conn.execute('''
+                    UPDATE failed_chunks
+                    SET attempts = attempts + 1, error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (error, chunk_id))
+
+    def _insert_in_year_order(self, conn, year, placements):
+        """年内の指定した位置にレコードを挿入し、その年の行のnoを振り直す
+
+        noはテーブル全体で一意で、年ごとに連続した範囲を占める（年の範囲は取り込んだ順）。
+        挿入・削除でその年の範囲の長さが変わった場合は、後ろにある他の年の行のnoを同じトランザクションでずらす。
+        年のデータが無い場合は全体の末尾に連番で追加する。
+
+        Args:
+            placements (dict): 直前の行のid（先頭に挿入する場合はNone） -> 挿入するレコードのリスト
+
+        Returns:
+            int: 挿入した最初の行のno（挿入しなかった場合はNone）
+        """
+        existing = conn.execute(
+            "SELECT id, no FROM sessions WHERE year = ? ORDER BY no, id", (year,)
+        ).fetchall()
+        if existing:
+            # 前にある年の範囲の直後から振り直す（削除で先頭に空いた番号も詰める）
+            block_start = conn.execute(
+                "SELECT COALESCE(MAX(no), 0) + 1 FROM sessions WHERE year != ? AND no < ?",
+                (year, existing[0][1])
+            ).fetchone()[0]
+            next_start = conn.execute(
+                "SELECT MIN(no) FROM sessions WHERE year != ? AND no > ?", (year, existing[0][1])
+            ).fetchone()[0]
+            next_no = block_start
+        else:
+            next_start = None
+            next_no = conn.execute("SELECT COALESCE(MAX(no), 0) FROM sessions").fetchone()[0] + 1
+
+        renumbered, rows = [], []
+        for item in placements.get(None, []):
+            rows.append(session_row(next_no, year, item))
+            next_no += 1
+        for row_id, no in existing:
+            if no != next_no:
+                renumbered.append((next_no, row_id))
+            next_no += 1
+            for item in placements.get(row_id, []):
+                rows.append(session_row(next_no, year, item))
+                next_no += 1
+
+        if next_start is not None and next_start != next_no:
+            # 後ろの年の範囲をこの年の範囲の直後に合わせる（noが変わった行は変更日時も更新される）
+            conn.execute(
+                "UPDATE sessions SET no = no + ? WHERE year != ? AND no >= ?",
+                (next_no - next_start, year, next_start)
+            )
+        conn.executemany("UPDATE sessions SET no = ? WHERE id = ?", renumbered)
+        conn.executemany(SESSION_INSERT_SQL, rows)
+        return min(row[0] for row in rows) if rows else None
+
+    def merge_chunk_records(self, data, year, session_code, prev_session_code=None, replace_keys=()):
+        """再処理したチャンクのレコードを本来の位置（no）に挿入する
+
+        このチャンクの行（ローカル抽出による代替行など）が既にあれば置き換える。置き換える行は
+        自然キー（make_record_key）が再処理したレコードまたは replace_keys と一致する行に限る
+        （"Part N" のセッションは同じコードを共有し、1つのセッションが複数のチャンクに分かれることもあるため、
+        セッションコードやセッション名では他のチャンクの行も対象になる）。
+        無い場合は直前のチャンクのセッションの末尾に挿入する。noの振り直しは対象の年の中だけで行う。
+
+        Args:
+            replace_keys (list): 置き換え対象に加える自然キー（ローカル抽出の代替行のキーなど）
+        """
+        try:
+            if not validate_db_input(data, year):
+                print("Error: データの検証に失敗しました")
+                return False
+
+            year = int(year)
+            record_keys = sorted({make_record_key(item) for item in data} | set(replace_keys))
+            with self.connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+
+                # 置き換え対象の既存行
+                replaced = [row_id for (row_id,) in conn.execute(f'''
+                    SELECT id FROM sessions
+                    WHERE year = ? AND record_key IN ({', '.join('?' * len(record_keys))})
+                ''', (year, *record_keys))]
+
+                if replaced:
+                    # 置き換える行のうち最初の行の直前の位置
+                    anchor = conn.execute(f'''
+                        SELECT id FROM sessions
+                        WHERE year = ? AND no < (
+                            SELECT MIN(no) FROM sessions WHERE id IN ({', '.join('?' * len(replaced))})
+                        )
+                        ORDER BY no DESC, id DESC LIMIT 1
+                    ''', (year, *replaced)).fetchone()
+                    conn.execute(f"DELETE FROM sessions WHERE id IN ({', '.join('?' * len(replaced))})", replaced)
+                elif prev_session_code:
+                    anchor = conn.execute('''
+                        SELECT id FROM sessions
+                        WHERE year = ? AND session_code = ?
+                        ORDER BY no DESC, id DESC LIMIT 1
+                    ''', (year, prev_session_code)).fetchone()
+                    if anchor is None:
+                        # 位置が特定できない場合はその年の末尾
+                        anchor = conn.execute(
+                            "SELECT id FROM sessions WHERE year = ? ORDER BY no DESC, id DESC LIMIT 1", (year,)
+                        ).fetchone()
+                else:
+                    # 先頭のチャンクの場合はその年の最初の行の前に挿入
+                    anchor = None
+
+                first_no = self._insert_in_year_order(conn, year, {anchor[0] if anchor else None: data})
+            print(f"セッション {session_code} のレコードをNo.{first_no}以降に統合しました"
+                  f"（{len(data)}件、置き換え {len(replaced)}件）")
+            return True
+
+        except Exception as e:
+            print(f"Error: 再処理データの統合中にエラーが発生: {str(e)}")
+            return False
+
+    def _copy_database(self, target):
+        """SQLiteのバックアップAPIでこのデータベースの内容をtargetに丸ごと複製する
+
+        全ページを1ステップ（1トランザクション）で複製するため、WALモードの読み取り側は
+        複製前か複製後のどちらかの状態だけを参照し、待たされることもない。
+        """
+        source_conn = self.get_connection()
+        target_conn = target.get_connection()
+        source_conn.commit()
+        target_conn.commit()
+        source_conn.backup(target_conn)
+
+    def stage_from(self, live):
+        """本番のデータベースをステージング用（このハンドラ）に複製する
+
+        取り込み・補完・検証はステージング側で行い、完了後に promote_to で本番に反映する。
+        ステージング中に本番へ書き込まれた変更は、反映時に上書きされる。
+        """
+        try:
+            live._copy_database(self)
+            print(f"ステージング用データベースを準備しました: {self.db_path}")
+            return True
+        except Exception as e:
+            print(f"Error: ステージング用データベースの準備中にエラーが発生: {str(e)}")
+            return False
+
+    def validate_staging(self, year):
+        """ステージング用データベースを本番に反映してよいか検証する
+
+        Returns:
+            bool: 問題が無い場合はTrue
+        """
+        errors = []
+        integrity = self.fetch_one("PRAGMA quick_check")[0]
+        if integrity != "ok":
+            errors.append(f"整合性チェックに失敗しました: {integrity}")
+
+        year_rows = self.fetch_one("SELECT COUNT(*) FROM sessions WHERE year = ?", (int(year),))[0]
+        if year_rows == 0:
+            errors.append(f"{year}年のデータがありません")
+
+        # noはテーブル全体で一意で、年ごとに連続した範囲を占める（_insert_in_year_order）
+        duplicate_no = self.fetch_one("SELECT COUNT(*) - COUNT(DISTINCT no) FROM sessions")[0]
+        if duplicate_no:
+            errors.append(f"noが重複している行があります（{duplicate_no}件）")
+        overlapping_years = self.fetch_all("""
+            WITH blocks AS (
+                SELECT year, MIN(no) AS first_no, MAX(no) AS last_no FROM sessions GROUP BY year
+            )
+            SELECT a.year, b.year
+            FROM blocks AS a
+            JOIN blocks AS b ON a.year < b.year AND a.first_no <= b.last_no AND b.first_no <= a.last_no
+            ORDER BY a.year, b.year
+        """)
+        if overlapping_years:
+            pairs = ", ".join(f"{a}年と{b}年" for a, b in overlapping_years)
+            errors.append(f"noの範囲が重なっている年があります（{pairs}）")
+
+        summary_rows = self.fetch_one(
+            "SELECT COALESCE(SUM(count), 0) FROM category_summary WHERE year = ?", (int(year),)
+        )[0]
+        categorized_rows = self.fetch_one(
+            "SELECT COUNT(*) FROM sessions WHERE year = ? AND category IS NOT NULL", (int(year),)
+        )[0]
+        if summary_rows != categorized_rows:
+            errors.append(f"カテゴリー集計が一致しません（集計 {summary_rows}件 / 実データ {categorized_rows}件）")
+
+        missing_codes = self.fetch_one(
+            "SELECT COUNT(*) FROM sessions WHERE year = ? AND (session_code IS NULL OR session_code = '')",
+            (int(year),)
+        )[0]
+        if missing_codes:
+            print(f"Warning: セッションコードが空の行が残っています（{missing_codes}件）")
+
+        for error in errors:
+            print(f"Error: {error}")
+        if not errors:
+            print(f"ステージング用データベースの検証が完了しました（{year}年 {year_rows}件）")
+        return not errors
+
+    def promote_to(self, live):
+        """検証済みのステージング用データベースを本番に反映する"""
+        try:
+            self._copy_database(live)
+            print(f"ステージング用データベースを本番に反映しました: {live.db_path}")
+            return True
+        except Exception as e:
+            print(f"Error: 本番への反映中にエラーが発生: {str(e)}")
+            return False
+
+    def search_sessions(self, text, year_from=None, year_to=None, categories=None, limit=50):
+        """全文検索（FTS5）で論文を検索し、関連度順に返す
+
+        Args:
+            text (str): 検索語（空白区切りの語をすべて含むものを検索）
+            year_from (int): この年以降に絞り込む
+            year_to (int): この年以前に絞り込む
+            categories (list): カテゴリで絞り込む
+            limit (int): 最大件数
+
+        Returns:
+            DataFrame: 論文の情報、ハイライト付きの抜粋（snippet）、BM25スコア（score、小さいほど関連度が高い）
+        """
+        match = build_fts_query(text or "")
+        if not match:
+            return pd.DataFrame()
+
+        query = f'''
+            SELECT
+                s.year, s.category, s.subcategory, s.session_name, s.session_code,
+                s.paper_no, s.title,
+                s.main_author_group, s.main_author_affiliation,
+                s.co_author_group, s.co_author_affiliation,
+                snippet(sessions_fts, -1, '**', '**', '…', 16) AS snippet,
+                bm25(sessions_fts, {", ".join(str(weight) for weight in FTS_WEIGHTS)}) AS score
+            FROM sessions_fts
+            JOIN sessions s ON s.id = sessions_fts.rowid
+            WHERE sessions_fts MATCH ?
+        '''
+        params = [match]
+        if year_from:
+            query += " AND s.year >= ?"
+            params.append(int(year_from))
+        if year_to:
+            query += " AND s.year <= ?"
+            params.append(int(year_to))
+        if categories:
+            query += f" AND s.category IN ({', '.join('?' for _ in categories)})"
+            params.extend(categories)
+        query += " ORDER BY score LIMIT ?"
+        params.append(int(limit))
+
+        try:
+            return self.query_df(query, params)
+        except Exception as e:
+            print(f"Error: 全文検索中にエラーが発生: {e}")
+            return pd.DataFrame()
+
     def get_category_summary(self, year=None):
-        """カテゴリー別の集計を取得"""
+        """カテゴリー別の集計を取得（トリガーで更新される集計テーブルから読み込む）"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                query = "SELECT * FROM category_summary"
-                if year:
-                    query += f" WHERE year = {year}"
-                df = pd.read_sql_query(query, conn)
+            query = "SELECT year, category, subcategory, count FROM category_summary"
+            params = []
+            if year:
+                query += " WHERE year = ?"
+                params.append(int(year))
+            query += " ORDER BY year, category, subcategory"
+            with self.connect() as conn:
+                df = pd.read_sql_query(query, conn, params=params)
             return df
         except Exception as e:
             print(f"Error: カテゴリー集計中にエラー: {e}")
@@ -186,6 +961,9 @@ class DatabaseHandler:
             if summary_df is None or summary_df.empty:
                 return None
             
+            # サブカテゴリーの件数をカテゴリー単位に合算
+            summary_df = summary_df.groupby('category', as_index=False)['count'].sum()
+            
             # グラフの作成（例：棒グラフ）
             plot = summary_df.plot(
                 kind='bar',
@@ -206,7 +984,7 @@ class DatabaseHandler:
     def delete_all_data(self):
         """データベースの全データを削除する"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM sessions")
                 conn.commit()
@@ -217,11 +995,11 @@ class DatabaseHandler:
 
     def translate_category(self, category):
         """カテゴリを日本語に翻訳"""
-        return self.category_translation.get(category, category)
+        return self.CATEGORY_TRANSLATION.get(category, category)
     
     def translate_subcategory(self, subcategory):
         """サブカテゴリを日本語に翻訳"""
-        return self.subcategory_translation.get(subcategory, subcategory)
+        return self.SUBCATEGORY_TRANSLATION.get(subcategory, subcategory)
 
 def validate_db_input(data, year):
     """データベース入力の妥当性を検証する
@@ -0,0 +1,213 @@
+import os
+import argparse
+from datetime import datetime
+import pandas as pd
+from db_handler import DatabaseHandler, CONTENT_FIELDS, make_record_key
+from export_to_excel import EXPORT_COLUMNS
+
+# 取り込み対象の列（エクスポートの見出し -> sessionsの列）。Authors・OEMは派生列のため対象外
+IMPORT_COLUMNS = {header: expression for header, expression in EXPORT_COLUMNS if expression in CONTENT_FIELDS}
+KEY_HEADERS = ['No', 'Year']
+IMPORT_OUTPUT_DIR = os.path.join("output", "import")
+
+def read_export(path, sheet_name='WCX Sessions'):
+    """編集されたエクスポートファイルを読み込む
+
+    読み取り専用モードで1行ずつ読み込み、取り込みに使う列だけをDataFrameにする。
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name in workbook.sheetnames else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        headers = [str(value).strip() if value is not None else "" for value in next(rows)]
+        missing = [header for header in ['Year'] + list(IMPORT_COLUMNS) if header not in headers]
+        if missing:
+            raise ValueError(f"必要な列がありません: {', '.join(missing)}")
+        wanted = [(i, header) for i, header in enumerate(headers) if header in IMPORT_COLUMNS or header in KEY_HEADERS]
+        records = [[row[i] if i < len(row) else None for i, _ in wanted]
+                   for row in rows if any(value is not None for value in row)]
+    finally:
+        workbook.close()
+
+    df = pd.DataFrame(records, columns=[header for _, header in wanted])
+    df = df.rename(columns=IMPORT_COLUMNS).rename(columns={'No': 'no', 'Year': 'year'})
+    df['year'] = pd.to_numeric(df['year'], errors='coerce').astype('Int64')
+    if 'no' in df.columns:
+        df['no'] = pd.to_numeric(df['no'], errors='coerce').astype('Int64')
+    return df
+
+def _normalize(series):
+    """比較用に空セル（None/NaN）を空文字にそろえ、文字列に変換する"""
+    return series.astype(object).where(series.notna(), '').astype(str).str.strip()
+
+def _add_record_key(df):
+    """自然キー（make_record_key。年は含まない）の列を追加する"""
+    df = df.copy()
+    values = df[CONTENT_FIELDS].astype(object)
+    values = values.where(values.notna(), None)
+    df['record_key'] = [make_record_key(row) for row in values.to_dict('records')]
+    return df
+
+def _match_by_no(edited, current):
+    """年 + noで対応付け、自然キーは確認に使う
+
+    キーが変わった行（キーの列が編集された行）のうち、変更後のキーがその年の別のDBの行のキーと一致するものは、
+    エクスポート後にnoが振り直された可能性があるため照合しない。同じnoが複数ある行（行のコピーなど）も照合しない。
+    """
+    merged = edited.merge(current, left_on=['year', 'no'], right_on=['year', 'db_no'], how='left', indicator=True)
+    found = merged['_merge'].eq('both') & ~merged.duplicated(['year', 'no'], keep=False)
+    key_changed = found & merged['record_key'].ne(merged['db_record_key'])
+    db_keys = set(zip(current['year'], current['db_record_key']))
+    conflict = key_changed & pd.Series(
+        [(year, key) in db_keys for year, key in zip(merged['year'], merged['record_key'])], index=merged.index
+    )
+    if conflict.any():
+        print(f"Warning: 変更後のキーが別の行と一致するため照合しなかった行があります（{int(conflict.sum())}件）")
+    matched = merged[found & ~conflict].drop(columns='_merge')
+    unmatched = merged[~(found & ~conflict)][edited.columns]
+    return matched, unmatched
+
+def _match_by_key(edited, current):
+    """No列が無い場合に年 + 自然キーで対応付ける
+
+    同じキーが複数ある行は出現順では正しく対応付けられないため照合しない。
+    """
+    duplicated = pd.concat([
+        edited.loc[edited.duplicated(['year', 'record_key'], keep=False), ['year', 'record_key']],
+        current.loc[current.duplicated(['year', 'db_record_key'], keep=False), ['year', 'db_record_key']]
+        .rename(columns={'db_record_key': 'record_key'})
+    ]).drop_duplicates()
+    is_ambiguous = edited.merge(duplicated, on=['year', 'record_key'], how='left', indicator=True)['_merge'].eq('both').values
+    merged = edited[~is_ambiguous].merge(current, left_on=['year', 'record_key'], right_on=['year', 'db_record_key'],
+                                         how='left', indicator=True)
+    matched = merged[merged['_merge'] == 'both'].drop(columns='_merge')
+    unmatched = pd.concat([merged[merged['_merge'] == 'left_only'][edited.columns], edited[is_ambiguous]])
+    return matched, unmatched
+
+def match_rows(edited, current):
+    """編集後の行とDBの行を対応付ける
+
+    No列がある場合（export_to_excelの出力）は年 + noで照合し、自然キー（セッションコード・論文番号・
+    ORAL ONLYはタイトル）は照合結果の確認に使う。No列が無い場合は年 + 自然キーで照合する。
+
+    Returns:
+        tuple: (対応付けた行のDataFrame（列名の末尾が_newは編集後、_oldはDB、db_noはDBのno）,
+                対応が無い編集後の行のDataFrame)
+    """
+    edited = _add_record_key(edited).rename(columns={column: f"{column}_new" for column in CONTENT_FIELDS})
+    current = _add_record_key(current).rename(columns={column: f"{column}_old" for column in CONTENT_FIELDS})
+    current = current.rename(columns={'no': 'db_no', 'record_key': 'db_record_key'})
+    current['db_no'] = current['db_no'].astype('Int64')
+    if 'no' in edited.columns:
+        return _match_by_no(edited, current)
+    return _match_by_key(edited, current)
+
+def compute_diff(matched):
+    """列ごとに編集前後を比較し、変更されたセルの一覧を返す（列単位のベクトル演算）"""
+    changes = []
+    for column in CONTENT_FIELDS:
+        new = _normalize(matched[f'{column}_new'])
+        old = _normalize(matched[f'{column}_old'])
+        changed = new != old
+        if changed.any():
+            changes.append(pd.DataFrame({
+                'id': matched.loc[changed, 'id'].astype(int).values,
+                'no': matched.loc[changed, 'db_no'].astype(int).values,
+                'year': matched.loc[changed, 'year'].astype(int).values,
+                'column': column,
+                'old': old[changed].values,
+                'new': new[changed].values
+            }))
+    if not changes:
+        return pd.DataFrame(columns=['id', 'no', 'year', 'column', 'old', 'new'])
+    return pd.concat(changes, ignore_index=True).sort_values(['year', 'no', 'column'], ignore_index=True)
+
+def apply_diff(db, diff):
+    """変更されたセルのみを1トランザクションで更新する
+
+    updated_at・カテゴリー別集計・全文検索インデックスはトリガーで更新される。
+    """
+    with db.connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for column, changes in diff.groupby('column'):
+            conn.executemany(
+                f"UPDATE sessions SET {column} = ? WHERE id = ?",
+                list(zip(changes['new'], changes['id'].astype(int).tolist()))
+            )
+    return len(diff)
+
+def print_diff_report(diff, unmatched_count, total):
+    """差分の要約を表示する"""
+    print(f"\n=== Excelの差分（{total}行） ===")
+    print(f"変更されたセル: {len(diff)}件（{diff['id'].nunique() if len(diff) else 0}行）"
+          f" / 照合できなかった行: {unmatched_count}件")
+    for column, count in diff['column'].value_counts().items():
+        print(f"  {column}: {count}件")
+    for row in diff.head(10).itertuples():
+        old = row.old[:40] + "..." if len(row.old) > 40 else row.old
+        new = row.new[:40] + "..." if len(row.new) > 40 else row.new
+        print(f"    No.{row.no} ({row.year}) {row.column}: '{old}' → '{new}'")
+    if len(diff) > 10:
+        print(f"    ...ほか{len(diff) - 10}件")
+
+def import_excel(path, apply=False, db=None, report_dir=IMPORT_OUTPUT_DIR):
+    """編集されたエクスポートファイルの変更をDBに反映する
+
+    Args:
+        path (str): 編集されたExcelファイル（export_to_excelの出力形式）
+        apply (bool): Falseの場合は差分レポートの出力のみ行う（ドライラン）
+
+    Returns:
+        dict: changed_cells, changed_rows, unmatched, applied。エラー時はNone
+    """
+    try:
+        db = db or DatabaseHandler()
+        edited = read_export(path)
+        edited = edited[edited['year'].notna()]
+        years = sorted(int(year) for year in edited['year'].unique())
+        if not years:
+            print("Warning: 取り込み対象の行がありません")
+            return None
+
+        current = db.query_df(f"""
+            SELECT id, no, year, {', '.join(CONTENT_FIELDS)}
+            FROM sessions
+            WHERE year IN ({', '.join('?' * len(years))})
+        """, tuple(years))
+        current['year'] = current['year'].astype('Int64')
+
+        matched, unmatched = match_rows(edited, current)
+        diff = compute_diff(matched)
+        print_diff_report(diff, len(unmatched), len(edited))
+
+        # 差分レポートを保存
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f"excel_diff_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        diff.to_csv(report_path, index=False, encoding='utf-8-sig')
+        print(f"差分レポートを出力しました: {report_path}")
+
+        applied = 0
+        if apply and len(diff):
+            applied = apply_diff(db, diff)
+            print(f"変更を反映しました: {applied}セル")
+        elif len(diff):
+            print("Info: ドライランのため反映していません（反映するには --apply を指定）")
+
+        return {
+            "changed_cells": len(diff),
+            "changed_rows": int(diff['id'].nunique()) if len(diff) else 0,
+            "unmatched": len(unmatched),
+            "applied": applied
+        }
+    except Exception as e:
+        print(f"Error: Excelファイルの取り込み中にエラーが発生: {str(e)}")
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="編集されたエクスポートファイルの変更をDBに反映する")
+    parser.add_argument("path", help="編集されたExcelファイル")
+    parser.add_argument("--apply", action="store_true", help="差分をDBに反映する（省略時はドライラン）")
+    args = parser.parse_args()
+    import_excel(args.path, apply=args.apply)
@@ -1,6 +1,5 @@
 from db_handler import DatabaseHandler
 import pandas as pd
-import sqlite3
 from datetime import datetime
 import os
 
@@ -142,102 +141,280 @@ def extract_oem(row):
     # main authorに自動車メーカーが含まれていない場合のみ、co-authorを確認
     return check_maker(co_affiliation)
 
-def export_to_excel():
-    """データベースの内容をExcelファイルとしてエクスポート"""
+# 出力する列（見出し, SQLの式）。著者はダッシュボードの表示と同じ形式をSQLで組み立てる
+EXPORT_COLUMNS = [
+    ('No', 'no'),
+    ('Year', 'year'),
+    ('Category', 'category'),
+    ('Subcategory', 'subcategory'),
+    ('Session Name', 'session_name'),
+    ('Session Code', 'session_code'),
+    ('Paper No', 'paper_no'),
+    ('Title', 'title'),
+    ('Authors', """CASE
+        WHEN COALESCE(main_author_group, '') != ''
+            THEN main_author_group || ' (' || COALESCE(main_author_affiliation, 'None') || ')'
+        WHEN COALESCE(co_author_group, '') != ''
+            THEN ', ' || co_author_group || ' (' || COALESCE(co_author_affiliation, 'None') || ')'
+        ELSE '' END"""),
+    ('Main Author Group', 'main_author_group'),
+    ('Main Author Affiliation', 'main_author_affiliation'),
+    ('Co-Author Group', 'co_author_group'),
+    ('Co-Author Affiliation', 'co_author_affiliation'),
+    ('OEM', None),
+    ('Overview', 'overview'),
+    ('Organizers', 'organizers'),
+    ('Chairperson', 'chairperson')
+]
+EXPORT_ORDER = "ORDER BY year DESC, category, subcategory, no"
+
+# OEM列はextract_oemで行ごとに求めるため、幅は最長のメーカー名（Mercedes-Benz）で決める
+OEM_MAX_LENGTH = len('Mercedes-Benz')
+# 列幅の上限（文字数）
+MAX_COLUMN_WIDTH = 100
+EXPORT_BATCH_SIZE = 5000
+
+def column_width(max_length):
+    """最長の文字数から列幅を求める（余白2文字、上限100文字）"""
+    return min(int(max_length or 0) + 2, MAX_COLUMN_WIDTH)
+
+def frame_column_widths(df):
+    """DataFrameの列ごとの最長文字数（見出しを含む）から列幅を求める
+
+    セルを1つずつ走査せず、列単位の文字列長の最大値で計算する。
+    """
+    if df.empty:
+        return [column_width(len(str(column))) for column in df.columns]
+    return [
+        column_width(max(len(str(column)), df[column].astype(str).str.len().max()))
+        for column in df.columns
+    ]
+
+def write_sheet(target, headers, widths, rows, sheet_name='WCX Sessions'):
+    """書き込み専用モードのブックに行を順に書き込む（メモリ使用量は行数によらず一定）
+
+    書き込み専用モードでは最初の行を書く時点で列幅が確定するため、widthsは事前に求めておく。
+
+    Args:
+        target: 出力先のファイルパスまたはファイルオブジェクト
+        rows (iterable): 行の値のシーケンス
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    for i, width in enumerate(widths, 1):
+        worksheet.column_dimensions[get_column_letter(i)].width = width
+    worksheet.append(headers)
+    count = 0
+    for row in rows:
+        worksheet.append(row)
+        count += 1
+    workbook.save(target)
+    return count
+
+def export_column_widths(db, where="", params=()):
+    """出力する列の最長文字数をSQLの集計（1回の走査）で求める"""
+    expressions = [f"MAX(LENGTH({expression}))" if expression else "NULL" for _, expression in EXPORT_COLUMNS]
+    maxima = db.fetch_one(f"SELECT {', '.join(expressions)} FROM sessions {where}", params)
+    return [
+        column_width(max(len(header), OEM_MAX_LENGTH if expression is None else (maximum or 0)))
+        for (header, expression), maximum in zip(EXPORT_COLUMNS, maxima)
+    ]
+
+def iter_export_batches(db, where="", params=(), batch_size=EXPORT_BATCH_SIZE):
+    """出力する行をカーソルから一定件数ずつ読み込み、OEM列を付けてバッチ単位で返す"""
+    expressions = [expression for _, expression in EXPORT_COLUMNS if expression]
+    affiliation_columns = ['main_author_affiliation', 'co_author_affiliation']
+    query = f"""
+        SELECT {', '.join(expressions)}, {', '.join(affiliation_columns)}
+        FROM sessions
+        {where}
+        {EXPORT_ORDER}
+    """
+    oem_index = [header for header, _ in EXPORT_COLUMNS].index('OEM')
+    for _, rows in db.iter_batches(query, params, batch_size):
+        batch = []
+        for row in rows:
+            values = list(row[:len(expressions)])
+            oem = extract_oem(dict(zip(affiliation_columns, row[len(expressions):])))
+            values.insert(oem_index, oem)
+            batch.append(values)
+        yield batch
+
+def iter_export_rows(db, where="", params=(), batch_size=EXPORT_BATCH_SIZE):
+    """出力する行をカーソルから一定件数ずつ読み込み、OEM列を付けて1行ずつ返す"""
+    for batch in iter_export_batches(db, where, params, batch_size):
+        yield from batch
+
+def export_to_excel(output_file=None, year=None, batch_size=EXPORT_BATCH_SIZE, db=None):
+    """データベースの内容をExcelファイルとしてエクスポート
+
+    DataFrameを作らずにカーソルから一定件数ずつ読み込み、書き込み専用モードのブックに書き込む。
+    """
     try:
         # データベースに接続
-        db = DatabaseHandler()
-        with sqlite3.connect(db.db_path) as conn:
-            # メインのクエリを実行してデータを取得
-            query = """
-                SELECT 
-                    no,
-                    year,
-                    category,
-                    subcategory,
-                    session_name,
-                    session_code,
-                    overview,
-                    paper_no,
-                    title,
-                    main_author_group,
-                    main_author_affiliation,
-                    co_author_group,
-                    co_author_affiliation,
-                    organizers,
-                    chairperson
-                FROM sessions
-                ORDER BY year DESC, category, subcategory
-            """
-            
-            # pandasのDataFrameとしてデータを読み込み
-            df = pd.read_sql_query(query, conn)
-            
-            # 自動車メーカーを抽出
-            df['oem'] = df.apply(extract_oem, axis=1)
-            
-            # 著者情報を結合
-            df['authors'] = df.apply(lambda x: 
-                f"{x['main_author_group']} ({x['main_author_affiliation']})" if x['main_author_group'] else "" +
-                (f", {x['co_author_group']} ({x['co_author_affiliation']})" if x['co_author_group'] else ""), 
-                axis=1
-            )
-            
-            # 列の順序を設定
-            df = df[[
-                'no', 'year', 'category', 'subcategory', 
-                'session_name', 'session_code', 'paper_no', 'title',
-                'authors', 'main_author_group', 'main_author_affiliation',
-                'co_author_group', 'co_author_affiliation', 'oem',
-                'overview', 'organizers', 'chairperson'
-            ]]
-            
-            # 列名を設定
-            df.columns = [
-                'No', 'Year', 'Category', 'Subcategory',
-                'Session Name', 'Session Code', 'Paper No', 'Title',
-                'Authors', 'Main Author Group', 'Main Author Affiliation',
-                'Co-Author Group', 'Co-Author Affiliation', 'OEM',
-                'Overview', 'Organizers', 'Chairperson'
-            ]
-            
-            # 出力ディレクトリの作成
+        db = db or DatabaseHandler()
+        where, params = ("WHERE year = ?", (int(year),)) if year else ("", ())
+        
+        # 出力ファイル名の生成
+        if output_file is None:
             output_dir = "output/excel"
             os.makedirs(output_dir, exist_ok=True)
-            
-            # 現在の日時を取得
             current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # 出力ファイル名の生成
             output_file = f"{output_dir}/wcx_sessions_{current_time}.xlsx"
-            
-            # Excelファイルとして保存
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='WCX Sessions', index=False)
-                
-                # ワークシートを取得
-                worksheet = writer.sheets['WCX Sessions']
-                
-                # カラム幅の自動調整
-                for column in worksheet.columns:
-                    max_length = 0
-                    column = [cell for cell in column]
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    adjusted_width = min(adjusted_width, 100)  # 最大幅を100文字に制限
-                    worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-            
-            print(f"Excelファイルを出力しました: {output_file}")
-            return True
-            
+        
+        # 列幅を先に求めてから行を書き込む
+        widths = export_column_widths(db, where, params)
+        headers = [header for header, _ in EXPORT_COLUMNS]
+        count = write_sheet(output_file, headers, widths, iter_export_rows(db, where, params, batch_size))
+        
+        print(f"Excelファイルを出力しました: {output_file}（{count}件）")
+        return True
+        
     except Exception as e:
         print(f"Error: Excelファイルの出力中にエラーが発生: {str(e)}")
         return False
 
+class WorkbookAggregates:
+    """分析用ブックの集計（行のバッチごとに加算し、全件を保持しない）
+
+    バッチをカテゴリ型のDataFrameにしてgroupbyで件数を求め、これまでの件数に加算する。
+    """
+
+    HEADERS = [header for header, _ in EXPORT_COLUMNS]
+    TOP_AFFILIATIONS = 50
+
+    def __init__(self):
+        self.category_counts = None
+        self.subcategory_counts = None
+        self.oem_counts = None
+        self.affiliation_counts = None
+
+    @staticmethod
+    def _accumulate(total, counts):
+        return counts if total is None else total.add(counts, fill_value=0)
+
+    def add(self, batch):
+        """1バッチ分の行（EXPORT_COLUMNSの順）を集計に加える"""
+        df = pd.DataFrame(batch, columns=self.HEADERS)
+        for column in ['Year', 'Category', 'Subcategory', 'OEM']:
+            df[column] = df[column].astype('category')
+
+        self.category_counts = self._accumulate(
+            self.category_counts, df.groupby(['Category', 'Year'], observed=True).size())
+        self.subcategory_counts = self._accumulate(
+            self.subcategory_counts, df.groupby(['Category', 'Subcategory', 'Year'], observed=True).size())
+        oems = df[df['OEM'] != '']
+        self.oem_counts = self._accumulate(
+            self.oem_counts, oems.groupby(['OEM', 'Year'], observed=True).size())
+
+        # 所属は "; " 区切りのため分割し、同じ論文内の重複は1件として数える
+        affiliations = pd.concat([
+            df[['Year', column]].rename(columns={column: 'Affiliation'})
+            for column in ['Main Author Affiliation', 'Co-Author Affiliation']
+        ])
+        affiliations['Affiliation'] = affiliations['Affiliation'].fillna('').str.split(';')
+        affiliations = affiliations.explode('Affiliation')
+        affiliations['Affiliation'] = affiliations['Affiliation'].str.strip()
+        affiliations = affiliations[affiliations['Affiliation'] != '']
+        affiliations = affiliations.reset_index().drop_duplicates(['index', 'Affiliation'])
+        affiliations['Affiliation'] = affiliations['Affiliation'].astype('category')
+        self.affiliation_counts = self._accumulate(
+            self.affiliation_counts, affiliations.groupby(['Affiliation', 'Year'], observed=True).size())
+
+    @staticmethod
+    def _pivot(counts, index_name, limit=None):
+        """(項目, 年)の件数を 項目 × 年 の表に変換する（合計の降順）"""
+        if counts is None or counts.empty:
+            return [index_name, 'Total'], []
+        table = counts.unstack('Year', fill_value=0).astype(int)
+        table = table[sorted(table.columns, reverse=True)]
+        table['Total'] = table.sum(axis=1)
+        table = table.sort_values('Total', ascending=False)
+        if limit:
+            table = table.head(limit)
+        headers = [index_name] + [str(year) for year in table.columns]
+        rows = [[index] + values for index, values in zip(table.index, table.values.tolist())]
+        return headers, rows
+
+    def sheets(self):
+        """集計シートの (シート名, 見出し, 行) のリスト"""
+        sheets = [('Year x Category', *self._pivot(self.category_counts, 'Category'))]
+
+        if self.subcategory_counts is not None and not self.subcategory_counts.empty:
+            table = self.subcategory_counts.unstack('Year', fill_value=0).astype(int)
+            table = table[sorted(table.columns, reverse=True)]
+            table['Total'] = table.sum(axis=1)
+            table = table.sort_index()
+            sheets.append(('Subcategory', ['Category', 'Subcategory'] + [str(c) for c in table.columns],
+                           [list(index) + values for index, values in zip(table.index, table.values.tolist())]))
+        else:
+            sheets.append(('Subcategory', ['Category', 'Subcategory', 'Total'], []))
+
+        sheets.append(('OEM', *self._pivot(self.oem_counts, 'OEM')))
+        sheets.append(('Top Affiliations', *self._pivot(self.affiliation_counts, 'Affiliation',
+                                                         self.TOP_AFFILIATIONS)))
+        return sheets
+
+def export_analysis_workbook(output_file=None, year=None, batch_size=EXPORT_BATCH_SIZE, db=None):
+    """生データと集計シート（年×カテゴリー、サブカテゴリー、OEM、上位の所属）を1つのブックに出力する
+
+    生データを書き込むのと同じ1回の読み込みで集計も行う。
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    try:
+        db = db or DatabaseHandler()
+        where, params = ("WHERE year = ?", (int(year),)) if year else ("", ())
+
+        if output_file is None:
+            output_dir = "output/excel"
+            os.makedirs(output_dir, exist_ok=True)
+            current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = f"{output_dir}/wcx_analysis_{current_time}.xlsx"
+
+        workbook = Workbook(write_only=True)
+        raw_sheet = workbook.create_sheet('WCX Sessions')
+        for i, width in enumerate(export_column_widths(db, where, params), 1):
+            raw_sheet.column_dimensions[get_column_letter(i)].width = width
+        raw_sheet.append(WorkbookAggregates.HEADERS)
+
+        aggregates = WorkbookAggregates()
+        count = 0
+        for batch in iter_export_batches(db, where, params, batch_size):
+            for row in batch:
+                raw_sheet.append(row)
+            aggregates.add(batch)
+            count += len(batch)
+
+        for sheet_name, headers, rows in aggregates.sheets():
+            worksheet = workbook.create_sheet(sheet_name)
+            widths = [column_width(max([len(str(header))] + [len(str(row[i])) for row in rows]))
+                      for i, header in enumerate(headers)]
+            for i, width in enumerate(widths, 1):
+                worksheet.column_dimensions[get_column_letter(i)].width = width
+            worksheet.append(headers)
+            for row in rows:
+                worksheet.append(row)
+
+        workbook.save(output_file)
+        print(f"分析用Excelファイルを出力しました: {output_file}（{count}件）")
+        return True
+
+    except Exception as e:
+        print(f"Error: 分析用Excelファイルの出力中にエラーが発生: {str(e)}")
+        return False
+
 if __name__ == "__main__":
-    export_to_excel() 
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="データベースの内容をExcelファイルとして出力する")
+    parser.add_argument("--year", type=int, help="対象の年（省略時は全年）")
+    parser.add_argument("--analysis", action="store_true", help="集計シートを含む分析用ブックを出力する")
+    args = parser.parse_args()
+    if args.analysis:
+        export_analysis_workbook(year=args.year)
+    else:
+        export_to_excel(year=args.year) 
\ No newline at end of file
@@ -0,0 +1,158 @@
+import os
+import io
+import csv
+import json
+import gzip
+import argparse
+from db_handler import DatabaseHandler
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# 出力するカラム（内部管理用のid・created_at・record_key・content_hashは含めない）
+EXPORT_FIELDS = [
+    "no", "year", "category", "subcategory", "session_name", "session_code", "overview",
+    "paper_no", "title", "main_author_group", "main_author_affiliation",
+    "co_author_group", "co_author_affiliation", "organizers", "chairperson"
+]
+INTEGER_FIELDS = {"no", "year"}
+
+FORMATS = ["csv", "jsonl", "parquet"]
+COMPRESSIONS = ["gzip", "zstd"]
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+EXPORT_DIR = os.path.join("output", "export")
+EXPORT_BATCH_SIZE = 5000
+
+def build_filter(years=None, categories=None):
+    """年・カテゴリーの絞り込み条件（WHERE句とパラメータ）を作成する"""
+    conditions, params = [], []
+    if years:
+        conditions.append(f"year IN ({', '.join('?' * len(years))})")
+        params.extend(int(year) for year in years)
+    if categories:
+        conditions.append(f"category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, tuple(params)
+
+def iter_session_batches(db, years=None, categories=None, batch_size=EXPORT_BATCH_SIZE):
+    """sessionsテーブルの行をカーソルから一定件数ずつ返す（年・noの順）"""
+    where, params = build_filter(years, categories)
+    query = f"SELECT {', '.join(EXPORT_FIELDS)} FROM sessions {where} ORDER BY year, no"
+    for _, rows in db.iter_batches(query, params, batch_size):
+        yield rows
+
+def default_output_path(fmt, years=None, compression=None):
+    """出力ファイル名を作成する（例: output/export/wcx_sessions_2024-2025.jsonl.gz）"""
+    suffix = f"_{'-'.join(str(y) for y in sorted(years))}" if years else ""
+    name = f"wcx_sessions{suffix}.{fmt}"
+    if fmt != "parquet" and compression:
+        # Parquetは列チャンク単位で内部圧縮するため拡張子は変えない
+        name += COMPRESSION_SUFFIXES[compression]
+    return os.path.join(EXPORT_DIR, name)
+
+def open_text_output(path, compression=None):
+    """テキスト出力先を開く（gzipは標準ライブラリ、zstdはpyarrowの圧縮ストリームを使用）"""
+    if compression is None:
+        return open(path, "w", encoding="utf-8", newline="")
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        if pa is None:
+            raise RuntimeError("zstd圧縮にはpyarrowが必要です")
+        return io.TextIOWrapper(pa.CompressedOutputStream(path, "zstd"), encoding="utf-8", newline="")
+    raise ValueError(f"未対応の圧縮形式です: {compression}")
+
+def write_csv(batches, path, compression=None):
+    """CSV（見出し行あり）として書き出す"""
+    count = 0
+    with open_text_output(path, compression) as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+        for rows in batches:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def write_jsonl(batches, path, compression=None):
+    """JSON Lines（1行1レコード）として書き出す"""
+    count = 0
+    with open_text_output(path, compression) as f:
+        for rows in batches:
+            f.writelines(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n" for row in rows)
+            count += len(rows)
+    return count
+
+def parquet_schema():
+    """Parquetのスキーマ（no・yearは整数、それ以外は文字列）"""
+    return pa.schema([(field, pa.int64() if field in INTEGER_FIELDS else pa.string()) for field in EXPORT_FIELDS])
+
+def write_parquet(batches, path, compression=None):
+    """Parquetとして書き出す（バッチごとに行グループを追加する。圧縮の既定はsnappy）"""
+    if pa is None:
+        raise RuntimeError("Parquetの出力にはpyarrowが必要です")
+    schema = parquet_schema()
+    count = 0
+    with pq.ParquetWriter(path, schema, compression=compression or "snappy") as writer:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_table(pa.table(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema
+            ))
+            count += len(rows)
+    return count
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+def export_sessions(fmt, output_path=None, years=None, categories=None, compression=None,
+                    batch_size=EXPORT_BATCH_SIZE, db=None):
+    """sessionsテーブルをCSV・JSON Lines・Parquetで書き出す
+
+    カーソルから一定件数ずつ読み込んで書き出すため、全件をメモリに載せない。
+    一時ファイルに書いてから置き換えるため、途中で失敗しても既存の出力は壊れない。
+
+    Args:
+        fmt (str): "csv", "jsonl", "parquet"
+        years (list): 対象の年（省略時は全年）
+        categories (list): 対象のカテゴリー（省略時は全カテゴリー）
+        compression (str): None, "gzip", "zstd"
+
+    Returns:
+        str: 出力ファイルのパス。エラー時はNone
+    """
+    try:
+        if fmt not in WRITERS:
+            raise ValueError(f"未対応の出力形式です: {fmt}")
+        if compression not in (None, *COMPRESSIONS):
+            raise ValueError(f"未対応の圧縮形式です: {compression}")
+        db = db or DatabaseHandler()
+        output_path = output_path or default_output_path(fmt, years, compression)
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+        temp_path = output_path + ".tmp"
+        batches = iter_session_batches(db, years, categories, batch_size)
+        count = WRITERS[fmt](batches, temp_path, compression)
+        os.replace(temp_path, output_path)
+        print(f"{fmt.upper()}ファイルを出力しました: {output_path}（{count}件）")
+        return output_path
+    except Exception as e:
+        print(f"Error: {fmt}ファイルの出力中にエラーが発生: {str(e)}")
+        if output_path and os.path.exists(output_path + ".tmp"):
+            os.remove(output_path + ".tmp")
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sessionsテーブルをCSV・JSON Lines・Parquetで出力する")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl", help="出力形式")
+    parser.add_argument("--output", help="出力ファイルのパス（省略時は output/export 以下）")
+    parser.add_argument("--year", type=int, nargs="+", help="対象の年")
+    parser.add_argument("--category", nargs="+", help="対象のカテゴリー")
+    parser.add_argument("--compression", choices=COMPRESSIONS, help="圧縮形式")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="1回に読み込む件数")
+    args = parser.parse_args()
+    export_sessions(args.format, args.output, args.year, args.category, args.compression, args.batch_size)
@@ -1,157 +1,128 @@
+import argparse
 from db_handler import DatabaseHandler
-import sqlite3
+from data_audit import run_audit, print_report, no_gaps, duplicate_keys
 
 def check_database_order():
-    """データベースの内容を異なる並び順で確認する"""
+    """データベースの並び順（noの欠番・重複キー）を確認する
+
+    全件を表示せず、data_audit の集計結果と数件の例のみを表示する。
+    """
     try:
         print("\nデータベースの並び順を確認します...")
         db = DatabaseHandler()
-        
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 異なる並び順でデータを取得して比較
-            queries = {
-                "ID順": "SELECT id, no, session_code, session_name, paper_no, title FROM sessions ORDER BY id",
-                "No順": "SELECT id, no, session_code, session_name, paper_no, title FROM sessions ORDER BY no",
-                "登録順": "SELECT id, no, session_code, session_name, paper_no, title FROM sessions ORDER BY created_at",
-                "セッションコード順": "SELECT id, no, session_code, session_name, paper_no, title FROM sessions ORDER BY session_code"
-            }
-            
-            for order_name, query in queries.items():
-                print(f"\n=== {order_name} ===")
-                print("-" * 100)
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                
-                print(f"{'ID':^5} | {'No':^5} | {'セッションコード':^15} | {'セッション名':^30} | {'論文番号':^10} | タイトル")
-                print("-" * 100)
-                
-                for row in rows:
-                    id_, no, code, name, paper, title = row
-                    # 長いフィールドは省略
-                    name = (name[:27] + '...') if name and len(name) > 30 else (name or '').ljust(30)
-                    title = (title[:40] + '...') if title and len(title) > 40 else (title or '')
-                    print(f"{id_:^5} | {no:^5} | {code or '':^15} | {name} | {paper or '':^10} | {title}")
+        report = {"no_gaps": no_gaps(db), "duplicate_keys": duplicate_keys(db)}
+        gaps = report["no_gaps"]
+        print(f"noの欠番: {gaps['gaps']}箇所（{gaps['missing_numbers'] or 0}件）")
+        for sample in gaps["samples"]:
+            print(f"    {sample['year']}年: {sample['gap_start']}〜{sample['gap_end']}")
+        for key, duplicates in report["duplicate_keys"].items():
+            print(f"重複した{key}: {duplicates['groups']}件")
+        return report
 
     except Exception as e:
         print(f"Error: データベースの確認中にエラーが発生: {str(e)}")
 
-def check_database_content():
-    """データベースの詳細な内容を確認する"""
+def check_database_content(year=None):
+    """データベースの内容を確認する
+
+    全レコードを表示せず、data_audit の監査結果の要約を表示する。
+    該当行は python data_audit.py --drill <チェック名> でページ単位に確認できる。
+    """
     try:
         print("\nデータベースの詳細内容を確認します...")
-        db = DatabaseHandler()
-        
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # 総レコード数を取得
-            cursor.execute("SELECT COUNT(*) FROM sessions")
-            total_count = cursor.fetchone()[0]
-            print(f"\n総レコード数: {total_count}")
-            
-            # 全レコードを取得
-            cursor.execute("""
-                SELECT id, no, year, session_name, session_code, overview, 
-                       category, subcategory, paper_no, title, 
-                       main_author_group, main_author_affiliation,
-                       co_author_group, co_author_affiliation
-                FROM sessions
-                ORDER BY no
-            """)
-            
-            # カラム名を取得
-            columns = [description[0] for description in cursor.description]
-            
-            # 結果を表示
-            print("\nデータベースの内容:")
-            print("-" * 100)
-            for row in cursor.fetchall():
-                print("\n--- レコード ---")
-                for col, val in zip(columns, row):
-                    # 長いフィールドは省略して表示
-                    if val and isinstance(val, str) and len(val) > 100:
-                        val = val[:100] + "..."
-                    print(f"{col}: {val}")
-                print("-" * 50)
+        report = run_audit(DatabaseHandler(), year)
+        print_report(report)
+        return report
 
     except Exception as e:
         print(f"Error: データベースの確認中にエラーが発生: {str(e)}")
 
-def fix_missing_session_data():
-    """セッション情報が欠損しているデータを補完する"""
+# 欠損行（セッションコードと概要がともに空）を、同じ年の直前の有効な行（両方が空でない）で埋める
+# 有効な行の累積数をグループ番号とし、各欠損行は同じグループの有効な行から値を受け取る
+FORWARD_FILL_SQL = """
+    WITH ordered AS (
+        SELECT
+            id, year, no,
+            CASE WHEN session_code IS NOT NULL AND session_code != ''
+                  AND overview IS NOT NULL AND overview != '' THEN 1 ELSE 0 END AS is_valid,
+            CASE WHEN (session_code IS NULL OR session_code = '')
+                  AND (overview IS NULL OR overview = '') THEN 1 ELSE 0 END AS is_missing,
+            session_name, session_code, overview
+        FROM sessions
+        WHERE {condition}
+    ),
+    grouped AS (
+        SELECT *, SUM(is_valid) OVER (PARTITION BY year ORDER BY no ROWS UNBOUNDED PRECEDING) AS grp
+        FROM ordered
+    ),
+    fills AS (
+        SELECT target.id, source.session_name, source.session_code, source.overview
+        FROM grouped AS target
+        JOIN grouped AS source
+          ON source.year = target.year AND source.grp = target.grp AND source.is_valid = 1
+        WHERE target.is_missing = 1
+    )
+    UPDATE sessions
+    SET session_name = fills.session_name,
+        session_code = fills.session_code,
+        overview = fills.overview
+    FROM fills
+    WHERE sessions.id = fills.id
+"""
+
+def forward_fill_query(year=None):
+    """前方補完のUPDATE文とパラメータ
+
+    年を指定した場合は year = ? の条件にして、idx_sessions_year_no で対象の年だけを読む
+    （? IS NULL OR year = ? の形ではインデックスが使われず全件を走査する）。
+    """
+    if year is None:
+        return FORWARD_FILL_SQL.format(condition="1 = 1"), ()
+    return FORWARD_FILL_SQL.format(condition="year = ?"), (int(year),)
+
+def fix_missing_session_data(db=None, year=None):
+    """セッション情報が欠損しているデータを補完する
+
+    1回のUPDATE（ウィンドウ関数による前方補完）を1トランザクションで実行する。
+    年の先頭など、直前に有効な行が無い欠損行は補完せずに件数を報告する。
+
+    Args:
+        db (DatabaseHandler): 補完対象のデータベース（省略時は本番のデータベース）
+        year (int): 補完対象の年（省略時は全年。いずれの場合も補完元は同じ年の行に限る）
+
+    Returns:
+        dict: filled（補完した行数）、unfilled（補完できなかった行数）。エラー時はNone
+    """
     try:
         print("\n欠損データの補完を開始します...")
-        db = DatabaseHandler()
+        db = db or DatabaseHandler()
+        year = int(year) if year else None
         
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            
-            while True:
-                # 未補完の欠損データを1件取得
-                cursor.execute("""
-                    SELECT id, no, session_name, session_code, overview, paper_no, title
-                    FROM sessions
-                    WHERE (session_code IS NULL OR session_code = '')
-                    AND (overview IS NULL OR overview = '')
-                    ORDER BY no
-                    LIMIT 1
-                """)
-                
-                row = cursor.fetchone()
-                if not row:
-                    print("\n全ての欠損データの補完が完了しました")
-                    break
-                    
-                id_, no, session_name, session_code, overview, paper_no, title = row
-                
-                # 直前の有効なデータを取得
-                cursor.execute("""
-                    SELECT session_name, session_code, overview
-                    FROM sessions
-                    WHERE no < ?
-                    AND session_code IS NOT NULL
-                    AND session_code != ''
-                    AND overview IS NOT NULL
-                    AND overview != ''
-                    ORDER BY no DESC
-                    LIMIT 1
-                """, (no,))
-                
-                prev_row = cursor.fetchone()
-                if not prev_row:
-                    print(f"\n警告: No.{no}の直前に有効なデータが見つかりませんでした")
-                    continue
-                
-                prev_name, prev_code, prev_overview = prev_row
-                
-                # 補完内容を表示
-                print("\n=== 補完対象のデータ ===")
-                print("-" * 100)
-                print(f"No: {no}")
-                print(f"元のセッション名: {session_name}")
-                print(f"新セッション名: {prev_name}")
-                print(f"新セッションコード: {prev_code}")
-                print(f"新概要: {prev_overview[:100]}..." if len(prev_overview) > 100 else prev_overview)
-                print("-" * 100)
-                
-                # データを更新
-                cursor.execute("""
-                    UPDATE sessions 
-                    SET session_name = ?,
-                        session_code = ?,
-                        overview = ?
-                    WHERE id = ?
-                """, (prev_name, prev_code, prev_overview, id_))
-                
-                conn.commit()
-                print("データを補完しました")
-                
-        print("\nデータベースの補完処理を終了します")
+        with db.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(*forward_fill_query(year))
+            # WITH で始まる文は cursor.rowcount が -1 になるため changes() で取得する
+            filled = conn.execute("SELECT changes()").fetchone()[0]
+            unfilled = conn.execute("""
+                SELECT COUNT(*)
+                FROM sessions
+                WHERE (? IS NULL OR year = ?)
+                AND (session_code IS NULL OR session_code = '')
+                AND (overview IS NULL OR overview = '')
+            """, (year, year)).fetchone()[0]
+        
+        target = f"{year}年" if year else "全年"
+        print(f"欠損データを補完しました（{target}: 補完 {filled}件 / 補完できなかった行 {unfilled}件）")
+        if unfilled:
+            print(f"警告: 直前に有効なデータが無いため補完できなかった行が{unfilled}件あります")
+        return {"filled": filled, "unfilled": unfilled}
             
     except Exception as e:
         print(f"Error: データの補完中にエラーが発生: {str(e)}")
+        return None
 
 if __name__ == "__main__":
-    fix_missing_session_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="欠損しているセッション情報を補完する")
+    parser.add_argument("--year", type=int, help="補完対象の年（省略時は全年）")
+    args = parser.parse_args()
+    fix_missing_session_data(year=args.year) 
\ No newline at end of file
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from db_handler import DatabaseHandler
+from exporters import export_sessions, FORMATS, COMPRESSIONS, COMPRESSION_SUFFIXES
+from export_to_excel import export_to_excel
+from config import EXPORT_STATE_PATH
+
+# 年ごとのパーティションの出力先（output/export/partitions/<出力形式>/wcx_sessions_<年>.<拡張子>）
+PARTITION_DIR = os.path.join("output", "export", "partitions")
+MANIFEST_PATH = os.path.join(PARTITION_DIR, "manifest.json")
+TARGETS = ["xlsx"] + FORMATS
+
+def partition_path(target, year, compression=None):
+    """パーティションのファイルパス"""
+    name = f"wcx_sessions_{year}.{target}"
+    if target in ("csv", "jsonl") and compression:
+        name += COMPRESSION_SUFFIXES[compression]
+    return os.path.join(PARTITION_DIR, target, name)
+
+# 年ごとの件数と最終変更日時（idx_sessions_year_updated_at のみで集計する）
+WATERMARK_QUERY = """
+    SELECT year, COUNT(*), MAX(updated_at)
+    FROM sessions
+    GROUP BY year
+"""
+
+def current_watermarks(db):
+    """年ごとの件数と最終変更日時"""
+    return {year: (count, max_updated_at) for year, count, max_updated_at in db.fetch_all(WATERMARK_QUERY)}
+
+class ExportState:
+    """出力先・年ごとの前回エクスポート時点の件数・最終変更日時・ファイルパス
+
+    sessionsのDBに書き込むとDBファイルの更新時刻が変わり、分析用スナップショットが古いと判定されるため、
+    別のSQLiteファイルに保存する。
+    """
+
+    def __init__(self, path=EXPORT_STATE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS export_state (
+                    target TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    max_updated_at TIMESTAMP,
+                    path TEXT NOT NULL,
+                    exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (target, year)
+                )
+            ''')
+
+    def watermarks(self, target):
+        """前回エクスポート時点の年ごとの件数・最終変更日時・ファイルパス"""
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute("""
+                SELECT year, row_count, max_updated_at, path
+                FROM export_state
+                WHERE target = ?
+            """, (target,)).fetchall()
+        return {year: (count, max_updated_at, path) for year, count, max_updated_at, path in rows}
+
+    def save(self, target, year, count, max_updated_at, path):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO export_state (target, year, row_count, max_updated_at, path, exported_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (target, year, count, max_updated_at, path))
+
+    def remove(self, target, year):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("DELETE FROM export_state WHERE target = ? AND year = ?", (target, year))
+
+    def all(self):
+        """すべての出力先・年の状態"""
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("""
+                SELECT target, year, row_count, max_updated_at, path, exported_at
+                FROM export_state
+                ORDER BY target, year
+            """).fetchall()
+
+def export_partition(db, target, year, compression=None):
+    """1年分のパーティションを出力する（一時ファイルに書いてから置き換える）"""
+    path = partition_path(target, year, compression)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if target == "xlsx":
+        temp_path = path + ".tmp.xlsx"
+        if not export_to_excel(temp_path, year, db=db):
+            return None
+        os.replace(temp_path, path)
+        return path
+    return export_sessions(target, path, years=[year], compression=compression, db=db)
+
+def write_manifest(state, path=MANIFEST_PATH):
+    """現在のパーティションファイルの一覧を出力する"""
+    manifest = {"generated_at": datetime.now().isoformat(timespec="seconds"), "partitions": {}}
+    for target, year, count, max_updated_at, file_path, exported_at in state.all():
+        manifest["partitions"].setdefault(target, []).append({
+            "year": year,
+            "path": file_path,
+            "rows": count,
+            "bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
+            "max_updated_at": max_updated_at,
+            "exported_at": exported_at
+        })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return manifest
+
+def export_changed_partitions(target="parquet", compression=None, workers=4, force=False, db=None, state=None):
+    """前回のエクスポート以降に変更された年のパーティションだけを再出力する
+
+    年ごとの件数とupdated_atの最大値をエクスポート状態（ExportState）の値と比較し、異なる年（または出力ファイルが無い年）を
+    並列に出力する。エクスポート状態には出力前に取得した値を保存するため、出力中に変更された行は
+    次回のエクスポートで再出力される。データが無くなった年のパーティションは削除する。
+
+    Returns:
+        dict: exported（出力した年）、unchanged（変更の無い年）、removed（削除した年）、failed（失敗した年）
+    """
+    db = db or DatabaseHandler()
+    state = state or ExportState()
+    start = time.perf_counter()
+    current = current_watermarks(db)
+    previous = state.watermarks(target)
+
+    stale = [
+        year for year, watermark in current.items()
+        if force or year not in previous or previous[year][:2] != watermark
+        or previous[year][2] != partition_path(target, year, compression)
+        or not os.path.exists(previous[year][2])
+    ]
+    removed = [year for year in previous if year not in current]
+    result = {
+        "exported": [], "failed": [], "removed": removed,
+        "unchanged": sorted(year for year in current if year not in stale)
+    }
+
+    if stale:
+        print(f"パーティションを出力します（{target}）: {', '.join(str(y) for y in sorted(stale))}")
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale))),
+                                thread_name_prefix="export") as executor:
+            futures = {year: executor.submit(export_partition, db, target, year, compression) for year in stale}
+        for year, future in sorted(futures.items()):
+            path = future.result()
+            if path is None:
+                result["failed"].append(year)
+                continue
+            count, max_updated_at = current[year]
+            state.save(target, year, count, max_updated_at, path)
+            result["exported"].append(year)
+
+    for year in removed:
+        old_path = previous[year][2]
+        if os.path.exists(old_path):
+            os.remove(old_path)
+        state.remove(target, year)
+
+    write_manifest(state)
+    print(f"差分エクスポート完了（{target}）: 出力 {len(result['exported'])}年 / 変更なし {len(result['unchanged'])}年 / "
+          f"削除 {len(removed)}年 / 失敗 {len(result['failed'])}年（{time.perf_counter() - start:.2f}秒）")
+    if result["failed"]:
+        print(f"警告: 出力に失敗した年があります: {', '.join(str(y) for y in result['failed'])}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="変更された年のパーティションのみを出力する")
+    parser.add_argument("--target", choices=TARGETS, default="parquet", help="出力形式")
+    parser.add_argument("--compression", choices=COMPRESSIONS, help="圧縮形式（csv・jsonl・parquet）")
+    parser.add_argument("--workers", type=int, default=4, help="並列に出力する年の数")
+    parser.add_argument("--force", action="store_true", help="変更の有無によらず全年を出力する")
+    args = parser.parse_args()
+    export_changed_partitions(args.target, args.compression, args.workers, args.force)
@@ -0,0 +1,128 @@
+import tiktoken
+from ai_extractor import split_text, get_extraction_prompt, EXTRACTION_SYSTEM_PROMPT
+from categorizer import get_categorization_prompt, CATEGORIZATION_SYSTEM_PROMPT
+from model_router import ROUTE_FAST, ROUTE_STRONG, routing_enabled, score_chunk_difficulty
+from validator import index_chunk
+from config import (
+    AZURE_OPENAI_DEPLOYMENT_NAME, ROUTER_DIFFICULTY_THRESHOLD,
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_BASE_LATENCY, LLM_OUTPUT_TOKENS_PER_SECOND
+)
+
+# 出力トークン数の見積もり基準（既存の抽出結果から算出した1件あたりの平均）
+EXTRACTION_OUTPUT_TOKENS_PER_PAPER = 220
+EXTRACTION_MAX_TOKENS = 2000
+CATEGORIZATION_OUTPUT_TOKENS = 120
+# チャット形式のメッセージ1件あたりのオーバーヘッド
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def get_encoding(model=None):
+    """トークン数計算用のエンコーディングを取得する"""
+    try:
+        return tiktoken.encoding_for_model(model or AZURE_OPENAI_DEPLOYMENT_NAME or "gpt-4")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_message_tokens(encoding, system_prompt, user_prompt):
+    """system/userの2メッセージ分のプロンプトトークン数を数える"""
+    return (len(encoding.encode(system_prompt)) + len(encoding.encode(user_prompt))
+            + MESSAGE_OVERHEAD_TOKENS * 2)
+
+def estimate_text(text, encoding):
+    """1つのPDFテキストについてリクエスト数とトークン数を見積もる"""
+    chunks = split_text(text)
+    estimate = {
+        "chunks": len(chunks),
+        "papers": 0,
+        "extraction_requests": 0,
+        "categorization_requests": 0,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "latency_seconds": 0.0,
+        "routes": {ROUTE_FAST: 0, ROUTE_STRONG: 0}
+    }
+
+    for chunk in chunks:
+        paper_index = index_chunk(chunk)
+        papers = max(len(paper_index), 1)
+        estimate["papers"] += len(paper_index)
+
+        # 抽出リクエスト
+        prompt_tokens = count_message_tokens(encoding, EXTRACTION_SYSTEM_PROMPT, get_extraction_prompt(chunk))
+        output_tokens = min(papers * EXTRACTION_OUTPUT_TOKENS_PER_PAPER, EXTRACTION_MAX_TOKENS)
+        estimate["extraction_requests"] += 1
+        estimate["prompt_tokens"] += prompt_tokens
+        estimate["output_tokens"] += output_tokens
+        estimate["latency_seconds"] += LLM_BASE_LATENCY + output_tokens / LLM_OUTPUT_TOKENS_PER_SECOND
+
+        score = score_chunk_difficulty(chunk, paper_index)
+        route = ROUTE_FAST if routing_enabled() and score < ROUTER_DIFFICULTY_THRESHOLD else ROUTE_STRONG
+        estimate["routes"][route] += 1
+
+        # 分類リクエスト（論文1件につき1回。概要はセッションのヘッダー部分で代用）
+        header = chunk[:paper_index[0]["start"]] if paper_index else chunk
+        for paper in paper_index:
+            prompt_tokens = count_message_tokens(
+                encoding, CATEGORIZATION_SYSTEM_PROMPT, get_categorization_prompt(header, paper["title"])
+            )
+            estimate["categorization_requests"] += 1
+            estimate["prompt_tokens"] += prompt_tokens
+            estimate["output_tokens"] += CATEGORIZATION_OUTPUT_TOKENS
+            estimate["latency_seconds"] += (LLM_BASE_LATENCY
+                                            + CATEGORIZATION_OUTPUT_TOKENS / LLM_OUTPUT_TOKENS_PER_SECOND)
+    return estimate
+
+def project_wall_time(requests, total_tokens, latency_seconds):
+    """レート制限と逐次処理のレイテンシから所要時間（秒）を見積もる"""
+    rpm_bound = requests / LLM_RPM_LIMIT * 60 if LLM_RPM_LIMIT else 0
+    tpm_bound = total_tokens / LLM_TPM_LIMIT * 60 if LLM_TPM_LIMIT else 0
+    return max(rpm_bound, tpm_bound, latency_seconds), rpm_bound, tpm_bound
+
+def estimate_ingest(pdf_texts):
+    """APIを呼び出さずに、取り込みに必要なリクエスト数・トークン数・所要時間を見積もる
+
+    Args:
+        pdf_texts (list): 見積もり対象のPDF（filename, textの辞書のリスト）。
+            main は最初のPDFのみを取り込むため、main からは pdf_texts[:1] を渡す
+
+    Returns:
+        dict: 見積もり結果の合計
+    """
+    encoding = get_encoding()
+    total = {
+        "chunks": 0, "papers": 0, "extraction_requests": 0, "categorization_requests": 0,
+        "prompt_tokens": 0, "output_tokens": 0, "latency_seconds": 0.0,
+        "routes": {ROUTE_FAST: 0, ROUTE_STRONG: 0}
+    }
+
+    print("\n=== 取り込みの見積もり（ドライラン） ===")
+    for pdf in pdf_texts:
+        estimate = estimate_text(pdf["text"], encoding)
+        requests = estimate["extraction_requests"] + estimate["categorization_requests"]
+        print(f"{pdf['filename']}: チャンク {estimate['chunks']}個 / 論文 {estimate['papers']}件 / "
+              f"リクエスト {requests}件 / 入力 {estimate['prompt_tokens']:,}トークン / "
+              f"出力 {estimate['output_tokens']:,}トークン（推定）")
+        for key, value in estimate.items():
+            if key == "routes":
+                for route, count in value.items():
+                    total["routes"][route] += count
+            else:
+                total[key] += value
+
+    requests = total["extraction_requests"] + total["categorization_requests"]
+    total_tokens = total["prompt_tokens"] + total["output_tokens"]
+    wall_seconds, rpm_bound, tpm_bound = project_wall_time(requests, total_tokens, total["latency_seconds"])
+    total["requests"] = requests
+    total["total_tokens"] = total_tokens
+    total["wall_seconds"] = wall_seconds
+
+    print("\n--- 合計 ---")
+    print(f"リクエスト数: {requests}件（抽出 {total['extraction_requests']}件 / 分類 {total['categorization_requests']}件）")
+    if routing_enabled():
+        print(f"抽出のルート: {ROUTE_FAST} {total['routes'][ROUTE_FAST]}件 / {ROUTE_STRONG} {total['routes'][ROUTE_STRONG]}件"
+              "（検証失敗によるエスカレーションは含まない）")
+    print(f"トークン数: 入力 {total['prompt_tokens']:,} / 出力 {total['output_tokens']:,}（推定） / 合計 {total_tokens:,}")
+    print(f"所要時間の見積もり: {wall_seconds / 60:.1f}分 "
+          f"(RPM制限 {rpm_bound / 60:.1f}分 / TPM制限 {tpm_bound / 60:.1f}分 / "
+          f"逐次レイテンシ {total['latency_seconds'] / 60:.1f}分)")
+    print("※ 再試行・再抽出・ヘッジリクエストは含みません")
+    return total
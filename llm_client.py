@@ -0,0 +1,348 @@
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from types import SimpleNamespace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import openai
+from config import (
+    LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RECOVERY_TIMEOUT,
+    LLM_REQUEST_TIMEOUT, LLM_HEDGE_ENABLED, LLM_HEDGE_MIN_SAMPLES, LLM_GATEWAY_URL
+)
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているためAPI呼び出しを遮断したことを示す例外"""
+    pass
+
+class CircuitBreaker:
+    """LLM呼び出し用のサーキットブレーカー
+
+    closed    : 通常状態。APIを呼び出し、連続失敗回数を数える
+    open      : 連続失敗がしきい値に達した状態。APIを呼ばずに即座に遮断する
+    half_open : 復旧待ち時間の経過後、1件だけ試験的に呼び出して復旧を確認する
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=60.0):
+        """サーキットブレーカーの初期化
+
+        Args:
+            failure_threshold (int): openに遷移する連続失敗回数
+            recovery_timeout (float): openからhalf_openに遷移するまでの秒数
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failure_count = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """現在の状態（復旧待ち時間の経過を反映）"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """API呼び出しを許可するかどうかを判定する"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                print("Info: サーキットブレーカーがhalf_openに遷移しました（復旧確認中）")
+            # half_openでは試験呼び出しを1件だけ許可する
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        """呼び出し成功を記録する"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                print("Info: API呼び出しが復旧しました。サーキットブレーカーをclosedに戻します")
+            self._state = self.CLOSED
+            self._failure_count = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """呼び出し失敗を記録する"""
+        with self._lock:
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                print("Warning: 復旧確認の呼び出しに失敗しました。サーキットブレーカーを再度openにします")
+                return
+            self._failure_count += 1
+            if self._state == self.CLOSED and self._failure_count >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                print(f"Warning: API呼び出しが{self._failure_count}回連続で失敗しました。"
+                      f"{self.recovery_timeout}秒間フォールバック処理に切り替えます")
+
+    def call(self, func, *args, **kwargs):
+        """サーキットブレーカー経由で関数を呼び出す
+
+        Raises:
+            CircuitOpenError: ブレーカーが開いていて呼び出しを遮断した場合
+        """
+        if not self.allow_request():
+            raise CircuitOpenError("サーキットブレーカーがopenのためAPI呼び出しをスキップしました")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+# プロセス全体で共有するブレーカー（抽出・分類の両方で使用）
+llm_circuit_breaker = CircuitBreaker(
+    failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=LLM_CIRCUIT_RECOVERY_TIMEOUT
+)
+
+class LatencyTracker:
+    """API呼び出しのレイテンシを記録し、パーセンタイルを算出する"""
+
+    def __init__(self, max_samples=1000):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.hedged_count = 0
+        self.hedge_win_count = 0
+
+    def record(self, seconds, hedge_won=False):
+        """レイテンシ（秒）を記録する
+
+        Args:
+            seconds (float): 最初のリクエストの発行から応答までの秒数（ヘッジが採用された場合も含む）
+            hedge_won (bool): ヘッジリクエストの応答を採用した場合True
+        """
+        with self._lock:
+            self._samples.append(seconds)
+            if hedge_won:
+                self.hedge_win_count += 1
+
+    def record_hedge(self):
+        """ヘッジリクエストの発行を記録する"""
+        with self._lock:
+            self.hedged_count += 1
+
+    def count(self):
+        """記録済みのサンプル数"""
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p):
+        """p（0-100）パーセンタイルのレイテンシを返す。サンプルがない場合はNone"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100 * len(samples))) - 1))
+        return samples[index]
+
+    def summary(self):
+        """p50/p95/p99とヘッジ回数を辞書で返す"""
+        with self._lock:
+            hedged, hedge_wins = self.hedged_count, self.hedge_win_count
+        return {
+            "count": self.count(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "hedged": hedged,
+            "hedge_wins": hedge_wins
+        }
+
+# デプロイメント名 -> LatencyTracker（高速・強いモデルのようにレイテンシが異なるデプロイメントの
+# ヘッジの待ち時間を、それぞれのp95から求める）
+llm_latency = {}
+_latency_lock = threading.Lock()
+
+def latency_tracker(deployment_id):
+    """デプロイメントのLatencyTrackerを返す（初回の呼び出しで作成する）"""
+    with _latency_lock:
+        if deployment_id not in llm_latency:
+            llm_latency[deployment_id] = LatencyTracker()
+        return llm_latency[deployment_id]
+
+# ヘッジリクエスト用のスレッドプール
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+def _is_valid_response(response):
+    """レスポンスが有効か（choicesが存在するか）を判定する"""
+    return bool(getattr(response, "choices", None))
+
+def _gateway_create(kwargs, hedge=False):
+    """ローカルLLMゲートウェイ経由でChatCompletionを呼び出す
+
+    レスポンスはopenaiのレスポンスと同じ形（choices[0].message.content）で返す。
+    """
+    payload = dict(kwargs, hedge=hedge)
+    request = urllib.request.Request(
+        LLM_GATEWAY_URL.rstrip("/") + "/chat",
+        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=kwargs.get("request_timeout")) as response:
+            body = json.loads(response.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace")
+        raise RuntimeError(f"ゲートウェイがエラーを返しました ({e.code}): {detail}") from e
+    message = SimpleNamespace(content=body["content"])
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def _create(kwargs, hedge=False):
+    """ChatCompletionを呼び出す
+
+    LLM_GATEWAY_URLが設定されている場合はゲートウェイ経由で呼び出す。
+    """
+    if LLM_GATEWAY_URL:
+        return _gateway_create(kwargs, hedge)
+    return openai.ChatCompletion.create(**kwargs)
+
+def _hedged_create(kwargs, timeout, create=_create, tracker=None, hedge_enabled=LLM_HEDGE_ENABLED):
+    """ヘッジ付きでChatCompletionを呼び出す
+
+    最初のリクエストが同じデプロイメントの直近のp95レイテンシを超えても終わらない場合に、
+    同じリクエストをもう1件発行し、先に返ってきた有効なレスポンスを採用する。
+    レイテンシは最初のリクエストの発行から応答までを記録する（ヘッジが採用された場合は
+    ヘッジを発行するまでの待ち時間を含む、呼び出し元から見た時間）。
+
+    採用されなかったリクエストは cancel() しても実行中であれば止まらず、応答かタイムアウトまで
+    スレッドプールの枠を使い、上流のトークンも消費する。
+    """
+    tracker = tracker or latency_tracker(kwargs.get("deployment_id"))
+    hedge_after = None
+    if hedge_enabled and tracker.count() >= LLM_HEDGE_MIN_SAMPLES:
+        hedge_after = tracker.percentile(95)
+
+    start = time.monotonic()
+    deadline = start + timeout
+    primary = _executor.submit(create, kwargs)
+    pending = {primary}
+    hedge = None
+    last_error = None
+
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            hedge = _executor.submit(create, kwargs, True)
+            pending.add(hedge)
+            tracker.record_hedge()
+
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            if not _is_valid_response(response):
+                last_error = ValueError("無効なAPIレスポンスを受信しました")
+                continue
+            # 残りのリクエストは結果を破棄する（開始前のものだけが取り消され、実行中のものは最後まで実行される）
+            for other in pending:
+                other.cancel()
+            tracker.record(time.monotonic() - start, hedge_won=future is hedge)
+            return response
+
+    for other in pending:
+        other.cancel()
+    if last_error is not None:
+        raise last_error
+    raise TimeoutError(f"API呼び出しが{timeout}秒以内に完了しませんでした")
+
+def print_latency_report(label="LLM"):
+    """デプロイメントごとのレイテンシのパーセンタイルを表示する
+
+    Returns:
+        dict: デプロイメント名 -> LatencyTracker.summary()
+    """
+    with _latency_lock:
+        trackers = dict(llm_latency)
+    report = {}
+    for deployment_id, tracker in trackers.items():
+        stats = tracker.summary()
+        if not stats["count"]:
+            continue
+        report[deployment_id] = stats
+        print(f"\n{label} レイテンシ {deployment_id}（{stats['count']}件）: "
+              f"p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s "
+              f"ヘッジ発行={stats['hedged']}件 ヘッジ採用={stats['hedge_wins']}件")
+    return report
+
+def chat_completion(messages, deployment_id, temperature=0, max_tokens=2000, timeout=None):
+    """Azure OpenAI ChatCompletionをサーキットブレーカー経由で呼び出す
+
+    Args:
+        timeout (float): 1リクエストあたりのタイムアウト秒数（省略時はLLM_REQUEST_TIMEOUT）
+
+    Raises:
+        CircuitOpenError: ブレーカーが開いていて呼び出しを遮断した場合
+    """
+    timeout = timeout or LLM_REQUEST_TIMEOUT
+    kwargs = {
+        "deployment_id": deployment_id,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "request_timeout": timeout
+    }
+    return llm_circuit_breaker.call(_hedged_create, kwargs, timeout)
+
+def simulate_hedging(requests=400, workers=4, base_latency=0.05, tail_latency=0.3, tail_rate=0.03, seed=0):
+    """APIを呼び出さずに、遅延を模擬した呼び出しでヘッジの有無によるレイテンシを比較する
+
+    大半の呼び出しは base_latency 秒前後、tail_rate の割合で tail_latency 秒かかるものとし、
+    呼び出し元から見たレイテンシのp50/p95/p99と、ヘッジによる追加の呼び出し数を表示する。
+    """
+    rng = random.Random(seed)
+
+    def fake_create(kwargs, hedge=False):
+        slow = rng.random() < tail_rate
+        time.sleep(tail_latency if slow else base_latency * rng.uniform(0.8, 1.4))
+        message = SimpleNamespace(content="[]")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    print(f"\n=== ヘッジのシミュレーション（{requests}件、並列{workers}、"
+          f"通常{base_latency * 1000:.0f}ms / 遅延{tail_latency * 1000:.0f}ms {tail_rate:.0%}） ===")
+    results = {}
+    for label, enabled in [("ヘッジなし", False), ("ヘッジあり", True)]:
+        tracker = LatencyTracker()
+        with ThreadPoolExecutor(max_workers=workers) as callers:
+            list(callers.map(lambda _: _hedged_create({}, LLM_REQUEST_TIMEOUT, fake_create, tracker, enabled),
+                             range(requests)))
+        stats = tracker.summary()
+        results[label] = stats
+        print(f"{label}: p50={stats['p50'] * 1000:.0f}ms p95={stats['p95'] * 1000:.0f}ms "
+              f"p99={stats['p99'] * 1000:.0f}ms 追加の呼び出し={stats['hedged']}件 "
+              f"ヘッジ採用={stats['hedge_wins']}件")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM呼び出しのヘッジの効果をシミュレーションする")
+    parser.add_argument("--requests", type=int, default=400, help="呼び出し回数")
+    parser.add_argument("--workers", type=int, default=4, help="並列に呼び出すスレッド数")
+    args = parser.parse_args()
+    simulate_hedging(args.requests, args.workers)
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import openai
+from dotenv import load_dotenv
+from config import (
+    LLM_GATEWAY_HOST, LLM_GATEWAY_PORT, LLM_GATEWAY_CACHE_PATH,
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT
+)
+
+class TokenBucket:
+    """トークンバケット方式のレート制限"""
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """指定量のトークンが使えるようになるまで待機する。待機した秒数を返す"""
+        # バケット容量を超える要求は容量分で打ち切る
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+                self._updated_at = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                shortage = (amount - self._tokens) / self.refill_per_second
+            time.sleep(shortage)
+            waited += shortage
+
+def is_cacheable(content):
+    """キャッシュしてよいレスポンスか（呼び出し側はすべてJSONとして解析するため、解析できるもののみ）
+
+    JSONとして解析できないレスポンスをキャッシュすると、同じリクエストの再試行・再抽出で
+    同じ不正なレスポンスが返り続けて回復できなくなる。
+    """
+    if not content:
+        return False
+    try:
+        json.loads(content.replace('```json', '').replace('```', '').strip())
+        return True
+    except ValueError:
+        return False
+
+class ResponseCache:
+    """SQLiteに保存する共有レスポンスキャッシュ"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    content TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def get(self, key):
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, content):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache (key, content) VALUES (?, ?)", (key, content))
+
+class LLMGateway:
+    """全プロセスのLLM呼び出しを集約するゲートウェイ
+
+    - RPM/TPMのトークンバケットによる全体のレート制限
+    - 同一リクエストが処理中の場合は上流を呼ばずに結果を共有（リクエストの集約）
+    - JSONとして解析できるレスポンスのみをキャッシュし、同じリクエストには上流を呼ばずに応答
+    """
+
+    def __init__(self, cache_path=LLM_GATEWAY_CACHE_PATH, rpm=LLM_RPM_LIMIT, tpm=LLM_TPM_LIMIT):
+        self.request_bucket = TokenBucket(rpm, rpm / 60)
+        self.token_bucket = TokenBucket(tpm, tpm / 60)
+        self.cache = ResponseCache(cache_path)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "upstream_calls": 0,
+                      "upstream_errors": 0, "not_cached": 0, "throttled_seconds": 0.0}
+
+    @staticmethod
+    def request_key(payload):
+        """リクエスト内容からキャッシュ・集約用のキーを作成する"""
+        canonical = json.dumps({
+            "deployment_id": payload.get("deployment_id"),
+            "messages": payload.get("messages"),
+            "temperature": payload.get("temperature"),
+            "max_tokens": payload.get("max_tokens")
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def estimate_tokens(payload):
+        """レート制限用の概算トークン数（入力は4文字≒1トークン、出力はmax_tokens）"""
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        return prompt_chars // 4 + int(payload.get("max_tokens") or 0)
+
+    def _count(self, name, amount=1):
+        """統計情報を加算する（複数のスレッドから呼ばれるためロックを取る）"""
+        with self._lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        """統計情報のコピーを返す"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _store(self, key, content):
+        """JSONとして解析できるレスポンスのみをキャッシュする"""
+        if is_cacheable(content):
+            self.cache.set(key, content)
+        else:
+            self._count("not_cached")
+
+    def _call_upstream(self, payload):
+        """レート制限を適用してAzure OpenAIを呼び出す"""
+        waited = self.request_bucket.acquire(1)
+        waited += self.token_bucket.acquire(self.estimate_tokens(payload))
+        self._count("throttled_seconds", waited)
+        self._count("upstream_calls")
+        response = openai.ChatCompletion.create(
+            deployment_id=payload["deployment_id"],
+            messages=payload["messages"],
+            temperature=payload.get("temperature", 0),
+            max_tokens=payload.get("max_tokens", 2000),
+            request_timeout=payload.get("request_timeout")
+        )
+        if not response.choices:
+            raise ValueError("無効なAPIレスポンスを受信しました")
+        return response.choices[0].message.content
+
+    def complete(self, payload):
+        """リクエストを処理してレスポンス本文を返す
+
+        hedgeがTrueのリクエストはヘッジ目的の重複リクエストのため、集約せずに上流を呼び出す。
+        """
+        self._count("requests")
+        key = self.request_key(payload)
+
+        # 以前のバージョンでキャッシュされた解析できないレスポンスは使わない
+        cached = self.cache.get(key)
+        if is_cacheable(cached):
+            self._count("cache_hits")
+            return cached
+
+        if payload.get("hedge"):
+            content = self._call_upstream(payload)
+            self._store(key, content)
+            return content
+
+        with self._lock:
+            entry = self._in_flight.get(key)
+            leader = entry is None
+            if leader:
+                entry = {"event": threading.Event(), "content": None, "error": None}
+                self._in_flight[key] = entry
+
+        if not leader:
+            self._count("coalesced")
+            entry["event"].wait()
+            if entry["error"] is not None:
+                raise entry["error"]
+            return entry["content"]
+
+        try:
+            content = self._call_upstream(payload)
+            self._store(key, content)
+            entry["content"] = content
+            return content
+        except Exception as e:
+            self._count("upstream_errors")
+            entry["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            entry["event"].set()
+
+class GatewayRequestHandler(BaseHTTPRequestHandler):
+    """POST /chat でChatCompletionを、GET /stats で統計情報を返す"""
+    gateway = None
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.gateway.get_stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+        except Exception as e:
+            self._send_json(400, {"error": f"リクエストの解析に失敗しました: {e}"})
+            return
+        try:
+            content = self.gateway.complete(payload)
+            self._send_json(200, {"content": content})
+        except Exception as e:
+            # 上流のレート制限は429として返し、クライアント側のブレーカーに判断させる
+            status = 429 if "rate limit" in str(e).lower() or "429" in str(e) else 502
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        # リクエストごとのアクセスログは出力しない
+        pass
+
+def setup_azure_openai():
+    """Azure OpenAI APIの設定を行う"""
+    load_dotenv()
+    openai.api_type = "azure"
+    openai.api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
+    openai.api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+    openai.api_key = os.getenv("AZURE_OPENAI_API_KEY")
+
+def serve(host=LLM_GATEWAY_HOST, port=LLM_GATEWAY_PORT):
+    """ゲートウェイを起動する"""
+    setup_azure_openai()
+    GatewayRequestHandler.gateway = LLMGateway()
+    server = ThreadingHTTPServer((host, port), GatewayRequestHandler)
+    print(f"LLMゲートウェイを起動しました: http://{host}:{port}")
+    print(f"レート制限: {LLM_RPM_LIMIT} RPM / {LLM_TPM_LIMIT} TPM")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nLLMゲートウェイを停止します")
+        print(f"統計: {GatewayRequestHandler.gateway.get_stats()}")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    serve()
@@ -1,34 +1,19 @@
-import os
-import json
 from pdf_processor import process_pdfs
 from ai_extractor import extract_structured_data
 from categorizer import add_categories_to_data
 from db_handler import DatabaseHandler, validate_db_input
-from excel_writer import write_to_excel, extract_year_from_text
+from excel_writer import extract_year_from_text
 from fix_missing_data import fix_missing_session_data
-import sqlite3
+from validator import count_missing_sessions
+from output_stage import run_output_stage
+import argparse
 
-def save_to_json(data, year=None, output_dir="output/json"):
-    """抽出したデータをJSONファイルに保存する"""
-    try:
-        # 出力ディレクトリの作成
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 出力ファイル名の生成
-        output_file = os.path.join(output_dir, f"sae_wcx_{year}.json")
-        
-        # JSONファイルに書き込み
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        print(f"JSONファイルを出力しました: {output_file}")
-        return True
-        
-    except Exception as e:
-        print(f"警告: JSONファイルの保存中にエラーが発生しました: {str(e)}")
-        return False
+def main(dry_run=False, store_mode="upsert"):
+    """PDFの取り込みからDB保存・ファイル出力までを実行する
 
-def main():
+    Args:
+        dry_run (bool): Trueの場合はAPIを呼び出さず、リクエスト数・トークン数・所要時間の見積もりのみ行う
+    """
     try:
         # 入力ディレクトリの設定
         input_dir = "data/input"
@@ -44,6 +29,16 @@ def main():
             print(f"Error: PDFファイルの処理中にエラーが発生: {str(e)}")
             return
         
+        # ドライラン（見積もりのみ）
+        if dry_run:
+            from ingest_estimator import estimate_ingest
+            # 取り込みと同じく最初のPDFのみを見積もる
+            if len(pdf_texts) > 1:
+                print(f"Info: 取り込むのは最初のPDF（{pdf_texts[0]['filename']}）のみのため、"
+                      f"他の{len(pdf_texts) - 1}件は見積もりに含めません")
+            estimate_ingest(pdf_texts[:1])
+            return
+        
         # 年の抽出
         try:
             print("\n年の抽出を開始します...")
@@ -59,7 +54,11 @@ def main():
         # データの抽出
         try:
             print("\nデータの抽出を開始します...")
-            extracted_data = extract_structured_data(pdf_texts[0]["text"])
+            failed_chunks = []
+            extracted_data = extract_structured_data(pdf_texts[0]["text"], failed_chunks=failed_chunks)
+            if failed_chunks:
+                # 失敗したチャンクは retry_failed_chunks.py で後から再処理する
+                DatabaseHandler().record_failed_chunks(failed_chunks, year)
             if not extracted_data:
                 print("Error: データの抽出に失敗しました")
                 return
@@ -91,64 +90,48 @@ def main():
             return
         
         # データベースへの保存
+        # 取り込み・補完・検証はステージング用データベースで行い、完了後に本番へ一括で反映する
+        # （ダッシュボードは途中の状態を参照しない）
         try:
             print("\nデータベースへの保存を開始します...")
-            db = DatabaseHandler()
-            if not db.store_data(categorized_data, year):
+            live_db = DatabaseHandler()
+            db = DatabaseHandler(use_temp_db=True)
+            if not db.stage_from(live_db):
+                return
+            if not db.store_data(categorized_data, year, mode=store_mode):
                 print("Error: データベースへの保存に失敗しました")
                 return
             print("データベースへの保存が完了しました")
             
-            # 欠損データの補完
-            print("\n欠損データの補完を開始します...")
-            fix_missing_session_data()
+            # 欠損データの補完（セッション情報は抽出時に引き継ぎ済みのため、残っている場合のみ実行）
+            missing_count = count_missing_sessions(categorized_data)
+            if missing_count:
+                print(f"\nセッション情報が欠損したレコードが{missing_count}件残っているため、補完を実行します...")
+                fix_missing_session_data(db, year)
+            else:
+                print("\nInfo: セッション情報の欠損は無いため、DBでの補完は省略します")
             
-            # 補完済みデータの取得
-            print("\n補完済みデータの取得を開始します...")
-            with sqlite3.connect(db.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT *
-                    FROM sessions
-                    WHERE year = ?
-                    ORDER BY no
-                """, (year,))
-                columns = [description[0] for description in cursor.description]
-                rows = cursor.fetchall()
-                
-                # 辞書形式のリストに変換
-                completed_data = []
-                for row in rows:
-                    data_dict = {}
-                    for i, col in enumerate(columns):
-                        if col not in ['id', 'created_at']:  # 内部管理用カラムを除外
-                            data_dict[col] = row[i]
-                    completed_data.append(data_dict)
-                
-                print(f"補完済みデータ数: {len(completed_data)}")
+            # 検証して本番に反映
+            if not db.validate_staging(year):
+                print("Error: ステージング用データベースの検証に失敗したため、本番には反映しません")
+                return
+            if not db.promote_to(live_db):
+                return
+            db = live_db
                 
         except Exception as e:
             print(f"Error: 欠損データの補完中にエラーが発生: {str(e)}")
             return
         
-        # Excelファイルへの書き込み
-        try:
-            print("\nExcelファイルへの書き込みを開始します...")
-            if not write_to_excel(completed_data, year):  # 補完済みデータを使用
-                print("Error: Excelファイルへの書き込みに失敗しました")
-                return
-        except Exception as e:
-            print(f"Error: Excelファイルへの書き込み中にエラーが発生: {str(e)}")
-            return
-        
-        # JSONファイルへの保存
+        # 出力（補完済みデータを1回だけ読み込み、Excel・JSON・Parquet・スナップショットに並列に出力）
         try:
-            print("\nJSONファイルへの保存を開始します...")
-            if not save_to_json(completed_data, year):  # 補完済みデータを使用
-                print("Error: JSONファイルへの保存に失敗しました")
+            print("\n出力処理を開始します...")
+            results = run_output_stage(db, year)
+            if not all(result["ok"] for result in results.values()):
+                print("Error: 一部の出力に失敗しました")
                 return
         except Exception as e:
-            print(f"Error: JSONファイルへの保存中にエラーが発生: {str(e)}")
+            print(f"Error: 出力処理中にエラーが発生: {str(e)}")
             return
         
         print("\n処理が正常に完了しました")
@@ -157,4 +140,10 @@ def main():
         print(f"Error: メイン処理中にエラーが発生: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SAE WCXのセッション情報を取り込む")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="APIを呼び出さずにリクエスト数・トークン数・所要時間を見積もる")
+    parser.add_argument("--mode", choices=["upsert", "append"], default="upsert",
+                        help="DBへの保存モード（append は既存の行と照合せずに追加する）")
+    args = parser.parse_args()
+    main(dry_run=args.dry_run, store_mode=args.mode)
\ No newline at end of file
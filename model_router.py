@@ -0,0 +1,95 @@
+import re
+import time
+from config import (
+    AZURE_OPENAI_DEPLOYMENT_NAME, AZURE_OPENAI_FAST_DEPLOYMENT_NAME,
+    ROUTER_DIFFICULTY_THRESHOLD, ROUTER_CONFIDENCE_THRESHOLD
+)
+from llm_client import chat_completion, LatencyTracker
+from validator import index_chunk
+
+ROUTE_FAST = "fast"
+ROUTE_STRONG = "strong"
+
+# 難易度スコアの基準値
+HARD_PAPER_COUNT = 8
+HARD_CHUNK_LENGTH = 5000
+CONTINUATION_PATTERN = re.compile(r'Part\s+\d+\s+of\s+\d+', re.IGNORECASE)
+
+# ルートごとのレイテンシと件数
+route_latency = {ROUTE_FAST: LatencyTracker(), ROUTE_STRONG: LatencyTracker()}
+route_counts = {ROUTE_FAST: 0, ROUTE_STRONG: 0, "escalated": 0}
+
+def routing_enabled():
+    """高速デプロイメントが設定されているか（未設定の場合は常に強いモデルを使う）"""
+    return bool(AZURE_OPENAI_FAST_DEPLOYMENT_NAME) and AZURE_OPENAI_FAST_DEPLOYMENT_NAME != AZURE_OPENAI_DEPLOYMENT_NAME
+
+def get_deployment(route):
+    """ルートに対応するデプロイメント名を返す"""
+    if route == ROUTE_FAST and routing_enabled():
+        return AZURE_OPENAI_FAST_DEPLOYMENT_NAME
+    return AZURE_OPENAI_DEPLOYMENT_NAME
+
+def score_chunk_difficulty(chunk, paper_index=None, validation_failed=False):
+    """チャンクの難易度を0〜1でスコア化する
+
+    論文数・文字数・"Part N of"（続きのセッション）・過去の検証失敗を特徴量とする。
+    """
+    if paper_index is None:
+        paper_index = index_chunk(chunk)
+    score = 0.0
+    score += min(len(paper_index) / HARD_PAPER_COUNT, 1.0) * 0.35
+    score += min(len(chunk) / HARD_CHUNK_LENGTH, 1.0) * 0.35
+    if CONTINUATION_PATTERN.search(chunk):
+        score += 0.15
+    if validation_failed:
+        score += 0.5
+    return min(score, 1.0)
+
+def choose_chunk_route(chunk, paper_index=None, validation_failed=False, label=""):
+    """チャンクを処理するルートを決定し、判断内容を表示する"""
+    score = score_chunk_difficulty(chunk, paper_index, validation_failed)
+    if not routing_enabled():
+        route = ROUTE_STRONG
+    else:
+        route = ROUTE_FAST if score < ROUTER_DIFFICULTY_THRESHOLD else ROUTE_STRONG
+    print(f"ルーティング{label}: 難易度 {score:.2f} → {route} ({get_deployment(route)})")
+    return route
+
+def is_low_confidence(confidence):
+    """分類の確信度がしきい値未満かどうか（解析できない場合は低確信度とみなす）"""
+    try:
+        return float(confidence) < ROUTER_CONFIDENCE_THRESHOLD
+    except (TypeError, ValueError):
+        return True
+
+def record_escalation(reason):
+    """強いモデルへのエスカレーションを記録する"""
+    route_counts["escalated"] += 1
+    print(f"ルーティング: {reason}のため {ROUTE_STRONG} ({get_deployment(ROUTE_STRONG)}) にエスカレーションします")
+
+def routed_chat_completion(route, messages, temperature=0, max_tokens=2000):
+    """ルートに応じたデプロイメントでChatCompletionを呼び出し、ルート別のレイテンシを記録する"""
+    start = time.monotonic()
+    response = chat_completion(
+        messages=messages,
+        deployment_id=get_deployment(route),
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    route_latency[route].record(time.monotonic() - start)
+    route_counts[route] += 1
+    return response
+
+def print_routing_report():
+    """ルート別の呼び出し件数とレイテンシを表示する"""
+    if not routing_enabled():
+        return
+    print("\n=== モデルルーティング ===")
+    for route in (ROUTE_FAST, ROUTE_STRONG):
+        stats = route_latency[route].summary()
+        if stats["count"]:
+            print(f"{route} ({get_deployment(route)}): {route_counts[route]}件 "
+                  f"p50={stats['p50']:.2f}s p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s")
+        else:
+            print(f"{route} ({get_deployment(route)}): {route_counts[route]}件")
+    print(f"エスカレーション: {route_counts['escalated']}件")
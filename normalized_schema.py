@@ -0,0 +1,328 @@
+"""正規化したスキーマ（セッション・論文・人物・所属）への移行と比較
+
+従来のデータベースから別ファイルの正規化したデータベースを作成し、サイズと集計クエリの速度を比較する。
+正規化したデータベースはオフラインでの分析・比較用の読み取り専用の出力であり、store_data などの
+取り込み処理は書き込まない（元のデータベースを変更した場合は migrate_to_normalized で作り直す）。
+互換ビュー sessions はNULLと空文字を区別し、元のテーブルと同じ値を返す。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+
+# 正規化したデータベースの保存先
+NORMALIZED_DB_PATH = os.path.join("output", "db", "wcx_sessions_normalized.db")
+
+# 著者は ", "、所属は "; " 区切りで1つのセルに格納されている
+PERSON_SEPARATOR = ", "
+AFFILIATION_SEPARATOR = "; "
+
+# 著者・所属のセル（リンクテーブルに分割して保存する列）。paper.null_groups のビットの順
+GROUP_COLUMNS = [
+    ("main_author_group", "paper_author", "person", "person_id", "main", PERSON_SEPARATOR),
+    ("main_author_affiliation", "paper_affiliation", "affiliation", "affiliation_id", "main", AFFILIATION_SEPARATOR),
+    ("co_author_group", "paper_author", "person", "person_id", "co", PERSON_SEPARATOR),
+    ("co_author_affiliation", "paper_affiliation", "affiliation", "affiliation_id", "co", AFFILIATION_SEPARATOR)
+]
+
+# 従来のsessionsテーブルの列順
+SESSION_COLUMNS = [
+    "id", "no", "year", "session_name", "session_code", "overview",
+    "category", "subcategory", "paper_no", "title",
+    "main_author_group", "main_author_affiliation",
+    "co_author_group", "co_author_affiliation",
+    "organizers", "chairperson", "created_at"
+]
+
+NORMALIZED_SCHEMA = [
+    # セッション単位の情報（論文ごとに繰り返していた概要・オーガナイザー等）
+    # 同じセッションコードでも "Part N" ごとに名称・オーガナイザーが異なるため、
+    # (year, session_code) に内容のハッシュを加えて一意とする
+    '''
+    CREATE TABLE IF NOT EXISTS session (
+        id INTEGER PRIMARY KEY,
+        year INTEGER NOT NULL,
+        session_code TEXT,
+        session_name TEXT,
+        overview TEXT,
+        organizers TEXT,
+        chairperson TEXT,
+        content_hash TEXT NOT NULL,
+        UNIQUE (year, session_code, content_hash)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS paper (
+        id INTEGER PRIMARY KEY,
+        no INTEGER,
+        session_id INTEGER NOT NULL REFERENCES session (id),
+        category TEXT,
+        subcategory TEXT,
+        paper_no TEXT,
+        title TEXT,
+        -- 元のセルがNULLだった著者・所属の列（GROUP_COLUMNS の順のビット。空文字のセルとリンクが無いセルを区別する）
+        null_groups INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_paper_session ON paper (session_id)",
+    "CREATE INDEX IF NOT EXISTS idx_paper_no ON paper (no)",
+    '''
+    CREATE TABLE IF NOT EXISTS person (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS affiliation (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    ''',
+    # 論文と著者・所属の対応（role は main / co、position は元のセル内での順番）
+    '''
+    CREATE TABLE IF NOT EXISTS paper_author (
+        paper_id INTEGER NOT NULL REFERENCES paper (id),
+        role TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        person_id INTEGER NOT NULL REFERENCES person (id),
+        PRIMARY KEY (paper_id, role, position)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_paper_author_person ON paper_author (person_id)",
+    '''
+    CREATE TABLE IF NOT EXISTS paper_affiliation (
+        paper_id INTEGER NOT NULL REFERENCES paper (id),
+        role TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        affiliation_id INTEGER NOT NULL REFERENCES affiliation (id),
+        PRIMARY KEY (paper_id, role, position)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_paper_affiliation_affiliation ON paper_affiliation (affiliation_id)"
+]
+
+def _group_column(bit, link_table, entity_table, entity_column, role, separator):
+    """リンクテーブルから元のセルの文字列を組み立てる列定義（元がNULLのセルはNULL、リンクが無いセルは空文字）"""
+    return f'''CASE WHEN p.null_groups & {1 << bit} THEN NULL ELSE COALESCE((
+            SELECT group_concat(name, '{separator}') FROM (
+                SELECT e.name FROM {link_table} l
+                JOIN {entity_table} e ON e.id = l.{entity_column}
+                WHERE l.paper_id = p.id AND l.role = '{role}'
+                ORDER BY l.position
+            )
+        ), '') END'''
+
+# 既存のクエリがそのまま動くように、従来のsessionsテーブルと同じ列を持つビューを提供する
+SESSIONS_VIEW_SQL = f'''
+    CREATE VIEW IF NOT EXISTS sessions AS
+    SELECT
+        p.id, p.no, s.year, s.session_name, s.session_code, s.overview,
+        p.category, p.subcategory, p.paper_no, p.title,
+        {", ".join(f"{_group_column(bit, *spec[1:])} AS {spec[0]}" for bit, spec in enumerate(GROUP_COLUMNS))},
+        s.organizers, s.chairperson, p.created_at
+    FROM paper p
+    JOIN session s ON s.id = p.session_id
+'''
+
+# 従来のテーブルと正規化したビューの比較に使う集計クエリ
+AGGREGATE_QUERIES = {
+    "カテゴリ別件数": '''
+        SELECT year, category, subcategory, COUNT(*)
+        FROM sessions
+        WHERE category IS NOT NULL
+        GROUP BY year, category, subcategory
+    ''',
+    "年別のセッション数・論文数": '''
+        SELECT year, COUNT(DISTINCT session_code), COUNT(*)
+        FROM sessions
+        GROUP BY year
+    ''',
+    "年・カテゴリ別の著者（全行読み込み）": '''
+        SELECT year, category, main_author_group, co_author_group
+        FROM sessions
+    '''
+}
+
+# 正規化したテーブルでのみ可能な集計（従来のテーブルでは文字列を分割して数える必要がある）
+AFFILIATION_RANKING_SQL = '''
+    SELECT a.name, COUNT(DISTINCT pa.paper_id) AS papers
+    FROM paper_affiliation pa
+    JOIN affiliation a ON a.id = pa.affiliation_id
+    GROUP BY a.id
+    ORDER BY papers DESC
+    LIMIT 20
+'''
+
+def split_group(value, separator):
+    """セルの文字列を要素のリストに分割する（空文字は要素なし）
+
+    分割と結合が往復で一致するよう、区切り文字ちょうどで分割し、要素の空白は除去しない。
+    """
+    if not value:
+        return []
+    return value.split(separator)
+
+def session_hash(row):
+    """セッション単位の列の内容からハッシュを作成する"""
+    # NULLと空文字を別の内容として扱う
+    content = "\x1f".join("\x00" if row.get(column) is None else str(row[column]) for column in
+                          ("session_name", "overview", "organizers", "chairperson"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def create_normalized_schema(conn):
+    """正規化したテーブルと互換ビューを作成する"""
+    for statement in NORMALIZED_SCHEMA:
+        conn.execute(statement)
+    conn.execute(SESSIONS_VIEW_SQL)
+
+def store_normalized(conn, rows):
+    """従来のsessionsテーブルの形式のレコードを正規化して保存する
+
+    Args:
+        conn: 正規化したデータベースへの接続
+        rows (list): SESSION_COLUMNS の列を持つ辞書のリスト（id が無い場合は自動採番）
+    """
+    session_ids = {}
+    person_ids = dict(conn.execute("SELECT name, id FROM person"))
+    affiliation_ids = dict(conn.execute("SELECT name, id FROM affiliation"))
+
+    def get_id(cache, table, name):
+        if name not in cache:
+            cursor = conn.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,))
+            cache[name] = cursor.lastrowid
+        return cache[name]
+
+    author_links = []
+    affiliation_links = []
+    for row in rows:
+        key = (row["year"], row.get("session_code"), session_hash(row))
+        if key not in session_ids:
+            conn.execute('''
+                INSERT OR IGNORE INTO session (
+                    year, session_code, session_name, overview, organizers, chairperson, content_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (key[0], key[1], row.get("session_name", ""), row.get("overview", ""),
+                  row.get("organizers", ""), row.get("chairperson", ""), key[2]))
+            session_ids[key] = conn.execute(
+                "SELECT id FROM session WHERE year = ? AND session_code IS ? AND content_hash = ?", key
+            ).fetchone()[0]
+
+        cursor = conn.execute('''
+            INSERT INTO paper (id, no, session_id, category, subcategory, paper_no, title, null_groups, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', (row.get("id"), row.get("no"), session_ids[key], row.get("category", ""),
+              row.get("subcategory", ""), row.get("paper_no", ""), row.get("title", ""),
+              sum(1 << bit for bit, spec in enumerate(GROUP_COLUMNS) if row.get(spec[0], "") is None),
+              row.get("created_at")))
+        paper_id = cursor.lastrowid
+
+        for role in ("main", "co"):
+            names = split_group(row.get(f"{role}_author_group"), PERSON_SEPARATOR)
+            for position, name in enumerate(names):
+                author_links.append((paper_id, role, position, get_id(person_ids, "person", name)))
+            names = split_group(row.get(f"{role}_author_affiliation"), AFFILIATION_SEPARATOR)
+            for position, name in enumerate(names):
+                affiliation_links.append((paper_id, role, position, get_id(affiliation_ids, "affiliation", name)))
+
+    conn.executemany("INSERT INTO paper_author VALUES (?, ?, ?, ?)", author_links)
+    conn.executemany("INSERT INTO paper_affiliation VALUES (?, ?, ?, ?)", affiliation_links)
+
+def migrate_to_normalized(source_path, target_path=NORMALIZED_DB_PATH):
+    """従来のデータベースから正規化したデータベースを作成する
+
+    作成後に互換ビューと元のテーブルの全行を突き合わせ、一致しない行数を返す。
+    """
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+
+    source = sqlite3.connect(source_path)
+    source.row_factory = sqlite3.Row
+    rows = [dict(row) for row in source.execute(f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions ORDER BY id")]
+
+    target = sqlite3.connect(target_path)
+    try:
+        create_normalized_schema(target)
+        store_normalized(target, rows)
+        target.commit()
+        target.execute("VACUUM")
+
+        # 互換ビューが元のテーブルと同じ内容を返すか確認
+        columns = ", ".join(SESSION_COLUMNS)
+        original = source.execute(f"SELECT {columns} FROM sessions ORDER BY id").fetchall()
+        restored = target.execute(f"SELECT {columns} FROM sessions ORDER BY id").fetchall()
+        mismatches = abs(len(original) - len(restored))
+        mismatches += sum(1 for a, b in zip(original, restored) if tuple(a) != tuple(b))
+
+        counts = {table: target.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("session", "paper", "person", "affiliation")}
+    finally:
+        source.close()
+        target.close()
+
+    print(f"正規化したデータベースを作成しました: {target_path}")
+    print(f"  セッション {counts['session']}件 / 論文 {counts['paper']}件 / "
+          f"人物 {counts['person']}件 / 所属 {counts['affiliation']}件")
+    if mismatches:
+        print(f"Warning: 互換ビューと元のテーブルで内容が一致しない行があります（{mismatches}件）")
+    else:
+        print("互換ビューの内容は元のテーブルと一致しました")
+    return mismatches
+
+def _time_query(path, query, repeat):
+    """クエリの平均実行時間（ミリ秒）を計測する"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(query).fetchall()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(query).fetchall()
+        return (time.perf_counter() - start) / repeat * 1000
+    finally:
+        conn.close()
+
+def _affiliation_ranking_from_cells(path):
+    """従来のテーブルで所属別の論文数を数える（セルの文字列を分割）"""
+    conn = sqlite3.connect(path)
+    try:
+        counts = {}
+        for paper_id, main, co in conn.execute(
+            "SELECT id, main_author_affiliation, co_author_affiliation FROM sessions"
+        ):
+            names = set(split_group(main, AFFILIATION_SEPARATOR)) | set(split_group(co, AFFILIATION_SEPARATOR))
+            for name in names:
+                counts[name] = counts.get(name, 0) + 1
+        return sorted(counts.items(), key=lambda item: -item[1])[:20]
+    finally:
+        conn.close()
+
+def compare_storage(source_path, target_path=NORMALIZED_DB_PATH, repeat=20):
+    """従来のデータベースと正規化したデータベースのサイズと集計クエリの速度を比較する"""
+    source_size = os.path.getsize(source_path)
+    target_size = os.path.getsize(target_path)
+    print("\n=== ストレージ比較 ===")
+    print(f"従来: {source_size / 1024 / 1024:.2f}MB / 正規化: {target_size / 1024 / 1024:.2f}MB "
+          f"({target_size / source_size * 100:.0f}%)")
+
+    print("\n=== 集計クエリの速度（ミリ秒） ===")
+    for label, query in AGGREGATE_QUERIES.items():
+        print(f"{label}: 従来 {_time_query(source_path, query, repeat):.2f} / "
+              f"正規化（互換ビュー） {_time_query(target_path, query, repeat):.2f}")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _affiliation_ranking_from_cells(source_path)
+    cell_time = (time.perf_counter() - start) / repeat * 1000
+    print(f"所属別の論文数: 従来（セルを分割） {cell_time:.2f} / "
+          f"正規化（GROUP BY） {_time_query(target_path, AFFILIATION_RANKING_SQL, repeat):.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="正規化したデータベースの作成と比較")
+    parser.add_argument("--source", default=os.path.join("output", "db", "wcx_sessions.db"),
+                        help="元のデータベース")
+    parser.add_argument("--target", default=NORMALIZED_DB_PATH, help="正規化したデータベースの保存先")
+    args = parser.parse_args()
+    migrate_to_normalized(args.source, args.target)
+    compare_storage(args.source, args.target)
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db_handler import DatabaseHandler
+from excel_writer import write_to_excel
+from exporters import EXPORT_FIELDS, default_output_path, write_parquet
+from snapshot import write_snapshot
+from config import OUTPUT_SINKS, OUTPUT_WORKERS
+
+# 出力用の行に含めない内部管理用の列
+INTERNAL_COLUMNS = ['id', 'created_at', 'updated_at', 'record_key', 'content_hash']
+
+def save_to_json(data, year=None, output_dir="output/json"):
+    """抽出したデータをJSONファイルに保存する"""
+    try:
+        # 出力ディレクトリの作成
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 出力ファイル名の生成
+        output_file = os.path.join(output_dir, f"sae_wcx_{year}.json")
+
+        # JSONファイルに書き込み
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        print(f"JSONファイルを出力しました: {output_file}")
+        return True
+
+    except Exception as e:
+        print(f"警告: JSONファイルの保存中にエラーが発生しました: {str(e)}")
+        return False
+
+def excel_sink(db, year, data):
+    """年ごとのExcelファイル（excel_writer）"""
+    output_file, _ = write_to_excel(data, year)
+    return output_file is not None
+
+def json_sink(db, year, data):
+    """年ごとのJSONファイル"""
+    return save_to_json(data, year)
+
+def parquet_sink(db, year, data):
+    """年ごとのParquetファイル（exportersと同じスキーマ・ファイル名）"""
+    path = default_output_path("parquet", [year])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    count = write_parquet([[tuple(item.get(field) for field in EXPORT_FIELDS) for item in data]], temp_path)
+    os.replace(temp_path, path)
+    print(f"PARQUETファイルを出力しました: {path}（{count}件）")
+    return True
+
+def snapshot_sink(db, year, data):
+    """ダッシュボード用スナップショット（全年。category_summaryはトリガーで更新済み）"""
+    return write_snapshot(db) is not None
+
+# 出力先の名前 -> (関数, 説明)。関数は (db, year, 行の辞書のリスト) を受け取り、成功時にTrueを返す
+SINKS = {
+    "excel": (excel_sink, "Excelファイル"),
+    "json": (json_sink, "JSONファイル"),
+    "parquet": (parquet_sink, "Parquetファイル"),
+    "snapshot": (snapshot_sink, "分析用スナップショット")
+}
+
+# 出力対象の年の行（年内のnoの順）
+OUTPUT_ROWS_QUERY = """
+    SELECT *
+    FROM sessions
+    WHERE year = ?
+    ORDER BY no
+"""
+
+def load_output_rows(db, year):
+    """出力対象の年の行を1回だけ読み込む（内部管理用の列を除いた辞書のリスト）"""
+    return db.fetch_dicts(OUTPUT_ROWS_QUERY, (int(year),), exclude=INTERNAL_COLUMNS)
+
+def _run_sink(name, db, year, data):
+    """1つの出力先を実行し、所要時間と結果を返す（例外は他の出力先に影響させない）"""
+    func, _ = SINKS[name]
+    start = time.perf_counter()
+    try:
+        ok = bool(func(db, year, data))
+        error = None if ok else "出力に失敗しました"
+    except Exception as e:
+        ok = False
+        error = f"{type(e).__name__}: {e}"
+    return {"ok": ok, "seconds": time.perf_counter() - start, "error": error}
+
+def run_output_stage(db=None, year=None, sinks=None, max_workers=OUTPUT_WORKERS):
+    """DBに保存した年のデータを各出力先に並列に書き出す
+
+    行は1回だけ読み込んで全出力先で共有する（出力先では変更しない）。
+    出力先ごとの所要時間を表示し、失敗した出力先があっても他の出力先は続行する。
+
+    Returns:
+        dict: 出力先の名前 -> ok（成功したか）、seconds（所要時間）、error（失敗時の内容）
+    """
+    db = db or DatabaseHandler()
+    sinks = [name for name in (sinks or OUTPUT_SINKS) if name in SINKS]
+    start = time.perf_counter()
+    data = load_output_rows(db, year)
+    print(f"出力対象のデータ数: {len(data)}（読み込み {time.perf_counter() - start:.2f}秒）")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sinks))),
+                            thread_name_prefix="output") as executor:
+        futures = {name: executor.submit(_run_sink, name, db, year, data) for name in sinks}
+    results = {name: future.result() for name, future in futures.items()}
+
+    print(f"\n=== 出力結果（合計 {time.perf_counter() - start:.2f}秒） ===")
+    for name, result in results.items():
+        status = "OK" if result["ok"] else f"失敗 ({result['error']})"
+        print(f"{SINKS[name][1]}: {result['seconds']:.2f}秒 {status}")
+    failed = [name for name, result in results.items() if not result["ok"]]
+    if failed:
+        print(f"警告: 出力に失敗した出力先があります: {', '.join(failed)}")
+    return results
@@ -0,0 +1,83 @@
+import argparse
+from ai_extractor import setup_azure_openai, extract_chunk_records, repair_chunk_records, extract_records_locally
+from categorizer import add_categories_to_data
+from db_handler import DatabaseHandler, make_record_key
+from validator import index_chunk, validate_chunk_records, SessionContextTracker
+
+def load_session_context(db, year, session_code):
+    """直前のチャンクのセッション情報（概要のある最後の行）をDBから取得する"""
+    if not session_code:
+        return None
+    rows = db.fetch_dicts("""
+        SELECT session_name, session_code, overview
+        FROM sessions
+        WHERE year = ? AND session_code = ? AND overview IS NOT NULL AND overview != ''
+        ORDER BY no DESC
+        LIMIT 1
+    """, (int(year), session_code))
+    return rows[0] if rows else None
+
+def retry_failed_chunks(year=None, max_attempts=5):
+    """デッドレターキューに記録されたチャンクだけを再処理してDBに統合する
+
+    通常の抽出と同じ検証・不足分の再抽出・セッション情報の引き継ぎを行ってから統合する。
+
+    Args:
+        year (int): 対象の年（省略時はすべての年）
+        max_attempts (int): この回数以上失敗しているチャンクは対象外とする
+
+    Returns:
+        tuple: (成功件数, 失敗件数)
+    """
+    db = DatabaseHandler()
+    failed_chunks = db.get_failed_chunks(year, max_attempts)
+    if not failed_chunks:
+        print("再処理対象のチャンクはありません")
+        return 0, 0
+
+    print(f"\n{len(failed_chunks)}個のチャンクを再処理します...")
+    setup_azure_openai()
+
+    resolved = 0
+    for chunk in failed_chunks:
+        label = f"{chunk['year']}年 チャンク{chunk['chunk_index']} ({chunk['session_code'] or '不明'})"
+        print(f"\n=== {label}（試行回数: {chunk['attempts']}） ===")
+        try:
+            chunk_text = chunk["chunk_text"]
+            records = extract_chunk_records(chunk_text)
+            if not records:
+                raise ValueError("レコードが抽出されませんでした")
+
+            # 通常の抽出と同じく原文と突き合わせて検証し、不足分を再抽出する
+            paper_index = index_chunk(chunk_text)
+            result = validate_chunk_records(chunk_text, records, paper_index)
+            records, result = repair_chunk_records(chunk_text, records, result, paper_index)
+            # セッション情報の欠損は直前のチャンクのセッションから引き継ぐ
+            session_context = SessionContextTracker(
+                load_session_context(db, chunk["year"], chunk["prev_session_code"])
+            )
+            session_context.apply(chunk_text, records, paper_index)
+
+            records = add_categories_to_data(records)
+            # ローカル抽出で代替した行も置き換える（同じチャンクから同じ方法でキーを作成する）
+            fallback_keys = [make_record_key(record) for record in extract_records_locally(chunk_text)]
+            if not db.merge_chunk_records(records, chunk["year"], chunk["session_code"],
+                                          chunk["prev_session_code"], fallback_keys):
+                raise ValueError("DBへの統合に失敗しました")
+
+            db.update_failed_chunk(chunk["id"], resolved=True)
+            resolved += 1
+        except Exception as e:
+            print(f"Error: {label} の再処理に失敗しました: {str(e)}")
+            db.update_failed_chunk(chunk["id"], resolved=False, error=f"{type(e).__name__}: {e}")
+
+    failed = len(failed_chunks) - resolved
+    print(f"\n再処理完了: 成功 {resolved}件 / 失敗 {failed}件")
+    return resolved, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="失敗したチャンクだけを再処理する")
+    parser.add_argument("--year", type=int, help="対象の年")
+    parser.add_argument("--max-attempts", type=int, default=5, help="再試行の上限回数")
+    args = parser.parse_args()
+    retry_failed_chunks(args.year, args.max_attempts)
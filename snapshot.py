@@ -0,0 +1,140 @@
+import os
+import time
+import argparse
+import pandas as pd
+from db_handler import DatabaseHandler
+from export_to_excel import extract_oem, CATEGORY_MAPPING, SUBCATEGORY_MAPPING
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# 分析用スナップショット（Arrow IPCファイル。非圧縮のためメモリマップで読み込める）
+SNAPSHOT_PATH = os.path.join("output", "snapshot", "wcx_sessions.arrow")
+
+SNAPSHOT_QUERY = """
+    SELECT
+        no, year, category, subcategory, session_name, session_code, overview,
+        paper_no, title, main_author_group, main_author_affiliation,
+        co_author_group, co_author_affiliation, organizers, chairperson
+    FROM sessions
+    ORDER BY year DESC, category, subcategory, no
+"""
+
+# 辞書エンコードする（値の種類が少ない）列
+DICTIONARY_COLUMNS = ["category", "subcategory", "category_ja", "subcategory_ja", "oem"]
+
+def format_authors(row):
+    """ダッシュボードの著者表示列を作成する"""
+    return (f"{row['main_author_group']} ({row['main_author_affiliation']})" if row['main_author_group'] else "" +
+            (f", {row['co_author_group']} ({row['co_author_affiliation']})" if row['co_author_group'] else ""))
+
+def build_enriched_frame(db=None):
+    """sessionsテーブルを読み込み、翻訳・著者・OEMの派生列を追加する"""
+    db = db or DatabaseHandler()
+    df = db.query_df(SNAPSHOT_QUERY)
+    df['category_ja'] = df['category'].map(lambda c: CATEGORY_MAPPING.get(c, c))
+    df['subcategory_ja'] = df['subcategory'].map(lambda c: SUBCATEGORY_MAPPING.get(c, c))
+    df['authors'] = df.apply(format_authors, axis=1) if not df.empty else pd.Series(dtype=str)
+    df['oem'] = df.apply(extract_oem, axis=1) if not df.empty else pd.Series(dtype=str)
+    return df
+
+def write_snapshot(db=None, path=SNAPSHOT_PATH):
+    """取り込み後のデータを列指向のスナップショットとして書き出す
+
+    カテゴリ系の列は辞書エンコードし、一時ファイルに書いてから置き換えるため、
+    読み込み中のプロセスが書きかけのファイルを読むことはない。
+    """
+    if pa is None:
+        print("Warning: pyarrowがインストールされていないため、スナップショットを作成しません")
+        return None
+    try:
+        db = db or DatabaseHandler()
+        # WALの内容をDB本体に反映してから読み込む（終了時のチェックポイントでDBの更新時刻が
+        # スナップショットより新しくならないようにする）
+        db.fetch_one("PRAGMA wal_checkpoint(TRUNCATE)")
+        df = build_enriched_frame(db)
+        for column in DICTIONARY_COLUMNS:
+            df[column] = df[column].astype("category")
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with pa.OSFile(temp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, path)
+        print(f"スナップショットを出力しました: {path}（{len(df)}件）")
+        return path
+    except Exception as e:
+        print(f"Error: スナップショットの出力中にエラーが発生: {str(e)}")
+        return None
+
+def _db_modified_time(db_path):
+    """データベースの最終更新時刻（未反映のWALへの書き込みも含む）
+
+    接続時に作成されるだけの空のWALファイルは更新とみなさない。
+    """
+    modified = os.path.getmtime(db_path)
+    wal_path = db_path + "-wal"
+    if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+        modified = max(modified, os.path.getmtime(wal_path))
+    return modified
+
+def load_snapshot(path=SNAPSHOT_PATH, db_path=None):
+    """スナップショットをメモリマップで読み込む
+
+    pyarrowが無い場合、ファイルが無い場合、データベースより古い場合はNoneを返す（呼び出し側でSQLから読み込む）。
+    """
+    if pa is None or not os.path.exists(path):
+        return None
+    db_path = db_path or DatabaseHandler().db_path
+    if os.path.exists(db_path) and os.path.getmtime(path) < _db_modified_time(db_path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+    except Exception as e:
+        print(f"Warning: スナップショットの読み込みに失敗しました: {str(e)}")
+        return None
+
+def run_cold_start_benchmark(repeat=5):
+    """新しいプロセスでの読み込み時間をSQLとスナップショットで比較する
+
+    プロセス全体（import含む）の時間と、読み込み処理のみの時間をそれぞれ中央値で表示する。
+    """
+    import subprocess
+    import sys
+
+    loaders = {
+        "SQL + 派生列の計算": "build_enriched_frame()",
+        "スナップショット（メモリマップ）": "load_snapshot()"
+    }
+    code_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=code_dir + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    print(f"\n=== コールドスタートの読み込み時間（{repeat}回の中央値、秒） ===")
+    for label, loader in loaders.items():
+        code = ("import time\n"
+                "from snapshot import build_enriched_frame, load_snapshot\n"
+                "start = time.perf_counter()\n"
+                f"assert {loader} is not None\n"
+                "print(time.perf_counter() - start)")
+        process_times, load_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", code], check=True, env=env,
+                                    capture_output=True, text=True)
+            process_times.append(time.perf_counter() - start)
+            load_times.append(float(result.stdout.strip().splitlines()[-1]))
+        median = lambda values: sorted(values)[len(values) // 2]
+        print(f"{label}: プロセス全体 {median(process_times):.3f} / 読み込み {median(load_times):.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分析用スナップショットの作成")
+    parser.add_argument("--benchmark", action="store_true", help="作成後にコールドスタートの読み込み時間を比較する")
+    args = parser.parse_args()
+    if write_snapshot() and args.benchmark:
+        run_cold_start_benchmark()
@@ -0,0 +1,59 @@
+"""年で絞り込むクエリの実行計画（EXPLAIN QUERY PLAN）の確認
+
+マイグレーションを適用した一時的なデータベースで、benchmark_db.PLAN_CHECK_QUERIES の各クエリが
+sessionsの全行を読まない（インデックスで絞り込むか、カバリングインデックスのみを読む）ことを確認する。
+インデックスを削除・変更した場合に失敗する。
+"""
+import os
+import pytest
+from db_handler import DatabaseHandler
+from benchmark_db import PLAN_CHECK_QUERIES, full_table_scans, make_records
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("query_plans"))
+    try:
+        db = DatabaseHandler()
+        for year in (2023, 2024, 2025):
+            db.store_data(make_records(2000), year)
+        yield db
+        db.close()
+    finally:
+        os.chdir(cwd)
+
+def query_plan(db, query, params):
+    return [row[3] for row in db.fetch_all("EXPLAIN QUERY PLAN " + query, params)]
+
+@pytest.mark.parametrize("label", list(PLAN_CHECK_QUERIES))
+def test_no_full_table_scan(db, label):
+    query, params = PLAN_CHECK_QUERIES[label]
+    plan = query_plan(db, query, params)
+    assert not full_table_scans(plan), f"{label}: {plan}"
+    assert any(step.startswith("SEARCH sessions") or "COVERING INDEX" in step for step in plan), f"{label}: {plan}"
+
+# クエリごとに使われるべきインデックス（年で始まる別のインデックスに切り替わった場合も検出する）
+EXPECTED_INDEXES = {
+    "年の絞り込み (load_raw_data)": "idx_sessions_year_category",
+    "前方補完 (fix_missing_session_data)": "idx_sessions_year_no",
+    "既存行の照合 (store_data upsert)": "idx_sessions_year_no",
+    "年内の並び順 (_insert_in_year_order)": "idx_sessions_year_no",
+    "置き換え対象 (merge_chunk_records)": "idx_sessions_year_record_key",
+    "出力対象の年 (run_output_stage)": "idx_sessions_year_no",
+    "年ごとの変更日時 (export_changed_partitions)": "idx_sessions_year_updated_at"
+}
+
+@pytest.mark.parametrize("label", list(EXPECTED_INDEXES))
+def test_expected_index(db, label):
+    query, params = PLAN_CHECK_QUERIES[label]
+    plan = query_plan(db, query, params)
+    used = [step.split("INDEX ", 1)[1].split(" ", 1)[0] for step in plan if "INDEX " in step]
+    assert EXPECTED_INDEXES[label] in used, f"{label}: {plan}"
+
+def test_year_order_without_sort(db):
+    # 年内のnoの順に読む処理は、インデックスの順に読むため並べ替えを行わない
+    for label in ["既存行の照合 (store_data upsert)", "年内の並び順 (_insert_in_year_order)",
+                  "出力対象の年 (run_output_stage)"]:
+        query, params = PLAN_CHECK_QUERIES[label]
+        plan = query_plan(db, query, params)
+        assert not any(step.startswith("USE TEMP B-TREE") for step in plan), f"{label}: {plan}"
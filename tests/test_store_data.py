@@ -0,0 +1,44 @@
+"""store_data(mode="upsert") のnoの振り方の確認
+
+noはテーブル全体で一意で、年ごとに連続した範囲を占める。最後の年以外に行を追加しても
+後ろの年のnoと重ならず、それぞれの年の行の順序が保たれることを確認する。
+"""
+import pytest
+from db_handler import DatabaseHandler
+from benchmark_db import make_records
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = DatabaseHandler()
+    yield db
+    db.close()
+
+def year_blocks(db):
+    return db.fetch_all("SELECT year, MIN(no), MAX(no), COUNT(*) FROM sessions GROUP BY year ORDER BY MIN(no)")
+
+def test_upsert_into_earlier_year_keeps_no_unique(db):
+    first, second = make_records(5), make_records(5)
+    assert db.store_data(first, 2023, mode="upsert")
+    assert db.store_data(second, 2024, mode="upsert")
+    second_order = [row[0] for row in db.fetch_all("SELECT id FROM sessions WHERE year = 2024 ORDER BY no")]
+
+    added = [dict(first[0], paper_no=f"2023-01-9{i}", title=f"Added Paper {i}") for i in range(3)]
+    assert db.store_data([added[0]] + first[:2] + added[1:] + first[2:], 2023, mode="upsert")
+
+    assert db.fetch_one("SELECT COUNT(*) - COUNT(DISTINCT no) FROM sessions")[0] == 0
+    assert year_blocks(db) == [(2023, 1, 8, 8), (2024, 9, 13, 5)]
+    assert [row[0] for row in db.fetch_all("SELECT title FROM sessions WHERE year = 2023 ORDER BY no")] == [
+        "Added Paper 0", "Benchmark Paper Title 0", "Benchmark Paper Title 1", "Added Paper 1", "Added Paper 2",
+        "Benchmark Paper Title 2", "Benchmark Paper Title 3", "Benchmark Paper Title 4"
+    ]
+    assert [row[0] for row in db.fetch_all("SELECT id FROM sessions WHERE year = 2024 ORDER BY no")] == second_order
+    assert db.validate_staging(2023)
+
+def test_upsert_without_new_rows_keeps_no(db):
+    data = make_records(5)
+    assert db.store_data(data, 2023, mode="upsert")
+    assert db.store_data(make_records(5), 2024, mode="upsert")
+    before = db.fetch_all("SELECT id, no, updated_at FROM sessions ORDER BY id")
+    assert db.store_data(data, 2023, mode="upsert")
+    assert db.fetch_all("SELECT id, no, updated_at FROM sessions ORDER BY id") == before
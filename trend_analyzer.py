@@ -1,6 +1,5 @@
 import os
 import pandas as pd
-import sqlite3
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 from db_handler import DatabaseHandler
@@ -17,33 +16,32 @@ class TrendAnalyzer:
     
     def get_latest_data(self):
         """最新年のデータを取得"""
-        with sqlite3.connect(self.db.db_path) as conn:
-            # 最新年と前年のデータを取得
-            query = """
-            WITH latest_years AS (
-                SELECT DISTINCT year 
-                FROM sessions 
-                ORDER BY year DESC 
-                LIMIT 2
-            )
-            SELECT 
-                s.year,
-                s.category,
-                s.subcategory,
-                s.session_name,
-                s.overview,
-                s.title
-            FROM sessions s
-            JOIN latest_years ly ON s.year = ly.year
-            ORDER BY s.year DESC, s.category, s.subcategory
-            """
-            df = pd.read_sql_query(query, conn)
-            
-            # カテゴリとサブカテゴリを日本語に変換
-            df['category_ja'] = df['category'].apply(self.db.translate_category)
-            df['subcategory_ja'] = df['subcategory'].apply(self.db.translate_subcategory)
-            
-            return df
+        # 最新年と前年のデータを取得
+        query = """
+        WITH latest_years AS (
+            SELECT DISTINCT year 
+            FROM sessions 
+            ORDER BY year DESC 
+            LIMIT 2
+        )
+        SELECT 
+            s.year,
+            s.category,
+            s.subcategory,
+            s.session_name,
+            s.overview,
+            s.title
+        FROM sessions s
+        JOIN latest_years ly ON s.year = ly.year
+        ORDER BY s.year DESC, s.category, s.subcategory
+        """
+        df = self.db.query_df(query)
+        
+        # カテゴリとサブカテゴリを日本語に変換
+        df['category_ja'] = df['category'].apply(self.db.translate_category)
+        df['subcategory_ja'] = df['subcategory'].apply(self.db.translate_subcategory)
+        
+        return df
     
     def analyze_trends(self):
         """トレンド分析を実行"""
@@ -0,0 +1,217 @@
+import re
+
+# 論文番号の行（先頭に発表時刻が付く場合あり）と、その後に続くタイトル
+PAPER_LINE_PATTERN = re.compile(
+    r'^[^\S\n]*(?:\d{1,2}:\d{2}\s*(?:a\.m\.|p\.m\.)\s*)?(20\d{2}-\d{2}-\d{4}|ORAL ONLY)[^\S\n]*(.*)$',
+    re.MULTILINE | re.IGNORECASE
+)
+SESSION_CODE_PATTERN = re.compile(r'Session Code\s+([A-Z0-9]+)')
+ORAL_ONLY = "ORAL ONLY"
+
+# 著者情報が必須ではない論文（パネルディスカッション等）の判定用
+AUTHOR_OPTIONAL_PATTERN = re.compile(r'panel\s+discussion', re.IGNORECASE)
+
+def _normalize_title(title):
+    """タイトル比較用に空白と大文字小文字を正規化する"""
+    return re.sub(r'\s+', ' ', title or '').strip().lower()
+
+def index_chunk(chunk):
+    """チャンク内の論文番号とタイトル行を索引化する
+
+    Returns:
+        list: 出現順の辞書のリスト
+            paper_no (str), title (str), start (int), end (int)
+            startとendはその論文の記載範囲（次の論文番号の直前まで）
+    """
+    matches = list(PAPER_LINE_PATTERN.finditer(chunk))
+    papers = []
+    for i, match in enumerate(matches):
+        title = match.group(2).strip()
+        if not title:
+            # タイトルが次の行にある場合
+            following = chunk[match.end():].lstrip('\n').split('\n', 1)[0]
+            title = following.strip()
+        papers.append({
+            "paper_no": match.group(1).upper(),
+            "title": title,
+            "start": match.start(),
+            "end": matches[i + 1].start() if i + 1 < len(matches) else len(chunk)
+        })
+    return papers
+
+def validate_chunk_records(chunk, records, paper_index=None):
+    """抽出結果をチャンクの原文と突き合わせて検証する
+
+    Args:
+        chunk (str): 抽出元のチャンク
+        records (list): LLMが抽出したレコード
+        paper_index (list): index_chunkの結果（省略時はここで作成）
+
+    Returns:
+        dict: 検証結果
+            missing_papers (list): 原文にあるが抽出されていない論文（index_chunkの要素）
+            unknown_papers (list): 原文に存在しない論文番号
+            empty_titles (list): タイトルが空のレコードの論文番号
+            missing_authors (list): 著者が空のレコードの論文番号
+            source_count (int): 原文の論文数
+            matched_count (int): 原文と一致した論文数
+    """
+    if paper_index is None:
+        paper_index = index_chunk(chunk)
+
+    source_numbers = {p["paper_no"] for p in paper_index if p["paper_no"] != ORAL_ONLY}
+    extracted_numbers = set()
+    extracted_oral_titles = []
+    empty_titles = []
+    missing_authors = []
+
+    for record in records:
+        paper_no = str(record.get("paper_no") or "").strip().upper()
+        if paper_no == ORAL_ONLY:
+            extracted_oral_titles.append(_normalize_title(record.get("title")))
+        elif paper_no:
+            extracted_numbers.add(paper_no)
+
+        if not str(record.get("title") or "").strip():
+            empty_titles.append(paper_no)
+        if (not str(record.get("main_author_group") or "").strip()
+                and not AUTHOR_OPTIONAL_PATTERN.search(str(record.get("session_name") or ""))):
+            missing_authors.append(paper_no)
+
+    missing_papers = []
+    for paper in paper_index:
+        if paper["paper_no"] == ORAL_ONLY:
+            # ORAL ONLYは番号で区別できないため、タイトルの先頭一致で判定
+            prefix = _normalize_title(paper["title"])[:30]
+            if prefix and not any(t.startswith(prefix) or prefix.startswith(t) for t in extracted_oral_titles if t):
+                missing_papers.append(paper)
+        elif paper["paper_no"] not in extracted_numbers:
+            missing_papers.append(paper)
+
+    return {
+        "missing_papers": missing_papers,
+        "unknown_papers": sorted(extracted_numbers - source_numbers),
+        "empty_titles": empty_titles,
+        "missing_authors": missing_authors,
+        "source_count": len(paper_index),
+        "matched_count": len(paper_index) - len(missing_papers)
+    }
+
+def has_issues(result):
+    """再抽出が必要な問題があるかどうか"""
+    return bool(result["missing_papers"] or result["empty_titles"] or result["missing_authors"])
+
+class CompletenessReport:
+    """抽出結果の完全性を年単位で集計する"""
+
+    def __init__(self):
+        self.years = {}
+
+    def add(self, year, result):
+        """1チャンク分の検証結果を加算する"""
+        stats = self.years.setdefault(str(year or "不明"), {
+            "chunks": 0,
+            "source_papers": 0,
+            "matched_papers": 0,
+            "empty_titles": 0,
+            "missing_authors": 0,
+            "unknown_papers": 0
+        })
+        stats["chunks"] += 1
+        stats["source_papers"] += result["source_count"]
+        stats["matched_papers"] += result["matched_count"]
+        stats["empty_titles"] += len(result["empty_titles"])
+        stats["missing_authors"] += len(result["missing_authors"])
+        stats["unknown_papers"] += len(result["unknown_papers"])
+
+    def print_report(self):
+        """年ごとの完全性を表示する"""
+        print("\n=== 抽出結果の完全性 ===")
+        for year, stats in sorted(self.years.items()):
+            rate = stats["matched_papers"] / stats["source_papers"] * 100 if stats["source_papers"] else 100.0
+            print(f"{year}年: 論文 {stats['matched_papers']}/{stats['source_papers']}件 ({rate:.1f}%) "
+                  f"タイトル空 {stats['empty_titles']}件 / 著者空 {stats['missing_authors']}件 / "
+                  f"原文に無い論文番号 {stats['unknown_papers']}件")
+        return self.years
+
+SESSION_FIELDS = ["session_name", "session_code", "overview"]
+
+def _has_value(record, field):
+    return bool(str(record.get(field) or "").strip())
+
+def is_session_complete(record):
+    """セッションコードと概要の両方があるか（後続の論文への引き継ぎ元になる）"""
+    return _has_value(record, "session_code") and _has_value(record, "overview")
+
+def is_session_missing(record):
+    """セッションコードと概要の両方が空か（fix_missing_session_dataの補完対象と同じ条件）"""
+    return not _has_value(record, "session_code") and not _has_value(record, "overview")
+
+def _session_key(record):
+    """セッションの識別子（セッションコードと、空白・大文字小文字を正規化したセッション名の組）"""
+    return (str(record.get("session_code") or "").strip(), _normalize_title(record.get("session_name")))
+
+class SessionContextTracker:
+    """チャンク・ページをまたいでセッション情報を引き継ぐ
+
+    継続チャンクの論文はセッションのヘッダーを失い、セッションコードと概要が空で抽出されることがある。
+    抽出順に直前の有効なセッション情報を保持し、DBに保存する前の段階で欠損レコードに付与する。
+    チャンク自身のヘッダーにセッションコードがある場合は、そのセッション（コードと名前）の情報を優先する。
+    """
+
+    def __init__(self, context=None):
+        """
+        Args:
+            context (dict): 引き継ぎ元の初期値（session_name, session_code, overview）。
+                チャンクを単独で再処理する場合に、直前のセッションの情報を渡す
+        """
+        self.context = {field: context.get(field) or "" for field in SESSION_FIELDS} if context else None
+        self.carried = 0
+        self.unresolved = 0
+
+    @staticmethod
+    def chunk_header(chunk, paper_index=None):
+        """チャンクのヘッダー部分（最初の論文番号より前）のセッション名とコード"""
+        if paper_index is None:
+            paper_index = index_chunk(chunk)
+        header = chunk[:paper_index[0]["start"]] if paper_index else chunk
+        code_match = SESSION_CODE_PATTERN.search(header)
+        if not code_match:
+            return None
+        return {"session_name": chunk.split('\n', 1)[0].strip(), "session_code": code_match.group(1)}
+
+    def apply(self, chunk, records, paper_index=None):
+        """1チャンク分のレコードにセッション情報を付与する（レコードを直接更新する）
+
+        Returns:
+            int: セッション情報を付与したレコード数
+        """
+        header = self.chunk_header(chunk, paper_index)
+        if header and (self.context is None or _session_key(self.context) != _session_key(header)):
+            # 新しいセッションの開始（"Part N" のセッションはコードが同じでも名前が異なるため、
+            # コードと名前の組で判定する）。同じセッションの有効なレコードがあればその概要を使う
+            source = next((r for r in records
+                           if is_session_complete(r) and _session_key(r) == _session_key(header)), None)
+            self.context = ({field: source[field] for field in SESSION_FIELDS} if source
+                            else {**header, "overview": ""})
+
+        carried = 0
+        for record in records:
+            if is_session_complete(record):
+                self.context = {field: record[field] for field in SESSION_FIELDS}
+            elif is_session_missing(record):
+                if self.context:
+                    record.update(self.context)
+                    carried += 1
+                else:
+                    self.unresolved += 1
+        self.carried += carried
+        return carried
+
+    def print_report(self):
+        """引き継ぎの結果を表示する"""
+        print(f"セッション情報の引き継ぎ: {self.carried}件 / 引き継ぎ元が無い欠損: {self.unresolved}件")
+
+def count_missing_sessions(records):
+    """セッションコードと概要がともに空のレコード数"""
+    return sum(1 for record in records if is_session_missing(record))
@@ -2,13 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import sqlite3
 from db_handler import DatabaseHandler
 import numpy as np
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 from trend_analyzer import TrendAnalyzer
+from snapshot import load_snapshot, DICTIONARY_COLUMNS
+from export_to_excel import write_sheet, frame_column_widths
 from io import BytesIO
 
 # Streamlitのテーマを固定
@@ -253,29 +254,25 @@ def translate_subcategory(subcategory):
     return SUBCATEGORY_MAPPING.get(subcategory, subcategory)
 
 def load_data():
-    """データベースからデータを読み込む"""
+    """データベースからデータを読み込む（集計済みのcategory_summaryを使用）"""
     db = DatabaseHandler()
-    with sqlite3.connect(db.db_path) as conn:
-        query = """
-        SELECT year, category, subcategory, COUNT(*) as count
-        FROM sessions
-        WHERE category IS NOT NULL
-        GROUP BY year, category, subcategory
-        ORDER BY year, category, subcategory
-        """
-        df = pd.read_sql_query(query, conn)
-        
-        # カテゴリとサブカテゴリを日本語に変換
-        df['category_ja'] = df['category'].apply(translate_category)
-        df['subcategory_ja'] = df['subcategory'].apply(translate_subcategory)
-        
-        # 列名を設定
-        df = df.rename(columns={
-            'year': 'Year',
-            'count': '件数',
-            'category_ja': 'Category',
-            'subcategory_ja': 'Subcategory'
-        })
+    df = db.query_df("""
+    SELECT year, category, subcategory, count
+    FROM category_summary
+    ORDER BY year, category, subcategory
+    """)
+    
+    # カテゴリとサブカテゴリを日本語に変換
+    df['category_ja'] = df['category'].apply(translate_category)
+    df['subcategory_ja'] = df['subcategory'].apply(translate_subcategory)
+    
+    # 列名を設定
+    df = df.rename(columns={
+        'year': 'Year',
+        'count': '件数',
+        'category_ja': 'Category',
+        'subcategory_ja': 'Subcategory'
+    })
         
     return df
 
@@ -842,156 +839,175 @@ def display_yoy_changes(df, top_gainers, top_losers):
         <hr style='margin: 20px 0; border: none; height: 1px; background-color: #E2E8F0;'>
     """, unsafe_allow_html=True)
 
-def load_raw_data(year=None):
-    """生データを読み込む"""
+def _query_raw_data(year=None):
+    """スナップショットが無い場合にデータベースから生データを読み込み、派生列を計算する"""
     db = DatabaseHandler()
-    with sqlite3.connect(db.db_path) as conn:
-        # 年フィルターに基づいてクエリを構築
-        base_query = """
-        SELECT 
-            year,
-            category,
-            subcategory,
-            session_name,
-            session_code,
-            overview,
-            paper_no,
-            title,
-            main_author_group,
-            main_author_affiliation,
-            co_author_group,
-            co_author_affiliation,
-            organizers,
-            chairperson
-        FROM sessions
-        """
-        
-        if year and year != 'すべて':
-            base_query += f" WHERE year = {year}"
-        
-        base_query += " ORDER BY year DESC, category, subcategory"
-        
-        # データを取得
-        df = pd.read_sql_query(base_query, conn)
-        
-        # カテゴリとサブカテゴリを日本語に変換
-        df['category_ja'] = df['category'].apply(translate_category)
-        df['subcategory_ja'] = df['subcategory'].apply(translate_subcategory)
-        
-        # 著者情報を結合
-        df['authors'] = df.apply(lambda x: 
-            f"{x['main_author_group']} ({x['main_author_affiliation']})" if x['main_author_group'] else "" +
-            (f", {x['co_author_group']} ({x['co_author_affiliation']})" if x['co_author_group'] else ""), 
-            axis=1
-        )
+    # 年フィルターに基づいてクエリを構築
+    base_query = """
+    SELECT 
+        year,
+        category,
+        subcategory,
+        session_name,
+        session_code,
+        overview,
+        paper_no,
+        title,
+        main_author_group,
+        main_author_affiliation,
+        co_author_group,
+        co_author_affiliation,
+        organizers,
+        chairperson
+    FROM sessions
+    """
+    
+    params = []
+    if year and year != 'すべて':
+        base_query += " WHERE year = ?"
+        params.append(int(year))
+    
+    base_query += " ORDER BY year DESC, category, subcategory, no"
+    
+    # データを取得
+    df = db.query_df(base_query, params)
+    
+    # カテゴリとサブカテゴリを日本語に変換
+    df['category_ja'] = df['category'].apply(translate_category)
+    df['subcategory_ja'] = df['subcategory'].apply(translate_subcategory)
+    
+    # 著者情報を結合
+    df['authors'] = df.apply(lambda x: 
+        f"{x['main_author_group']} ({x['main_author_affiliation']})" if x['main_author_group'] else "" +
+        (f", {x['co_author_group']} ({x['co_author_affiliation']})" if x['co_author_group'] else ""), 
+        axis=1
+    )
+    
+    # 自動車メーカーの抽出
+    def extract_oem(row):
+        """著者の所属から自動車メーカーを抽出"""
+        # まずmain author affiliationのみで判定
+        main_affiliation = str(row['main_author_affiliation']).upper()
+        co_affiliation = str(row['co_author_affiliation']).upper()
         
-        # 自動車メーカーの抽出
-        def extract_oem(row):
-            """著者の所属から自動車メーカーを抽出"""
-            # まずmain author affiliationのみで判定
-            main_affiliation = str(row['main_author_affiliation']).upper()
-            co_affiliation = str(row['co_author_affiliation']).upper()
+        # メーカー判定関数
+        def check_maker(affiliation):
+            # 日本メーカー
+            if 'TOYOTA' in affiliation or 'DAIHATSU' in affiliation or 'LEXUS' in affiliation:
+                return 'Toyota'
+            elif 'HONDA' in affiliation:
+                return 'Honda'
+            elif 'NISSAN' in affiliation or 'INFINITI' in affiliation:
+                return 'Nissan'
+            elif 'MAZDA' in affiliation:
+                return 'Mazda'
+            elif 'SUBARU' in affiliation or 'FUJI HEAVY' in affiliation:
+                return 'Subaru'
+            elif 'MITSUBISHI' in affiliation or 'MITSUBISHI MOTORS' in affiliation:
+                return 'Mitsubishi'
+            elif 'SUZUKI' in affiliation:
+                return 'Suzuki'
+            elif 'ISUZU' in affiliation:
+                return 'Isuzu'
+            elif 'DAIHATSU' in affiliation:
+                return 'Daihatsu'
             
-            # メーカー判定関数
-            def check_maker(affiliation):
-                # 日本メーカー
-                if 'TOYOTA' in affiliation or 'DAIHATSU' in affiliation or 'LEXUS' in affiliation:
-                    return 'Toyota'
-                elif 'HONDA' in affiliation:
-                    return 'Honda'
-                elif 'NISSAN' in affiliation or 'INFINITI' in affiliation:
-                    return 'Nissan'
-                elif 'MAZDA' in affiliation:
-                    return 'Mazda'
-                elif 'SUBARU' in affiliation or 'FUJI HEAVY' in affiliation:
-                    return 'Subaru'
-                elif 'MITSUBISHI' in affiliation or 'MITSUBISHI MOTORS' in affiliation:
-                    return 'Mitsubishi'
-                elif 'SUZUKI' in affiliation:
-                    return 'Suzuki'
-                elif 'ISUZU' in affiliation:
-                    return 'Isuzu'
-                elif 'DAIHATSU' in affiliation:
-                    return 'Daihatsu'
-                
-                # アメリカメーカー
-                elif 'FORD' in affiliation:
-                    return 'Ford'
-                elif 'GENERAL MOTORS' in affiliation or 'GM ' in affiliation or 'CHEVROLET' in affiliation or 'CADILLAC' in affiliation or 'BUICK' in affiliation:
-                    return 'GM'
-                elif 'STELLANTIS' in affiliation or 'CHRYSLER' in affiliation or 'FCA' in affiliation or 'JEEP' in affiliation or 'DODGE' in affiliation or 'RAM' in affiliation:
-                    return 'Stellantis'
-                elif 'TESLA' in affiliation:
-                    return 'Tesla'
-                
-                # 韓国メーカー
-                elif 'HYUNDAI' in affiliation or 'KIA' in affiliation:
-                    return 'Hyundai'
-                
-                # ドイツメーカー
-                elif 'VOLKSWAGEN' in affiliation or 'VW ' in affiliation or 'AUDI' in affiliation or 'PORSCHE' in affiliation or 'BENTLEY' in affiliation or 'LAMBORGHINI' in affiliation:
-                    return 'Volkswagen'
-                elif 'BMW' in affiliation or 'MINI' in affiliation or 'ROLLS-ROYCE' in affiliation:
-                    return 'BMW'
-                elif 'MERCEDES' in affiliation or 'MERCEDES-BENZ' in affiliation or 'DAIMLER' in affiliation:
-                    return 'Mercedes-Benz'
-                
-                # フランスメーカー
-                elif 'RENAULT' in affiliation:
-                    return 'Renault'
-                elif 'PEUGEOT' in affiliation or 'CITROEN' in affiliation:
-                    return 'PSA'
-                
-                # イタリアメーカー
-                elif 'FIAT' in affiliation:
-                    return 'Fiat'
-                
-                # スウェーデンメーカー
-                elif 'VOLVO' in affiliation:
-                    return 'Volvo'
-                
-                # 中国メーカー
-                elif 'BYD' in affiliation:
-                    return 'BYD'
-                elif 'GEELY' in affiliation:
-                    return 'Geely'
-                elif 'SAIC' in affiliation:
-                    return 'SAIC'
-                elif 'CHANGAN' in affiliation:
-                    return 'Changan'
-                elif 'GREAT WALL' in affiliation:
-                    return 'Great Wall'
-                elif 'DONGFENG' in affiliation:
-                    return 'Dongfeng'
-                elif 'FAW' in affiliation:
-                    return 'FAW'
-                
-                return ''
+            # アメリカメーカー
+            elif 'FORD' in affiliation:
+                return 'Ford'
+            elif 'GENERAL MOTORS' in affiliation or 'GM ' in affiliation or 'CHEVROLET' in affiliation or 'CADILLAC' in affiliation or 'BUICK' in affiliation:
+                return 'GM'
+            elif 'STELLANTIS' in affiliation or 'CHRYSLER' in affiliation or 'FCA' in affiliation or 'JEEP' in affiliation or 'DODGE' in affiliation or 'RAM' in affiliation:
+                return 'Stellantis'
+            elif 'TESLA' in affiliation:
+                return 'Tesla'
             
-            # まずmain authorのaffiliationで判定
-            main_maker = check_maker(main_affiliation)
-            if main_maker:
-                return main_maker
+            # 韓国メーカー
+            elif 'HYUNDAI' in affiliation or 'KIA' in affiliation:
+                return 'Hyundai'
             
-            # main authorに自動車メーカーが含まれていない場合のみ、co-authorを確認
-            return check_maker(co_affiliation)
-        
-        # 自動車メーカーカラムを追加
-        df['OEM'] = df.apply(extract_oem, axis=1)
-        
-        # No列を追加
-        df['no'] = range(1, len(df) + 1)
-        
-        # 列の順序を変更
-        df = df[['no', 'year', 'category_ja', 'subcategory_ja', 'session_name', 'session_code', 
-                'paper_no', 'title', 'authors', 'OEM', 'overview', 'organizers', 'chairperson',
-                'main_author_group', 'main_author_affiliation', 'co_author_group', 'co_author_affiliation']]
+            # ドイツメーカー
+            elif 'VOLKSWAGEN' in affiliation or 'VW ' in affiliation or 'AUDI' in affiliation or 'PORSCHE' in affiliation or 'BENTLEY' in affiliation or 'LAMBORGHINI' in affiliation:
+                return 'Volkswagen'
+            elif 'BMW' in affiliation or 'MINI' in affiliation or 'ROLLS-ROYCE' in affiliation:
+                return 'BMW'
+            elif 'MERCEDES' in affiliation or 'MERCEDES-BENZ' in affiliation or 'DAIMLER' in affiliation:
+                return 'Mercedes-Benz'
+            
+            # フランスメーカー
+            elif 'RENAULT' in affiliation:
+                return 'Renault'
+            elif 'PEUGEOT' in affiliation or 'CITROEN' in affiliation:
+                return 'PSA'
+            
+            # イタリアメーカー
+            elif 'FIAT' in affiliation:
+                return 'Fiat'
+            
+            # スウェーデンメーカー
+            elif 'VOLVO' in affiliation:
+                return 'Volvo'
+            
+            # 中国メーカー
+            elif 'BYD' in affiliation:
+                return 'BYD'
+            elif 'GEELY' in affiliation:
+                return 'Geely'
+            elif 'SAIC' in affiliation:
+                return 'SAIC'
+            elif 'CHANGAN' in affiliation:
+                return 'Changan'
+            elif 'GREAT WALL' in affiliation:
+                return 'Great Wall'
+            elif 'DONGFENG' in affiliation:
+                return 'Dongfeng'
+            elif 'FAW' in affiliation:
+                return 'FAW'
+            
+            return ''
         
-        # 列名を設定
-        df.columns = ['No', 'Year', 'Category', 'Subcategory', 'Session Name', 'Session Code', 
-                     'Paper No', 'Title', 'Authors', 'OEM', 'Overview', 'Organizers', 'Chairperson',
-                     'Main Author Group', 'Main Author Affiliation', 'Co-Author Group', 'Co-Author Affiliation']
+        # まずmain authorのaffiliationで判定
+        main_maker = check_maker(main_affiliation)
+        if main_maker:
+            return main_maker
         
+        # main authorに自動車メーカーが含まれていない場合のみ、co-authorを確認
+        return check_maker(co_affiliation)
+    
+    # 自動車メーカーカラムを追加
+    df['OEM'] = df.apply(extract_oem, axis=1)
+    
+    return df
+
+def load_raw_data(year=None):
+    """生データを読み込む
+
+    取り込み時に作成したスナップショット（snapshot.py）が最新であればそれを読み込み、
+    無い場合はデータベースから読み込んで派生列を計算する。
+    """
+    df = load_snapshot()
+    if df is not None:
+        if year and year != 'すべて':
+            df = df[df['year'] == int(year)]
+        # 以降の集計で未出現の組み合わせが現れないよう、辞書エンコードした列は通常の列に戻す
+        df = df.astype({column: df[column].cat.categories.dtype for column in DICTIONARY_COLUMNS})
+        df = df.rename(columns={'oem': 'OEM'})
+    else:
+        df = _query_raw_data(year)
+    
+    # No列を追加
+    df['no'] = range(1, len(df) + 1)
+    
+    # 列の順序を変更
+    df = df[['no', 'year', 'category_ja', 'subcategory_ja', 'session_name', 'session_code', 
+            'paper_no', 'title', 'authors', 'OEM', 'overview', 'organizers', 'chairperson',
+            'main_author_group', 'main_author_affiliation', 'co_author_group', 'co_author_affiliation']]
+    
+    # 列名を設定
+    df.columns = ['No', 'Year', 'Category', 'Subcategory', 'Session Name', 'Session Code', 
+                 'Paper No', 'Title', 'Authors', 'OEM', 'Overview', 'Organizers', 'Chairperson',
+                 'Main Author Group', 'Main Author Affiliation', 'Co-Author Group', 'Co-Author Affiliation']
+    
     return df
 
 def create_oem_trend_line(df):
@@ -1217,27 +1233,10 @@ def display_raw_data(selected_year):
         }
     )
     
-    # Excelダウンロードボタン
+    # Excelダウンロードボタン（列幅は列単位の文字列長の最大値から求め、書き込み専用モードで出力）
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='WCX Sessions', index=False)
-        
-        # ワークシートを取得
-        worksheet = writer.sheets['WCX Sessions']
-        
-        # カラム幅の自動調整
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            adjusted_width = min(adjusted_width, 100)  # 最大幅を100文字に制限
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    write_sheet(output, list(df.columns), frame_column_widths(df), rows)
     
     # バイトデータを取得
     excel_data = output.getvalue()
@@ -1362,9 +1361,66 @@ def main():
         <hr style='margin-top: 30px; margin-bottom: 30px; border: none; height: 1px; background-color: #E2E8F0;'>
     """, unsafe_allow_html=True)
     
+    # 全文検索
+    display_search(df)
+    
+    # 区切り線を追加
+    st.markdown("""
+        <hr style='margin-top: 30px; margin-bottom: 30px; border: none; height: 1px; background-color: #E2E8F0;'>
+    """, unsafe_allow_html=True)
+    
     # 生データの表示（selected_yearを渡す）
     display_raw_data(selected_year)
 
+def display_search(df):
+    """タイトル・概要・著者・所属の全文検索セクションを表示"""
+    st.markdown("""
+        <div style='margin-top: 0;'>
+            <h3 style='color: #333333; font-size: 18px; margin-bottom: 15px;'>論文検索</h3>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns([3, 1, 2])
+    with col1:
+        search_text = st.text_input('キーワード（タイトル・概要・著者・所属）', placeholder='例: solid-state battery',
+                                    key="search_text")
+    with col2:
+        years = sorted(df['Year'].unique())
+        year_from = st.selectbox('対象年（以降）', ['すべて'] + list(years), key="search_year_from")
+    with col3:
+        categories = sorted(df['category'].dropna().unique())
+        selected_categories = st.multiselect('カテゴリ', categories, format_func=translate_category,
+                                             key="search_categories")
+    
+    if not search_text.strip():
+        return
+    
+    start = datetime.now()
+    results = DatabaseHandler().search_sessions(
+        search_text,
+        year_from=None if year_from == 'すべて' else year_from,
+        categories=selected_categories or None,
+        limit=100
+    )
+    elapsed_ms = (datetime.now() - start).total_seconds() * 1000
+    
+    if results.empty:
+        st.info("該当する論文が見つかりませんでした")
+        return
+    
+    st.caption(f"{len(results)}件（関連度順、{elapsed_ms:.0f}ms）")
+    for _, row in results.iterrows():
+        authors = row['main_author_group']
+        if row['main_author_affiliation']:
+            authors += f" ({row['main_author_affiliation']})"
+        st.markdown(
+            f"**{row['title']}**  \n"
+            f"{row['year']} / {translate_category(row['category'])} / {row['session_code']} / {row['paper_no']}  \n"
+            f"{authors}"
+        )
+        # 抜粋（一致した語は ** で強調される）
+        st.caption(row['snippet'])
+
 def display_data_visualizations(df, year_filter, category_filter, subcategory_filter):
     """データ可視化セクションを表示"""
     col1, col2 = st.columns(2)